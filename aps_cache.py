@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+
+class APSPageCache:
+    """
+    On-disk cache of APS abstract pages and the presentation records parsed from them.
+
+    Within ttl seconds of the last fetch a page is served without any network call.
+    After that it is revalidated with If-None-Match / If-Modified-Since, and a 304
+    response reuses the cached records. The least recently used pages are evicted
+    once the raw pages take more than max_bytes or there are more than max_entries.
+
+    The index is written every save_every changes and by save(), which callers
+    run once they are done with the cache.
+    """
+    def __init__(self, cache_dir='.aps_cache', ttl=24 * 3600, max_bytes=50 * 1024 * 1024, max_entries=5000, save_every=50):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.save_every = save_every
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as file:
+                    self._index = json.load(file)
+            except ValueError:
+                print(f"Ignoring corrupt APS cache index {self.index_path}")
+        self._total_bytes = sum(entry['size'] for entry in self._index.values())
+        # Changes to the index not written yet
+        self._unsaved = 0
+
+    def _page_path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.html')
+
+    def _read_page(self, url):
+        with open(self._page_path(url), 'rb') as file:
+            return file.read()
+
+    def _save_index(self):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(self._index, file)
+        os.replace(tmp_path, self.index_path)
+        self._unsaved = 0
+
+    def _changed(self):
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self._save_index()
+
+    def save(self):
+        """Write the index if it changed since it was last written."""
+        with self._lock:
+            if self._unsaved:
+                self._save_index()
+
+    def _over_limits(self):
+        return self._total_bytes > self.max_bytes or len(self._index) > self.max_entries
+
+    def _evict(self):
+        if not self._over_limits():
+            return
+        by_age = sorted(self._index.items(), key=lambda item: item[1]['accessed_at'])
+        while by_age and self._over_limits():
+            url, entry = by_age.pop(0)
+            del self._index[url]
+            self._total_bytes -= entry['size']
+            if os.path.exists(self._page_path(url)):
+                os.remove(self._page_path(url))
+
+    def records(self, url, parse, session=None, timeout=None, parser_version=1):
+        """
+        Return the parsed records of url, fetching the page only when needed.
+
+        Parameters:
+        - url: The page URL, also the cache key.
+        - parse: A function (content, url) -> records, called on new content.
+        - session: The HTTP session used for fetches and revalidations.
+        - timeout: The timeout of each request in seconds.
+        - parser_version: Cached records parsed by another version are re-parsed from the cached page.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is not None:
+                entry = dict(entry)
+        if entry is not None and now - entry['fetched_at'] < self.ttl and entry['parser_version'] == parser_version:
+            with self._lock:
+                self.hits += 1
+                if url in self._index:
+                    self._index[url]['accessed_at'] = now
+                    self._changed()
+            return entry['records']
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = (session or requests).get(url, headers=headers, timeout=timeout)
+
+        revalidated = response.status_code == 304 and entry is not None
+        if revalidated:
+            if entry['parser_version'] != parser_version:
+                entry['records'] = parse(self._read_page(url), url)
+                entry['parser_version'] = parser_version
+        else:
+            response.raise_for_status()
+            content = response.content
+            with open(self._page_path(url), 'wb') as file:
+                file.write(content)
+            entry = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'size': len(content),
+                'records': parse(content, url),
+                'parser_version': parser_version,
+            }
+        entry['fetched_at'] = now
+        entry['accessed_at'] = now
+
+        with self._lock:
+            if revalidated:
+                self.revalidations += 1
+            else:
+                self.misses += 1
+            previous = self._index.get(url)
+            self._total_bytes += entry['size'] - (previous['size'] if previous else 0)
+            self._index[url] = entry
+            self._evict()
+            self._changed()
+        return entry['records']
+
+    def report(self):
+        print(f"APS cache: {self.hits} hit(s), {self.revalidations} revalidated, {self.misses} fetched")
@@ -0,0 +1,259 @@
+"""
+asyncio versions of EmailNotifier, SlackNotifier and CalendarManager.
+
+LabNotificationSystem.run_async() uses them to send everything a run decided at
+once, instead of one blocking call after another. Each client is built from its
+synchronous counterpart, so it has the same settings (and the same local
+stand-ins in benchmarks/), and bounds its own concurrency with a semaphore: a
+few SMTP sessions side by side, and a limited number of Slack and Calendar
+requests in flight over an aiohttp connection pool.
+
+Only the I/O is asynchronous. The decisions are shared with the synchronous
+clients: the idle sessions and reconnect policy of SMTPSessions, the retries of
+SlackRetries, and the event ledger handling of CalendarManager.
+"""
+import asyncio
+import json
+import time
+from urllib.parse import quote, urlencode
+
+import aiohttp
+import aiosmtplib
+from google.auth.transport.requests import Request
+
+import instrumentation
+from calendar_manager import RECREATE_STATUSES
+from calendar_manager import __email__ as developer_email
+from email_notifier import SMTPSessions
+from slack_notifier import SlackRetries
+
+
+class AsyncEmailNotifier(SMTPSessions):
+    """
+    EmailNotifier over a pool of aiosmtplib sessions.
+
+    Up to max_sessions messages are sent at once, each over its own authenticated
+    session. Sessions are opened as needed and kept open until close().
+    """
+    def __init__(self, username, password, host='smtp.gmail.com', port=587, use_tls=True, timeout=30, max_reconnects=1, max_sessions=3):
+        super().__init__(username, password, host=host, port=port, use_tls=use_tls, timeout=timeout, max_reconnects=max_reconnects)
+        self._semaphore = asyncio.Semaphore(max_sessions)
+
+    @classmethod
+    def from_notifier(cls, notifier, **kwargs):
+        """Return an async notifier with the settings of an EmailNotifier."""
+        return cls(notifier.username, notifier.password, host=notifier.host, port=notifier.port, use_tls=notifier.use_tls,
+                   timeout=notifier.timeout, max_reconnects=notifier.max_reconnects, **kwargs)
+
+    async def _connect(self):
+        with instrumentation.span('email.connect'):
+            server = aiosmtplib.SMTP(hostname=self.host, port=self.port, timeout=self.timeout, start_tls=self.use_tls)
+            await server.connect()
+            if self.username:
+                await server.login(self.username, self.password)
+        self._connected()
+        return server
+
+    async def close(self):
+        """Close every open SMTP session."""
+        for server in self._take_idle_sessions():
+            try:
+                await server.quit()
+            except (aiosmtplib.SMTPException, OSError):
+                server.close()
+
+    async def deliver(self, recipients, subject, message, html=None):
+        """Send an email, raising on failure."""
+        text = self._build_message(recipients, subject, message, html)
+        started = time.perf_counter()
+        async with self._semaphore:
+            server = self._take_session()
+            with instrumentation.span('email.send'):
+                try:
+                    for attempt in range(self.max_reconnects + 1):
+                        if server is None:
+                            server = await self._connect()
+                        instrumentation.count('calls', service='email')
+                        try:
+                            await server.sendmail(self.username, recipients, text)
+                            break
+                        except (aiosmtplib.SMTPServerDisconnected, ConnectionError):
+                            dropped, server = server, None
+                            if not self._dropped(dropped, attempt):
+                                raise
+                except Exception:
+                    instrumentation.count('failures', service='email')
+                    raise
+                finally:
+                    if server is not None:
+                        self._return_session(server)
+        self._delivered(text, started)
+
+    async def send_email(self, recipients, subject, message, html=None):
+        """Send an email to the specified recipients, printing any failure like EmailNotifier.send_email()."""
+        try:
+            await self.deliver(recipients, subject, message, html)
+        except Exception as e:
+            print(f"Error sending email: {e}")
+
+    async def send_many(self, messages):
+        """Send (recipients, subject, message[, html]) emails concurrently; returns None or the exception for each."""
+        results = await asyncio.gather(*(self.deliver(*message) for message in messages), return_exceptions=True)
+        return [result if isinstance(result, Exception) else None for result in results]
+
+    def report(self):
+        stats = self.stats()
+        print(f"Email (async): {stats['messages']} message(s) over {stats['handshakes']} SMTP handshake(s) | avg {stats['avg_latency_ms']:.1f} ms")
+
+
+class AsyncSlackNotifier(SlackRetries):
+    """SlackNotifier.post() over aiohttp, with at most max_in_flight requests at once."""
+    def __init__(self, token, base_url='https://slack.com/api', timeout=10, max_retries=3, backoff=1.0, max_in_flight=4):
+        self.token = token
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._session = None
+        self.posts = 0
+        self.retries = 0
+
+    @classmethod
+    def from_notifier(cls, notifier, **kwargs):
+        """Return an async notifier with the settings of a SlackNotifier."""
+        return cls(notifier.token, base_url=notifier.base_url, timeout=notifier.timeout, max_retries=notifier.max_retries,
+                   backoff=notifier.backoff, **kwargs)
+
+    def _client_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(headers={'Authorization': f'Bearer {self.token}'},
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def post(self, channel, message):
+        """Post a message to a Slack channel, retrying transient failures."""
+        url = f'{self.base_url}/chat.postMessage'
+        payload = {'channel': channel, 'text': message}
+
+        async with self._semaphore:
+            with instrumentation.span('slack.post'):
+                for attempt in range(self.max_retries + 1):
+                    retry_after = None
+                    try:
+                        instrumentation.count('calls', service='slack')
+                        async with self._client_session().post(url, data=payload) as response:
+                            self.posts += 1
+                            instrumentation.count('bytes_sent', len(urlencode(payload)), service='slack')
+                            if self.is_transient(response.status):
+                                retry_after = response.headers.get('Retry-After')
+                                raise aiohttp.ClientResponseError(response.request_info, response.history, status=response.status,
+                                                                  message=f"HTTP {response.status}")
+                            result = await response.json(content_type=None)
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        await asyncio.sleep(self._retry_or_raise(attempt, e, retry_after))
+                        continue
+                    return self._check_result(result)
+
+    async def send_message(self, channel, message):
+        return await self.post(channel, message)
+
+
+class CalendarRequestError(Exception):
+    """An error response from the Calendar API."""
+    def __init__(self, status, content):
+        self.status = status
+        self.content = content
+        super().__init__(f"HTTP {status}: {content}")
+
+
+class AsyncCalendarManager:
+    """
+    CalendarManager.insert_event() over the Calendar v3 REST endpoints with aiohttp.
+
+    The CalendarManager it wraps provides the credentials, the root URL and the
+    event ledger, so an event created by either backend is not created twice.
+    """
+    def __init__(self, calendar_manager, email_notifier=None, timeout=30, max_in_flight=4):
+        self.calendar_manager = calendar_manager
+        # Alerts go through this notifier, or the CalendarManager's own if None
+        self.email_notifier = email_notifier
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._refresh_lock = asyncio.Lock()
+        self._session = None
+
+    def _client_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _headers(self):
+        async with self._refresh_lock:
+            # The first access reads the token cache, which blocks too
+            credentials = await asyncio.get_event_loop().run_in_executor(None, lambda: self.calendar_manager.credentials)
+            if not credentials.valid:
+                # google-auth refreshes with a blocking request, keep it off the event loop
+                await asyncio.get_event_loop().run_in_executor(None, credentials.refresh, Request())
+        headers = {'Content-Type': 'application/json'}
+        credentials.apply(headers)
+        return headers
+
+    async def _request(self, method, url, body):
+        async with self._client_session().request(method, url, data=body, headers=await self._headers()) as response:
+            return response.status, await response.json(content_type=None)
+
+    async def _alert(self, error_message):
+        if self.email_notifier is not None:
+            await self.email_notifier.send_email([developer_email], "CalendarManager Error", error_message)
+        else:
+            self.calendar_manager.email_notifier.send_email([developer_email], "CalendarManager Error", error_message)
+
+    async def insert_event(self, event_body, calendar_id='primary'):
+        """
+        Insert a prepared event body, alerting the developer on failure.
+
+        The ledger decisions are CalendarManager's (see CalendarManager.insert_event()),
+        only the requests differ.
+        """
+        manager = self.calendar_manager
+        key, fingerprint, entry, existing = manager._prepare_insert(event_body, calendar_id)
+        if existing is not None:
+            return existing
+        url = f"{manager.root_url}calendar/v3/calendars/{quote(calendar_id, safe='')}/events"
+        body = json.dumps(event_body)
+        try:
+            event = None
+            async with self._semaphore:
+                with instrumentation.span('calendar.insert_event'):
+                    if entry:
+                        instrumentation.count('calls', service='calendar')
+                        status, event = await self._request('PATCH', f"{url}/{quote(entry['event_id'], safe='')}", body)
+                        if status in RECREATE_STATUSES:
+                            instrumentation.count('retries', service='calendar')
+                            event = None
+                        elif status >= 400:
+                            raise CalendarRequestError(status, event)
+                        else:
+                            print('Event updated: %s' % (event.get('htmlLink')))
+                    if event is None:
+                        instrumentation.count('calls', service='calendar')
+                        status, event = await self._request('POST', url, body)
+                        if status >= 400:
+                            raise CalendarRequestError(status, event)
+                        print('Event created: %s' % (event.get('htmlLink')))
+            manager._record_insert(key, calendar_id, event, fingerprint, event_body)
+            return event
+        except CalendarRequestError as e:
+            await self._alert(manager._insert_failed(e))
+            raise
@@ -0,0 +1,50 @@
+"""
+Catch up on the days the lab notification system did not run.
+
+Replays the presentation, maintenance and snack decisions of every day in the
+range against that day's date, so the rotations in duty_tracker.json advance
+as if the system had run each day. Only the notifications that are still
+relevant today are sent (a presentation or maintenance week that has not ended,
+tomorrow's snacks), over one set of connections. Configured by the same
+environment variables as main.py.
+
+Usage:
+    python backfill.py --start YYYY-MM-DD [--end YYYY-MM-DD]
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+
+from main import alert_developer, system_from_env
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the lab notification system for the days it missed.")
+    parser.add_argument('--start', type=date.fromisoformat, required=True)
+    parser.add_argument('--end', type=date.fromisoformat, default=date.today() - timedelta(days=1),
+                        help="last day to replay, yesterday by default so today is left to the daily run")
+    args = parser.parse_args(argv)
+    if args.end < args.start:
+        parser.error("--end is before --start")
+    if args.end > date.today():
+        parser.error("--end is in the future")
+
+    try:
+        system = system_from_env()
+    except Exception as e:
+        print(f"Caught exception during initialization: {e}")
+        alert_developer(e)
+        return 1
+    try:
+        system.backfill(args.start, args.end)
+    except Exception as e:
+        print(f"Caught exception during backfill: {e}")
+        alert_developer(e)
+        return 1
+    finally:
+        system.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Compare the full and targeted parses of saved APS abstract pages.
+
+Reports per-page parse time and peak memory of both parsers and checks that they
+extract the same fields. The pages kept in .aps_cache/ make a ready corpus.
+
+Usage:
+    python benchmarks/aps_parse.py [corpus_dir] [repeats]
+"""
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mm_calendar import APS_FAST_PARSER, parse_aps_page, parse_aps_page_full  # noqa: E402
+
+
+def measure(parse, content, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        records = parse(content, 'benchmark')
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    parse(content, 'benchmark')
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return records, min(times), peak
+
+
+def main(corpus_dir, repeats):
+    pages = sorted(glob.glob(os.path.join(corpus_dir, '*.html')))
+    if not pages:
+        print(f"No .html pages in {corpus_dir}")
+        sys.exit(1)
+
+    rows = []
+    for path in pages:
+        with open(path, 'rb') as file:
+            content = file.read()
+        full_records, full_time, full_peak = measure(parse_aps_page_full, content, repeats)
+        fast_records, fast_time, fast_peak = measure(parse_aps_page, content, repeats)
+        rows.append({
+            'page': os.path.basename(path),
+            'full_ms': 1000 * full_time,
+            'fast_ms': 1000 * fast_time,
+            'full_peak_kb': full_peak / 1024,
+            'fast_peak_kb': fast_peak / 1024,
+            'same_fields': full_records == fast_records,
+        })
+        row = rows[-1]
+        print(f"{row['page']:<48} | full {row['full_ms']:7.2f} ms {row['full_peak_kb']:8.0f} KB"
+              f" | fast {row['fast_ms']:7.2f} ms {row['fast_peak_kb']:8.0f} KB | same fields: {row['same_fields']}")
+
+    summary = {
+        'pages': len(rows),
+        'fast_parser': APS_FAST_PARSER,
+        'median_full_ms': statistics.median(row['full_ms'] for row in rows),
+        'median_fast_ms': statistics.median(row['fast_ms'] for row in rows),
+        'median_full_peak_kb': statistics.median(row['full_peak_kb'] for row in rows),
+        'median_fast_peak_kb': statistics.median(row['fast_peak_kb'] for row in rows),
+        'mismatches': [row['page'] for row in rows if not row['same_fields']],
+    }
+    print(json.dumps(summary, indent=4))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else '.aps_cache', int(sys.argv[2]) if len(sys.argv) > 2 else 5)
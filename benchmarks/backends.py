@@ -0,0 +1,159 @@
+"""
+Compares the synchronous and asyncio notification backends against local stand-ins.
+
+Sends the same batch of emails, Slack messages and calendar events through the
+clients run() uses, one blocking call after another, and through
+LabNotificationSystem.send_async(), all at once with a semaphore per service.
+The fakes in benchmarks/fakes.py answer every request after --latency.
+
+Usage:
+    python benchmarks/backends.py [--latency MS] [--emails N] [--slack N] [--events N] [--runs N]
+                                  [--sessions N] [--in-flight N] [--output PATH]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from google.auth.credentials import AnonymousCredentials  # noqa: E402
+
+from benchmarks.e2e import LOCATION, MAINTENANCE_DAY, PRESENTATION_DAY, PRESENTATION_TIME, make_roster, write_workdir  # noqa: E402
+from benchmarks.fakes import FakeCalendarServer, FakeSlackServer, FakeSMTPServer  # noqa: E402
+from calendar_manager import CalendarManager  # noqa: E402
+from email_notifier import EmailNotifier  # noqa: E402
+from main import LabNotificationSystem  # noqa: E402
+from outbox import CALENDAR, EMAIL, SLACK  # noqa: E402
+from slack_notifier import SlackNotifier  # noqa: E402
+
+
+def make_actions(system, emails, slack_messages, events):
+    """Return the (channel, payload) actions of one batch, as the pipelines collect them."""
+    members = list(system.members)
+    actions = []
+    for index in range(emails):
+        member = members[index % len(members)]
+        actions.append((EMAIL, {'recipients': [member.email], 'subject': 'Lab Snacks Reminder',
+                                'message': f"Hi {member.name}, you are on snacks duty.", 'html': None}))
+    for index in range(slack_messages):
+        actions.append((SLACK, {'channel': '#lfl-general-exclusive', 'message': f"Benchmark message {index}"}))
+    start = date(2026, 10, 26)
+    for index in range(events):
+        event_body = system.calendar_manager.build_event_body(
+            title=f"Benchmark event {index}", description="", start_date=(start + timedelta(days=index)).isoformat(),
+            end_date=(start + timedelta(days=index + 1)).isoformat(), attendees=[members[index % len(members)].email],
+            location=LOCATION, all_day=True)
+        actions.append((CALENDAR, {'event_body': event_body, 'calendar_id': 'primary'}))
+    return actions
+
+
+def send_sync(system, actions):
+    """Send the actions with the synchronous clients, as run() does."""
+    for channel, payload in actions:
+        if channel == EMAIL:
+            system.notify_email(payload['recipients'], payload['subject'], payload['message'], payload['html'])
+        elif channel == SLACK:
+            system.notify_slack(payload['channel'], payload['message'])
+        else:
+            system.schedule_event(payload['event_body'], payload['calendar_id'])
+    system.email_notifier.close()
+    return []
+
+
+def run_backend(backend, args, roster, smtp, slack, calendar, credentials):
+    for fake in (smtp, slack, calendar):
+        fake.reset()
+
+    # A fresh working directory, so the event ledger never skips an event
+    with tempfile.TemporaryDirectory() as directory:
+        write_workdir(directory, roster)
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                email_notifier = EmailNotifier('bench@example.com', 'password', host=smtp.host, port=smtp.port, use_tls=False)
+                system = LabNotificationSystem(
+                    PRESENTATION_DAY, PRESENTATION_TIME, MAINTENANCE_DAY, LOCATION,
+                    send_presentation_reminders=True, force_maintenance_reminder=False,
+                    email_notifier=email_notifier,
+                    slack_notifier=SlackNotifier('xoxb-benchmark', base_url=slack.base_url),
+                    calendar_manager=CalendarManager(email_notifier, credentials=credentials, root_url=calendar.root_url),
+                )
+                actions = make_actions(system, args.emails, args.slack, args.events)
+
+                started = time.perf_counter()
+                if backend == 'sync':
+                    errors = send_sync(system, actions)
+                else:
+                    errors = asyncio.run(system.send_async(actions, max_sessions=args.sessions, max_in_flight=args.in_flight))
+                elapsed = time.perf_counter() - started
+        finally:
+            os.chdir(cwd)
+
+    return {
+        'ms': 1000 * elapsed,
+        'errors': [f"{name}: {error}" for name, error in errors],
+        'round_trips': {
+            'smtp_connections': smtp.counters.get('connections', 0),
+            'emails': smtp.counters.get('messages', 0),
+            'slack_requests': slack.counters.get('requests', 0),
+            'calendar_requests': calendar.counters.get('requests', 0),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the sync and async notification backends against local fakes.")
+    parser.add_argument('--latency', type=float, default=20.0, help="Latency of every fake response, in milliseconds")
+    parser.add_argument('--emails', type=int, default=20)
+    parser.add_argument('--slack', type=int, default=5)
+    parser.add_argument('--events', type=int, default=10)
+    parser.add_argument('--runs', type=int, default=3, help="Runs per backend; the median is reported")
+    parser.add_argument('--sessions', type=int, default=3, help="SMTP sessions of the async backend")
+    parser.add_argument('--in-flight', type=int, default=4, help="Slack and Calendar requests in flight in the async backend")
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'results', f"backends-{datetime.now():%Y%m%d-%H%M%S}.json"))
+    args = parser.parse_args(argv)
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'latency_ms': args.latency,
+        'actions': {'emails': args.emails, 'slack': args.slack, 'events': args.events},
+        'sessions': args.sessions,
+        'in_flight': args.in_flight,
+        'backends': {},
+    }
+    roster = make_roster(20)
+    credentials = AnonymousCredentials()
+    latency = args.latency / 1000
+    with FakeSMTPServer(latency) as smtp, FakeSlackServer(latency) as slack, FakeCalendarServer(latency) as calendar:
+        for backend in ('sync', 'async'):
+            samples = [run_backend(backend, args, roster, smtp, slack, calendar, credentials) for _ in range(args.runs)]
+            result = samples[-1]
+            result['ms'] = statistics.median(sample['ms'] for sample in samples)
+            results['backends'][backend] = result
+
+            trips = result['round_trips']
+            print(f"{backend:<6} | {result['ms']:8.1f} ms | smtp {trips['smtp_connections']} conn / {trips['emails']} mail"
+                  f" | slack {trips['slack_requests']} | calendar {trips['calendar_requests']} req"
+                  + (f" | {len(result['errors'])} ERROR(S) {result['errors'][0]}" if result['errors'] else ''))
+    print(f"speedup: {results['backends']['sync']['ms'] / results['backends']['async']['ms']:.1f}x")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=4)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
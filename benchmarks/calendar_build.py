@@ -0,0 +1,51 @@
+"""
+Compare the cold start cost of building the Calendar client.
+
+Each sample runs in a fresh interpreter so import and parse costs are included.
+
+Usage:
+    python benchmarks/calendar_build.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BEFORE = """
+import time
+start = time.perf_counter()
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build
+build('calendar', 'v3', credentials=AnonymousCredentials())
+print(time.perf_counter() - start)
+"""
+
+AFTER = """
+import time
+start = time.perf_counter()
+from google.auth.credentials import AnonymousCredentials
+from calendar_service import get_calendar_service
+get_calendar_service(AnonymousCredentials())
+print(time.perf_counter() - start)
+"""
+
+
+def sample(code):
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main(runs):
+    results = {}
+    for name, code in (('discovery.build', BEFORE), ('cached document', AFTER)):
+        times = [sample(code) for _ in range(runs)]
+        results[name] = {'median_ms': 1000 * statistics.median(times), 'min_ms': 1000 * min(times)}
+        print(f"{name:<16} | median {results[name]['median_ms']:.1f} ms | min {results[name]['min_ms']:.1f} ms")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
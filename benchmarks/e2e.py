@@ -0,0 +1,195 @@
+"""
+End-to-end benchmark of LabNotificationSystem.run against local stand-ins.
+
+Runs main.py's pipelines on frozen dates covering each kind of day, with the
+SMTP server, Slack API and Calendar API replaced by the fakes in
+benchmarks/fakes.py. Records the cold start time of main.py, the time of each
+pipeline and the network round trips, and saves the results as JSON.
+
+Usage:
+    python benchmarks/e2e.py [--latency MS] [--members N] [--runs N] [--concurrent | --backend async] [--output PATH]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from google.auth.credentials import AnonymousCredentials  # noqa: E402
+
+import instrumentation  # noqa: E402
+from benchmarks.fakes import FakeCalendarServer, FakeSlackServer, FakeSMTPServer  # noqa: E402
+from calendar_manager import CalendarManager  # noqa: E402
+from email_notifier import EmailNotifier  # noqa: E402
+from main import LabNotificationSystem  # noqa: E402
+from slack_notifier import SlackNotifier  # noqa: E402
+
+# Meetings on Mondays and maintenance on Fridays, as in production
+PRESENTATION_DAY = 'Monday'
+MAINTENANCE_DAY = 'Friday'
+PRESENTATION_TIME = '10:00 AM'
+LOCATION = 'SSC 319'
+
+SCENARIOS = {
+    'idle': date(2026, 10, 21),              # a Wednesday, nothing to send
+    'presentation': date(2026, 10, 19),      # reminder for the 10/26 meeting
+    'maintenance': date(2026, 10, 23),
+    'snacks': date(2026, 10, 25),            # the Sunday before a meeting
+    'holiday': date(2027, 1, 11),            # no meeting on Martin Luther King Jr. Day
+    'lab_citizen_day': date(2026, 10, 26),   # 11/2 is the first Monday of the month
+}
+
+PIPELINES = ('send_presentation_reminders', 'send_lab_maintenance_reminders', 'send_lab_snacks_reminders')
+
+COLD_START = """
+import time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+
+def cold_start(runs):
+    """Return the median time to import main.py in a fresh interpreter."""
+    times = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', COLD_START], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(times)
+
+
+def make_roster(size):
+    """Return a synthetic roster with PhD students, post-docs and a block of undergrads."""
+    roles = ['PhD Student'] * 6 + ['Post-Doc'] * 2 + ['Undergraduate Student'] * 2
+    return {
+        str(index): {'id': str(index), 'name': f'Member {index}', 'email': f'member{index}@example.com', 'role': roles[index % len(roles)]}
+        for index in range(1, size + 1)
+    }
+
+
+def write_workdir(directory, roster):
+    phd_ids = [member['id'] for member in roster.values() if member['role'] == 'PhD Student']
+    files = {
+        'lab_members.json': roster,
+        'duty_tracker.json': {'presentation': '1', 'maintenance': phd_ids[0], 'snacks': phd_ids[0]},
+        'service_key.json': {},
+    }
+    for name, content in files.items():
+        with open(os.path.join(directory, name), 'w') as file:
+            json.dump(content, file, indent=4)
+
+
+def run_scenario(day, roster, smtp, slack, calendar, credentials, concurrent, verbose, backend='sync'):
+    for fake in (smtp, slack, calendar):
+        fake.reset()
+    instrumentation.reset()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_workdir(directory, roster)
+        cwd = os.getcwd()
+        os.chdir(directory)
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        timings = {}
+        error = None
+        try:
+            with output:
+                started = time.perf_counter()
+                email_notifier = EmailNotifier('bench@example.com', 'password', host=smtp.host, port=smtp.port, use_tls=False)
+                system = LabNotificationSystem(
+                    PRESENTATION_DAY, PRESENTATION_TIME, MAINTENANCE_DAY, LOCATION,
+                    send_presentation_reminders=True, force_maintenance_reminder=False,
+                    clock=lambda: day,
+                    email_notifier=email_notifier,
+                    slack_notifier=SlackNotifier('xoxb-benchmark', base_url=slack.base_url),
+                    calendar_manager=CalendarManager(email_notifier, credentials=credentials, root_url=calendar.root_url),
+                )
+                timings['init'] = time.perf_counter() - started
+
+                started = time.perf_counter()
+                try:
+                    if backend == 'async':
+                        asyncio.run(system.run_async())
+                    else:
+                        system.run(concurrent=concurrent)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                timings['run'] = time.perf_counter() - started
+        finally:
+            os.chdir(cwd)
+
+    spans = instrumentation.summary()['spans']
+    for name in PIPELINES:
+        timings[name] = spans.get(f'pipeline.{name}', {}).get('total_ms', 0.0) / 1000
+    return {
+        'date': day.isoformat(),
+        'ms': {name: 1000 * seconds for name, seconds in timings.items()},
+        'spans': spans,
+        'round_trips': {
+            'smtp_connections': smtp.counters.get('connections', 0),
+            'smtp_commands': smtp.counters.get('commands', 0),
+            'emails': smtp.counters.get('messages', 0),
+            'slack_requests': slack.counters.get('requests', 0),
+            'calendar_requests': calendar.counters.get('requests', 0),
+            'calendar_calls': calendar.counters.get('calls', 0),
+        },
+        'error': error,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark LabNotificationSystem.run against local fakes.")
+    parser.add_argument('--latency', type=float, default=20.0, help="Latency of every fake response, in milliseconds")
+    parser.add_argument('--members', type=int, default=20, help="Size of the synthetic roster")
+    parser.add_argument('--runs', type=int, default=3, help="Runs per scenario; the median is reported")
+    parser.add_argument('--concurrent', action='store_true', help="Run the pipelines concurrently")
+    parser.add_argument('--backend', choices=['sync', 'async'], default='sync', help="Send with run() or run_async()")
+    parser.add_argument('--verbose', action='store_true', help="Show the output of main.py")
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'results', f"e2e-{datetime.now():%Y%m%d-%H%M%S}.json"))
+    args = parser.parse_args(argv)
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'latency_ms': args.latency,
+        'members': args.members,
+        'concurrent': args.concurrent,
+        'backend': args.backend,
+        'cold_start_ms': 1000 * cold_start(args.runs),
+        'scenarios': {},
+    }
+    print(f"cold start (import main) | {results['cold_start_ms']:.1f} ms")
+
+    roster = make_roster(args.members)
+    credentials = AnonymousCredentials()
+    latency = args.latency / 1000
+    with FakeSMTPServer(latency) as smtp, FakeSlackServer(latency) as slack, FakeCalendarServer(latency) as calendar:
+        for name, day in SCENARIOS.items():
+            samples = [run_scenario(day, roster, smtp, slack, calendar, credentials, args.concurrent, args.verbose, args.backend) for _ in range(args.runs)]
+            result = samples[-1]
+            result['ms'] = {key: statistics.median(sample['ms'][key] for sample in samples) for key in result['ms']}
+            results['scenarios'][name] = result
+
+            trips = result['round_trips']
+            print(f"{name:<16} | run {result['ms']['run']:8.1f} ms | init {result['ms']['init']:7.1f} ms"
+                  f" | smtp {trips['smtp_connections']} conn / {trips['emails']} mail | slack {trips['slack_requests']}"
+                  f" | calendar {trips['calendar_requests']} req" + (f" | ERROR {result['error']}" if result['error'] else ''))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=4)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
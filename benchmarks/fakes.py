@@ -0,0 +1,402 @@
+"""
+Local stand-ins for the SMTP server, the Slack Web API, the Calendar API and the
+APS abstract pages.
+
+Each fake runs in a background thread on a free localhost port, answers after a
+configurable latency and counts the round trips it served, so the notification
+pipelines can be benchmarked and tested (see tests/) without Gmail, Slack, Google
+or APS.
+"""
+import abc
+import hashlib
+import json
+import os
+import re
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class _FakeServer(abc.ABC):
+    """Runs a socketserver in a daemon thread and counts what it serves."""
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._server = None
+        self.reset()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
+
+    @abc.abstractmethod
+    def _make_server(self):
+        """Return the socketserver to run, bound to a free localhost port."""
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._server = self._make_server()
+        self._server.daemon_threads = True
+        self._server.fake = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, *lines):
+        self.server.fake.wait()
+        self.wfile.write(''.join(line + '\r\n' for line in lines).encode())
+
+    def handle(self):
+        fake = self.server.fake
+        fake.count('connections')
+        fake._opened(self.connection)
+        try:
+            self.converse(fake)
+        finally:
+            fake._closed(self.connection)
+
+    def converse(self, fake):
+        self.reply('220 fake-smtp ready')
+        in_data = False
+        sender, recipients, data = None, [], []
+        while True:
+            try:
+                line = self.rfile.readline()
+            except OSError:
+                return
+            if not line:
+                return
+            line = line.decode('utf-8', 'replace').rstrip('\r\n')
+            if in_data:
+                if line == '.':
+                    in_data = False
+                    fake.count('messages')
+                    headers = BytesParser(policy=policy.SMTP).parsebytes('\r\n'.join(data).encode(), headersonly=True)
+                    with fake._lock:
+                        fake.messages.append({'from': sender, 'to': recipients, 'subject': headers['Subject']})
+                    sender, recipients, data = None, [], []
+                    self.reply('250 OK queued')
+                else:
+                    # Undo the dot-stuffing of lines starting with a dot
+                    data.append(line[1:] if line.startswith('..') else line)
+                continue
+
+            fake.count('commands')
+            command = line[:4].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250-fake-smtp', '250 AUTH PLAIN LOGIN')
+            elif command == 'AUTH':
+                self.reply('235 Authentication successful')
+            elif command == 'MAIL':
+                sender = line.split(':', 1)[1].strip().strip('<>')
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipients.append(line.split(':', 1)[1].strip().strip('<>'))
+                self.reply('250 OK')
+            elif command == 'DATA':
+                in_data = True
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+
+
+class FakeSMTPServer(_FakeServer):
+    """
+    Plain SMTP server that accepts any login and message. Use it with use_tls=False.
+
+    The envelope and subject of every message are kept in messages, and
+    drop_sessions() hangs up on the open sessions, as servers do with idle ones.
+    """
+    host = '127.0.0.1'
+
+    def _make_server(self):
+        return _ThreadingTCPServer((self.host, 0), _SMTPHandler)
+
+    def reset(self):
+        super().reset()
+        self.messages = []
+        self._sessions = set()
+
+    def _opened(self, connection):
+        with self._lock:
+            self._sessions.add(connection)
+
+    def _closed(self, connection):
+        with self._lock:
+            self._sessions.discard(connection)
+
+    def drop_sessions(self):
+        """Close every open session from the server side. Returns how many were dropped."""
+        with self._lock:
+            sessions = list(self._sessions)
+        for connection in sessions:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        return len(sessions)
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # One per keep-alive connection, as opposed to the requests sent over it
+        self.server.fake.count('connections')
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def respond(self, status, body=b'', content_type='application/json', headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, method):
+        fake = self.server.fake
+        fake.count('requests')
+        body = self.read_body()
+        fake.wait()
+        self.respond(*fake.handle(method, self.path, body, self.headers))
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PATCH(self):
+        self.handle_request('PATCH')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+
+class _HTTPServer(_FakeServer):
+    host = '127.0.0.1'
+
+    def _make_server(self):
+        return ThreadingHTTPServer((self.host, 0), _HTTPHandler)
+
+    @abc.abstractmethod
+    def handle(self, method, path, body, headers):
+        """Return the (status, body[, content_type[, headers]]) response to a request."""
+
+
+class FakeSlackServer(_HTTPServer):
+    """Slack Web API stub answering chat.postMessage. Pass base_url to SlackNotifier."""
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.port}/api'
+
+    def reset(self):
+        super().reset()
+        self.messages = []
+        self._throttled = []
+
+    def throttle(self, *retry_after):
+        """Rate-limit the next posts, one per value: 429 with that Retry-After header, or none if the value is None."""
+        with self._lock:
+            self._throttled.extend(retry_after)
+
+    def handle(self, method, path, body, headers):
+        if method != 'POST' or not path.startswith('/api/chat.postMessage'):
+            return 404, {'ok': False, 'error': 'unknown_method'}
+        with self._lock:
+            throttled = bool(self._throttled)
+            retry_after = self._throttled.pop(0) if throttled else None
+        if throttled:
+            self.count('throttled')
+            return 429, {'ok': False, 'error': 'ratelimited'}, 'application/json', {} if retry_after is None else {'Retry-After': retry_after}
+        form = parse_qs(body.decode('utf-8'))
+        with self._lock:
+            self.messages.append({'channel': form.get('channel', [''])[0], 'text': form.get('text', [''])[0]})
+        self.count('messages')
+        return 200, {'ok': True, 'ts': f'{time.time():.6f}'}
+
+
+class FakeCalendarServer(_HTTPServer):
+    """
+    Calendar v3 events stub, including batch requests. Pass root_url to CalendarManager.
+
+    Supports insert, patch, delete and paginated list of events, with the
+    privateExtendedProperty filter. The counters separate HTTP round trips
+    (requests) from API calls, which differ for batches.
+    """
+    EVENTS_PATH = re.compile(r'^/calendar/v3/calendars/([^/]+)/events(?:/([^/?]+))?$')
+
+    @property
+    def root_url(self):
+        return f'http://{self.host}:{self.port}/'
+
+    def reset(self):
+        super().reset()
+        self.events = {}
+
+    def handle(self, method, path, body, headers):
+        if path.startswith('/batch'):
+            return self._handle_batch(body, headers)
+        path, _, query = path.partition('?')
+        return self._handle_call(method, path, query, body)
+
+    def _handle_call(self, method, path, query, body):
+        self.count('calls')
+        match = self.EVENTS_PATH.match(path)
+        if not match:
+            return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+        event_id = match.group(2)
+
+        with self._lock:
+            if method == 'POST' and not event_id:
+                event = json.loads(body or b'{}')
+                event['id'] = uuid.uuid4().hex
+                event['htmlLink'] = f'{self.root_url}event?eid={event["id"]}'
+                self.events[event['id']] = event
+                return 200, event
+            if method == 'PATCH' and event_id:
+                if event_id not in self.events:
+                    return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+                self.events[event_id].update(json.loads(body or b'{}'))
+                return 200, self.events[event_id]
+            if method == 'DELETE' and event_id:
+                if self.events.pop(event_id, None) is None:
+                    return 410, {'error': {'code': 410, 'message': 'Resource has been deleted'}}
+                return 204, b''
+            if method == 'GET' and not event_id:
+                params = parse_qs(query)
+                events = sorted(self.events.values(), key=lambda event: event['id'])
+                for condition in params.get('privateExtendedProperty', []):
+                    name, _, value = condition.partition('=')
+                    events = [event for event in events if event.get('extendedProperties', {}).get('private', {}).get(name) == value]
+                page_size = int(params.get('maxResults', ['250'])[0])
+                start = int(params.get('pageToken', ['0'])[0])
+                page = {'items': events[start:start + page_size]}
+                if start + page_size < len(events):
+                    page['nextPageToken'] = str(start + page_size)
+                return 200, page
+        return 400, {'error': {'code': 400, 'message': 'Bad Request'}}
+
+    def _handle_batch(self, body, headers):
+        self.count('batches')
+        message = BytesParser(policy=policy.HTTP).parsebytes(
+            b'Content-Type: ' + headers['Content-Type'].encode() + b'\r\n\r\n' + body
+        )
+        boundary = 'fake_batch_boundary'
+        parts = []
+        for part in message.iter_parts():
+            content_id = part['Content-ID'].strip('<>')
+            payload = part.get_payload()
+            raw = payload.encode() if isinstance(payload, str) else part.get_payload(decode=True)
+            head, _, call_body = raw.replace(b'\r\n', b'\n').partition(b'\n\n')
+            method, target = head.split(b'\n')[0].decode().split(' ')[:2]
+            path, _, query = target.partition('?')
+            status, response = self._handle_call(method, path, query, call_body)
+            data = response.decode() if isinstance(response, bytes) else json.dumps(response)
+            parts.append(
+                f'--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n'
+                f'HTTP/1.1 {status} Fake\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n{data}\r\n'
+            )
+        return 200, (''.join(parts) + f'--{boundary}--\r\n').encode(), f'multipart/mixed; boundary={boundary}'
+
+
+class FakeAPSServer(_HTTPServer):
+    """
+    APS abstract pages served from saved .html files, with ETag revalidation.
+
+    pages_dir/<name>.html is served at url(name). fail(name, *statuses) answers
+    the next requests of a page with those statuses, and delay(name, seconds)
+    holds its responses back, e.g. to make pages complete out of order.
+    """
+    def __init__(self, pages_dir, latency=0.0):
+        self.pages_dir = pages_dir
+        super().__init__(latency)
+
+    def url(self, name):
+        return f'http://{self.host}:{self.port}/Meeting/MAR24/Session/{name}'
+
+    def reset(self):
+        super().reset()
+        # The page names answered, in order
+        self.served = []
+        self._failures = {}
+        self._delays = {}
+
+    def fail(self, name, *statuses):
+        with self._lock:
+            self._failures.setdefault(name, []).extend(statuses)
+
+    def delay(self, name, seconds):
+        with self._lock:
+            self._delays[name] = seconds
+
+    def handle(self, method, path, body, headers):
+        name = path.rsplit('/', 1)[-1]
+        page_path = os.path.join(self.pages_dir, name + '.html')
+        if method != 'GET' or not os.path.exists(page_path):
+            return 404, b'Not Found', 'text/plain'
+        with self._lock:
+            failures = self._failures.get(name)
+            status = failures.pop(0) if failures else None
+            delay = self._delays.get(name, 0)
+        time.sleep(delay)
+        with self._lock:
+            self.served.append(name)
+        if status is not None:
+            self.count('failures')
+            return status, b'Service Unavailable', 'text/plain'
+        with open(page_path, 'rb') as file:
+            content = file.read()
+        etag = '"%s"' % hashlib.sha1(content).hexdigest()
+        if headers.get('If-None-Match') == etag:
+            self.count('not_modified')
+            return 304, b'', 'text/html; charset=utf-8', {'ETag': etag}
+        return 200, content, 'text/html; charset=utf-8', {'ETag': etag}
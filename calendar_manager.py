@@ -1,50 +1,93 @@
 __author__ = "Sadman Ahmed Shanto"
 __email__ = "shanto@usc.edu"
 
-import os
-import pickle
+import json
+import threading
+from collections import namedtuple
 from datetime import datetime, timedelta
 
 from dateutil.parser import parse
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+import instrumentation
+import token_cache
+from calendar_service import get_calendar_service, thread_http
+from event_ledger import LEDGER_KEY_PROPERTY, EventLedger, event_fingerprint, event_key
+
+
+# Private extended property marking the events created by this tool
+CREATED_BY_PROPERTY = 'createdBy'
+CREATED_BY_VALUE = 'lfl_lab_manager'
+DEFAULT_ROOT_URL = 'https://www.googleapis.com/'
+# A patch answered with these was for an event deleted by hand since, which is created again
+RECREATE_STATUSES = (404, 410)
+
+
+def tag_event(event_body):
+    """Mark an event body as created by this tool so cleanups can find it."""
+    private = event_body.setdefault('extendedProperties', {}).setdefault('private', {})
+    private[CREATED_BY_PROPERTY] = CREATED_BY_VALUE
+    return event_body
+
 
 class CalendarManager:
-    def __init__(self, email_notifier, client_secret_file="client_secret.json", token_file='token.pickle', scopes=['https://www.googleapis.com/auth/calendar']):
-        self.credentials = None
+    def __init__(self, email_notifier, client_secret_file="client_secret.json", token_file=token_cache.TOKEN_FILE, scopes=token_cache.SCOPES, ledger_file='event_ledger.json', credentials=None, root_url=None):
         self.email_notifier = email_notifier
         self.client_secret_file = client_secret_file
         self.token_file = token_file
         self.scopes = scopes
-        
-        if os.path.exists(token_file):
-            with open(token_file, 'rb') as token:
-                self.credentials = pickle.load(token)
+        # Credentials passed in are used as they are, otherwise the token cache is only
+        # read on the first Calendar call, so runs that make none never touch it
+        self._credentials = credentials
+        self._root_url = root_url
+        self._service = None
+        # Guards the lazy credentials and service
+        self._connect_lock = threading.RLock()
+        # Where the Calendar REST endpoints are, for clients other than self.service (see async_clients.py)
+        self.root_url = (root_url or DEFAULT_ROOT_URL).rstrip('/') + '/'
+        # Created with the service, on the first queued request
+        self.pending = None
+        self.ledger = EventLedger(ledger_file)
+        self._pending_ledger = {}
+        # Guards self.pending together with the ledger entries of its requests
+        self._pending_lock = threading.Lock()
+
+    @property
+    def credentials(self):
+        """The Calendar credentials, read from the token cache the first time they are needed."""
+        with self._connect_lock:
+            if self._credentials is None:
+                # An expired access token is refreshed lazily, before the first Calendar request
+                self._credentials = token_cache.load_credentials(self.token_file, self.scopes)
 
-        # If there are no valid credentials available, let the user log in.
-        self.__athenticate_via_browser() #old method
+                # If the credentials cannot be refreshed, let the user log in.
+                self.__athenticate_via_browser() #old method
+            return self._credentials
 
-        self.service = build('calendar', 'v3', credentials=self.credentials)
+    @property
+    def service(self):
+        """The Calendar service, built on the first Calendar call."""
+        with self._connect_lock:
+            if self._service is None:
+                # The service is shared by every CalendarManager with the same credentials, but
+                # its httplib2 connection is not thread safe: requests go out over thread_http()
+                self._service = get_calendar_service(self.credentials, root_url=self._root_url)
+            return self._service
+
+    def batch(self, batch_size=None):
+        """Return a new CalendarBatch bound to this calendar service."""
+        return CalendarBatch(self.service, batch_size or CalendarBatch.MAX_BATCH_SIZE)
     
     def __athenticate_via_browser(self):
-        if not self.credentials or not self.credentials.valid:
-            if self.credentials and self.credentials.expired and self.credentials.refresh_token:
-                self.credentials.refresh(Request())
-            else:
-                self.email_notifier.send_email([__email__], 'Re-authentication Required', 'Please re-authenticate your app.')
-                self.initiate_new_authentication_flow()
+        if not token_cache.can_authorize(self._credentials):
+            self.email_notifier.send_email([__email__], 'Re-authentication Required', 'Please re-authenticate your app.')
+            self.initiate_new_authentication_flow()
     
     def initiate_new_authentication_flow(self):
-        flow = InstalledAppFlow.from_client_secrets_file(self.client_secret_file, scopes=self.scopes)
-        self.credentials = flow.run_local_server(port=0)
-        with open(self.token_file, 'wb') as token:
-            pickle.dump(self.credentials, token)
+        self._credentials = token_cache.authorize(self.client_secret_file, self.scopes, self.token_file)
 
-    def create_event(self, title, description, start_date, end_date, attendees, all_day=False, location="SSC 319"):
-        """Create a calendar event without attendees."""
+    def build_event_body(self, title, description, start_date, end_date, attendees, all_day=False, location="SSC 319"):
+        """Build the request body of a date or datetime event."""
         time_zone = 'America/Los_Angeles'
         if all_day:
             #* For all-day events, use 'date' instead of 'dateTime'
@@ -57,7 +100,7 @@ class CalendarManager:
             end = {'dateTime': end_date, 'timeZone': time_zone}
             colorId = "4"
         #* Add location if provided
-        event_body = {
+        return {
             'summary': title,
             'description': description,
             'colorId': colorId,  # '2' for all-day, '4' for timed
@@ -71,28 +114,20 @@ class CalendarManager:
                               {'method': 'popup', 'minutes': 10}],
             },
         }
-        try:
-            event = self.service.events().insert(calendarId='primary', body=event_body).execute()
-            print('Event created: %s' % (event.get('htmlLink')))
-        except HttpError as e:
-            error_message = f"An error occurred in CalendarManager: {e}"
-            self.email_notifier.send_email([__email__], "CalendarManager Error", error_message)
-            print(error_message)
-            raise
-
 
-    def create_timed_event(self, title, date, start_time_str, attendees, calendar_id='primary', location="SSC 319"):
-        """Create a calendar event based on a start time string."""
+    def build_timed_event_body(self, title, date, start_time_str, attendees, location="SSC 319"):
+        """Build the request body of a one hour event starting at start_time_str on date."""
         time_zone = 'America/Los_Angeles'
-        
+
         # Parse the start time string and set it to the provided date
         start_time = parse(start_time_str)
-        start_datetime = datetime.combine(date.date(), start_time.time())
+        day = date.date() if isinstance(date, datetime) else date
+        start_datetime = datetime.combine(day, start_time.time())
 
         # Add one hour to get the end time
         end_datetime = start_datetime + timedelta(hours=1)
 
-        event_body = {
+        return {
             'summary': title,
             "colorId": "10",
             'start': {'dateTime': start_datetime.isoformat(), 'timeZone': time_zone},
@@ -104,11 +139,262 @@ class CalendarManager:
                 'overrides': [{'method': 'email', 'minutes': 24 * 60}, {'method': 'popup', 'minutes': 10}],
             },
         }
+
+    def _ledger_lookup(self, event_body, calendar_id):
+        """Return (key, fingerprint, entry) of an event, entry being None if no earlier run created it."""
+        key = event_key(calendar_id, event_body)
+        return key, event_fingerprint(event_body), self.ledger.get(key)
+
+    def _prepare_insert(self, event_body, calendar_id):
+        """
+        Decide how to send an event, for this class and AsyncCalendarManager alike.
+
+        Returns (key, fingerprint, entry, existing). existing is the result to return
+        without any request when an earlier run created the identical event.
+        Otherwise the body is tagged with its ledger key, and entry is the ledger
+        entry of the event to patch, or None to create it.
+        """
+        key, fingerprint, entry = self._ledger_lookup(event_body, calendar_id)
+        if entry and entry['fingerprint'] == fingerprint:
+            print(f"Event already exists, skipping: {event_body.get('summary')}")
+            return key, fingerprint, entry, {'id': entry['event_id']}
+        tag_event(event_body)['extendedProperties']['private'][LEDGER_KEY_PROPERTY] = key
+        return key, fingerprint, entry, None
+
+    def _record_insert(self, key, calendar_id, event, fingerprint, event_body):
+        """Record a created or patched event in the ledger."""
+        instrumentation.count('bytes_sent', len(json.dumps(event_body)), service='calendar')
+        self.ledger.record(key, calendar_id, event['id'], fingerprint)
+        self.ledger.save()
+
+    @staticmethod
+    def _insert_failed(error):
+        """Count a failed insert and return the message to alert the developer with."""
+        instrumentation.count('failures', service='calendar')
+        error_message = f"An error occurred in CalendarManager: {error}"
+        print(error_message)
+        return error_message
+
+    def insert_event(self, event_body, calendar_id='primary', alert=True):
+        """
+        Insert a prepared event body, alerting the developer on failure unless alert is False.
+
+        The event ledger makes this idempotent: an identical event created by an
+        earlier run is skipped and a changed one is patched in place. The outbox
+        retries failed inserts itself and only alerts once it gives up, so it
+        passes alert=False.
+        """
+        key, fingerprint, entry, existing = self._prepare_insert(event_body, calendar_id)
+        if existing is not None:
+            return existing
+        http = thread_http(self.service)
         try:
-            event = self.service.events().insert(calendarId=calendar_id, body=event_body).execute()
-            print('Event created: %s' % (event.get('htmlLink')))
+            event = None
+            with instrumentation.span('calendar.insert_event'):
+                if entry:
+                    try:
+                        instrumentation.count('calls', service='calendar')
+                        event = self.service.events().patch(calendarId=calendar_id, eventId=entry['event_id'], body=event_body).execute(http=http)
+                        print('Event updated: %s' % (event.get('htmlLink')))
+                    except HttpError as e:
+                        if e.resp.status not in RECREATE_STATUSES:
+                            raise
+                        instrumentation.count('retries', service='calendar')
+                if event is None:
+                    instrumentation.count('calls', service='calendar')
+                    event = self.service.events().insert(calendarId=calendar_id, body=event_body).execute(http=http)
+                    print('Event created: %s' % (event.get('htmlLink')))
+            self._record_insert(key, calendar_id, event, fingerprint, event_body)
+            return event
         except HttpError as e:
-            error_message = f"An error occurred in CalendarManager: {e}"
+            error_message = self._insert_failed(e)
+            if alert:
+                self.email_notifier.send_email([__email__], "CalendarManager Error", error_message)
+            raise
+
+    def create_event(self, title, description, start_date, end_date, attendees, all_day=False, location="SSC 319"):
+        """Create a calendar event without attendees."""
+        event_body = self.build_event_body(title, description, start_date, end_date, attendees, all_day=all_day, location=location)
+        return self.insert_event(event_body)
+
+    def create_timed_event(self, title, date, start_time_str, attendees, calendar_id='primary', location="SSC 319"):
+        """Create a calendar event based on a start time string."""
+        event_body = self.build_timed_event_body(title, date, start_time_str, attendees, location=location)
+        return self.insert_event(event_body, calendar_id=calendar_id)
+
+    def queue_event(self, title, description, start_date, end_date, attendees, all_day=False, location="SSC 319", calendar_id='primary'):
+        """Queue an event insert for the next flush_batch() call."""
+        event_body = self.build_event_body(title, description, start_date, end_date, attendees, all_day=all_day, location=location)
+        self.queue_insert(event_body, calendar_id=calendar_id)
+
+    def queue_timed_event(self, title, date, start_time_str, attendees, calendar_id='primary', location="SSC 319"):
+        """Queue a timed event insert for the next flush_batch() call."""
+        event_body = self.build_timed_event_body(title, date, start_time_str, attendees, location=location)
+        self.queue_insert(event_body, calendar_id=calendar_id)
+
+    def queue_insert(self, event_body, calendar_id='primary'):
+        """Queue a prepared event body, skipping or patching it like insert_event() does."""
+        key, fingerprint, entry, existing = self._prepare_insert(event_body, calendar_id)
+        if existing is not None:
+            return
+        with self._pending_lock:
+            if entry:
+                self._queued_batch().patch(entry['event_id'], event_body, calendar_id=calendar_id, key=key)
+            else:
+                self._queued_batch().insert(event_body, calendar_id=calendar_id, key=key)
+            self._pending_ledger[key] = (calendar_id, fingerprint)
+
+    def queue_delete(self, event_id, calendar_id='primary'):
+        """Queue an event delete for the next flush_batch() call."""
+        with self._pending_lock:
+            self._queued_batch().delete(event_id, calendar_id=calendar_id)
+
+    def _queued_batch(self):
+        # Called with self._pending_lock held
+        if self.pending is None:
+            self.pending = CalendarBatch(self.service)
+        return self.pending
+
+    def flush_batch(self):
+        """Send every queued insert and delete, alerting the developer about the ones that failed."""
+        with self._pending_lock:
+            pending, self.pending = self.pending, None
+            pending_ledger, self._pending_ledger = self._pending_ledger, {}
+        if pending is None:
+            return []
+        with instrumentation.span('calendar.flush_batch'):
+            results = pending.flush(http=thread_http(self.service))
+            # A request whose response is missing may have been applied anyway
+            recovered = set()
+            for index, result in enumerate(results):
+                if isinstance(result.error, MissingBatchResponse) and result.key in pending_ledger:
+                    event = self._find_by_ledger_key(result.key, pending_ledger[result.key][0])
+                    if event is not None:
+                        results[index] = BatchResult(result.key, event, None)
+                        recovered.add(result.key)
+        failures = [result for result in results if result.error is not None]
+        instrumentation.count('failures', len(failures), service='calendar')
+        for result in results:
+            if result.key not in pending_ledger:
+                continue
+            calendar_id, fingerprint = pending_ledger[result.key]
+            if result.error is None:
+                print('Event saved: %s' % (result.response.get('htmlLink')))
+                # A recovered event may predate this body, without its fingerprint the next run patches it
+                self.ledger.record(result.key, calendar_id, result.response['id'], None if result.key in recovered else fingerprint)
+            else:
+                # Let the next run create the event from scratch
+                self.ledger.forget(result.key)
+        if pending_ledger:
+            self.ledger.save()
+        if failures:
+            error_message = "\n".join(f"An error occurred in CalendarManager for {result.key}: {result.error}" for result in failures)
             self.email_notifier.send_email([__email__], "CalendarManager Error", error_message)
             print(error_message)
-            raise
+        return results
+
+    def _find_by_ledger_key(self, key, calendar_id):
+        """Return the event tagged with this ledger key on the calendar, or None if there is none or the lookup fails."""
+        try:
+            instrumentation.count('calls', service='calendar')
+            found = self.service.events().list(
+                calendarId=calendar_id, privateExtendedProperty=f"{LEDGER_KEY_PROPERTY}={key}", maxResults=1,
+            ).execute(http=thread_http(self.service)).get('items', [])
+        except HttpError as e:
+            print(f"Could not look up the event {key}: {e}")
+            return None
+        return found[0] if found else None
+
+
+class MissingBatchResponse(RuntimeError):
+    """A batched request the batch response left out, which may or may not have been applied."""
+
+BatchResult = namedtuple('BatchResult', ['key', 'response', 'error'])
+
+
+class CalendarBatch:
+    """Queue Calendar inserts, patches and deletes and send them as batch HTTP requests."""
+    # Google accepts up to 1000 calls per batch but recommends keeping batches small
+    MAX_BATCH_SIZE = 50
+
+    def __init__(self, service, batch_size=MAX_BATCH_SIZE):
+        self.service = service
+        self.batch_size = batch_size
+        self.round_trips = 0
+        self._queue = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._queue)
+
+    def _append(self, key, request):
+        with self._lock:
+            self._queue.append((key, request))
+
+    def insert(self, event_body, calendar_id='primary', key=None):
+        """Queue an insert; the result is reported under key, the event summary by default."""
+        request = self.service.events().insert(calendarId=calendar_id, body=event_body)
+        self._append(key if key is not None else event_body.get('summary'), request)
+
+    def patch(self, event_id, event_body, calendar_id='primary', key=None):
+        """Queue a patch; the result is reported under key, the event id by default."""
+        request = self.service.events().patch(calendarId=calendar_id, eventId=event_id, body=event_body)
+        self._append(key if key is not None else event_id, request)
+
+    def delete(self, event_id, calendar_id='primary', key=None):
+        """Queue a delete; the result is reported under key, the event id by default."""
+        request = self.service.events().delete(calendarId=calendar_id, eventId=event_id)
+        self._append(key if key is not None else event_id, request)
+
+    def flush(self, http=None):
+        """
+        Send the queued requests in chunks of batch_size.
+
+        Parameters:
+        - http: The authorized http object to send the batches with, the service's by default.
+
+        Returns:
+        - A list of BatchResult(key, response, error) in the order the requests were queued.
+        """
+        with self._lock:
+            queue, self._queue = self._queue, []
+        results = []
+        for start in range(0, len(queue), self.batch_size):
+            chunk = queue[start:start + self.batch_size]
+            responses = {}
+
+            def callback(request_id, response, exception):
+                responses[request_id] = (response, exception)
+
+            batch = self.service.new_batch_http_request(callback=callback)
+            for index, (_, request) in enumerate(chunk):
+                batch.add(request, request_id=str(index))
+            instrumentation.count('calls', len(chunk), service='calendar')
+            instrumentation.count('batches', service='calendar')
+            try:
+                batch.execute(http=http)
+            except HttpError as e:
+                # The whole chunk was rejected, so every request in it failed
+                responses = {str(index): (None, e) for index in range(len(chunk))}
+            except KeyError:
+                # googleapiclient raises this, before running the callbacks, when the response
+                # leaves a request out. Keep the parts that did arrive, only the others failed
+                for index, (_, request) in enumerate(chunk):
+                    if str(index) not in responses and str(index) in batch._responses:
+                        responses[str(index)] = _part_result(request, *batch._responses[str(index)])
+            with self._lock:
+                self.round_trips += 1
+
+            for index, (key, _) in enumerate(chunk):
+                # A request the batch response left out did not succeed, report it so it is retried
+                response, error = responses.get(str(index), (None, MissingBatchResponse("no response in batch")))
+                results.append(BatchResult(key, response, error))
+        return results
+
+
+def _part_result(request, resp, content):
+    """Return the (response, error) of one part of a batch response, as BatchHttpRequest.execute() does."""
+    if resp.status >= 300:
+        return None, HttpError(resp, content, uri=request.uri)
+    return request.postproc(resp, content), None
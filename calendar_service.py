@@ -0,0 +1,113 @@
+"""
+Builds the Google Calendar API client from a locally cached discovery document.
+
+The document ships with the repository in discovery_cache/calendar_v3.json, so
+a cold start never fetches it. `refresh` replaces it with Google's latest copy.
+
+Usage:
+    python calendar_service.py refresh
+"""
+import json
+import os
+import sys
+import threading
+
+import requests
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import build_http
+
+import instrumentation
+
+DISCOVERY_URL = 'https://www.googleapis.com/discovery/v1/apis/calendar/v3/rest'
+DISCOVERY_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'discovery_cache', 'calendar_v3.json')
+
+_lock = threading.Lock()
+_discovery_document = None
+_services = []
+_thread_local = threading.local()
+
+
+def _write_document(document, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        file.write(document)
+    os.replace(tmp_path, path)
+
+
+def load_discovery_document(path=DISCOVERY_CACHE_FILE):
+    """Return the Calendar v3 discovery document, reading it from disk at most once per process."""
+    global _discovery_document
+    with _lock:
+        if _discovery_document is None:
+            if os.path.exists(path):
+                with open(path, 'r') as file:
+                    _discovery_document = file.read()
+            else:
+                # Seed the cache from the copy that ships with google-api-python-client
+                _discovery_document = discovery_cache.get_static_doc('calendar', 'v3')
+                if _discovery_document is None:
+                    raise FileNotFoundError(f"No Calendar discovery document at {path}, run `python calendar_service.py refresh`")
+                _write_document(_discovery_document, path)
+        return _discovery_document
+
+
+def refresh_discovery_document(path=DISCOVERY_CACHE_FILE, url=DISCOVERY_URL):
+    """Download the latest discovery document into the local cache."""
+    global _discovery_document
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    with _lock:
+        _write_document(response.text, path)
+        _discovery_document = response.text
+        del _services[:]
+    return path
+
+
+def get_calendar_service(credentials, root_url=None):
+    """
+    Return the Calendar service for these credentials, building it once per process.
+
+    Parameters:
+    - credentials: The google.auth credentials used to authorize requests.
+    - root_url: Send every request, batches included, to this root URL instead of
+      https://www.googleapis.com/ (e.g. a local stand-in server).
+    """
+    for cached_credentials, cached_root_url, service in _services:
+        if cached_credentials is credentials and cached_root_url == root_url:
+            return service
+    with instrumentation.span('calendar.build_service'):
+        document = load_discovery_document()
+        if root_url:
+            document = json.loads(document)
+            document['rootUrl'] = root_url.rstrip('/') + '/'
+        service = build_from_document(document, credentials=credentials)
+    _services.append((credentials, root_url, service))
+    return service
+
+
+def thread_http(service):
+    """
+    Return an authorized http object for service, owned by the calling thread.
+
+    The service's own httplib2 connection is not thread safe and is shared by
+    every caller with the same credentials, so requests sent from several
+    threads go through execute(http=thread_http(service)) instead.
+    """
+    https = getattr(_thread_local, 'https', None)
+    if https is None:
+        https = _thread_local.https = {}
+    # The service is kept alongside its http object, so its id is never reused
+    entry = https.get(id(service))
+    if entry is None:
+        entry = https[id(service)] = (service, AuthorizedHttp(service._http.credentials, http=build_http()))
+    return entry[1]
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ['refresh']:
+        print(__doc__)
+        sys.exit(1)
+    print(f"Discovery document saved to {refresh_discovery_document()}")
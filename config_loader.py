@@ -1,15 +1,171 @@
+import base64
+import hashlib
 import json
+import os
+import threading
+
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+# `openssl enc -aes-256-cbc -salt -pbkdf2` output: this magic, an 8 byte salt, then the ciphertext
+OPENSSL_MAGIC = b'Salted__'
+OPENSSL_PBKDF2_ITERATIONS = 10000
+
+# Schemas accepted by validate(): a type, {key: schema} for required keys
+# ('key?' if optional, '*' for every value), or [schema] for every list item
+# A member without a role is loaded, and flagged, by MemberDirectory
+LAB_MEMBERS_SCHEMA = {'*': {'id': str, 'name': str, 'email': str, 'role?': (str, type(None))}}
+SERVICE_KEY_SCHEMA = dict
+CLIENT_SECRET_SCHEMA = {'installed?': {'client_id': str, 'client_secret': str}, 'web?': {'client_id': str, 'client_secret': str}}
+TOKEN_SCHEMA = {'refresh_token': str, 'client_id': str, 'client_secret': str, 'token?': (str, type(None)), 'expiry?': str}
+LABS_SCHEMA = {'*': {
+    'directory': str, 'presentation_day': str, 'maintenance_day': str, 'presentation_time?': str, 'location?': str,
+    'send_presentation_reminders?': bool, 'slack_channel?': str, 'slack_token_env?': str, 'lab_citizen_day_link?': str,
+    'use_outbox?': bool,
+}}
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def decrypt_openssl(data, password, iterations=OPENSSL_PBKDF2_ITERATIONS):
+    """
+    Decrypt the output of `openssl aes-256-cbc -salt -a -pbkdf2` in memory.
+
+    Parameters:
+    - data: The encrypted file contents, base64 encoded (-a) or raw.
+    - password: The -pass password.
+
+    Returns:
+    - The plaintext bytes.
+    """
+    if not data.startswith(OPENSSL_MAGIC):
+        data = base64.b64decode(b''.join(data.split()))
+    if not data.startswith(OPENSSL_MAGIC):
+        raise ValueError("Not an OpenSSL salted file.")
+    salt, ciphertext = data[8:16], data[16:]
+    key_iv = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations, dklen=48)
+    decryptor = Cipher(algorithms.AES(key_iv[:32]), modes.CBC(key_iv[32:])).decryptor()
+    padded = decryptor.update(ciphertext) + decryptor.finalize()
+    unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+    try:
+        return unpadder.update(padded) + unpadder.finalize()
+    except ValueError:
+        raise ValueError("Bad decrypt, wrong password?")
+
+
+def encrypt_openssl(plaintext, password, iterations=OPENSSL_PBKDF2_ITERATIONS, salt=None):
+    """
+    Encrypt like `openssl aes-256-cbc -salt -a -pbkdf2`, so decrypt_openssl() and openssl can read it.
+
+    Returns:
+    - The base64 encoded output, in 64 character lines.
+    """
+    salt = salt or os.urandom(8)
+    key_iv = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations, dklen=48)
+    padder = padding.PKCS7(algorithms.AES.block_size).padder()
+    padded = padder.update(plaintext) + padder.finalize()
+    encryptor = Cipher(algorithms.AES(key_iv[:32]), modes.CBC(key_iv[32:])).encryptor()
+    encoded = base64.b64encode(OPENSSL_MAGIC + salt + encryptor.update(padded) + encryptor.finalize())
+    return b''.join(encoded[index:index + 64] + b'\n' for index in range(0, len(encoded), 64))
+
+
+def validate(value, schema, path='$'):
+    """Raise ValueError if value does not match schema."""
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            raise ValueError(f"{path} should be an object.")
+        for key, item_schema in schema.items():
+            if key == '*':
+                for name, item in value.items():
+                    validate(item, item_schema, f"{path}.{name}")
+            elif key.endswith('?'):
+                if key[:-1] in value:
+                    validate(value[key[:-1]], item_schema, f"{path}.{key[:-1]}")
+            elif key not in value:
+                raise ValueError(f"{path} is missing {key!r}.")
+            else:
+                validate(value[key], item_schema, f"{path}.{key}")
+    elif isinstance(schema, list):
+        if not isinstance(value, list):
+            raise ValueError(f"{path} should be a list.")
+        for index, item in enumerate(value):
+            validate(item, schema[0], f"{path}[{index}]")
+    elif not isinstance(value, schema):
+        raise ValueError(f"{path} should be of type {getattr(schema, '__name__', schema)}.")
+
 
 class ConfigLoader:
-    def __init__(self, config_path):
+    """
+    Loads a JSON config from config_path, or from config_path + '.enc' in memory.
+
+    The encrypted file is the `openssl aes-256-cbc -salt -a -pbkdf2` output used in
+    the repository; the password is read from the password_env environment
+    variable unless given. Loaded configs are cached per process until the file
+    changes, so callers share one parsed object and must not modify it.
+    """
+    def __init__(self, config_path, password=None, password_env='SECRET_KEY', schema=None):
         self.config_path = config_path
+        self.password = password
+        self.password_env = password_env
+        self.schema = schema
+
+    def _source(self):
+        """Return the path to read and whether it is encrypted."""
+        if os.path.exists(self.config_path):
+            return self.config_path, False
+        encrypted_path = self.config_path + '.enc'
+        if os.path.exists(encrypted_path):
+            return encrypted_path, True
+        raise FileNotFoundError(f"Configuration file {self.config_path} not found.")
+
+    def exists(self):
+        return os.path.exists(self.config_path) or os.path.exists(self.config_path + '.enc')
+
+    def is_encrypted(self):
+        return self._source()[1]
+
+    def secret(self):
+        """Return the password encrypted files are read with, e.g. to write them back."""
+        # Like `-pass pass:$VAR` in the workflow, an unset variable means an empty password
+        return self.password if self.password is not None else os.environ.get(self.password_env, '')
+
+    def source(self):
+        """Return the path the config is read from, config_path or its encrypted copy."""
+        return self._source()[0]
+
+    def _read(self, path, encrypted):
+        with open(path, 'rb') as file:
+            data = file.read()
+        if encrypted:
+            try:
+                data = decrypt_openssl(data, self.secret())
+            except ValueError as e:
+                raise ValueError(f"Cannot decrypt {path}: {e}")
+        return data
+
+    def load_bytes(self):
+        """Return the raw, decrypted contents of the config file."""
+        return self._read(*self._source())
 
     def load_config(self):
         """Load JSON configuration file."""
-        try:
-            with open(self.config_path, 'r') as file:
-                return json.load(file)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Configuration file {self.config_path} not found.")
-        except json.JSONDecodeError:
-            raise ValueError(f"Invalid JSON format in {self.config_path}.")
+        path, encrypted = self._source()
+        stat = os.stat(path)
+        # The password is part of the key so a wrong one never gets a cached config
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, self.secret() if encrypted else None)
+        with _lock:
+            if key in _cache:
+                config = _cache[key]
+            else:
+                try:
+                    config = json.loads(self._read(path, encrypted))
+                except json.JSONDecodeError:
+                    raise ValueError(f"Invalid JSON format in {self.config_path}.")
+                _cache[key] = config
+        if self.schema is not None:
+            try:
+                validate(config, self.schema)
+            except ValueError as e:
+                raise ValueError(f"Invalid configuration in {self.config_path}: {e}")
+        return config
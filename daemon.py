@@ -0,0 +1,324 @@
+"""
+Long-running scheduler for the lab notification system.
+
+Instead of a cold `python main.py` every day (cron, the GitHub workflow, or
+trigger.sh with markers/ files to detect missed runs on a Mac), the daemon builds
+LabNotificationSystem once and keeps the Calendar service, the SMTP session and
+the Slack HTTP session open between runs, so a daily run only pays for its
+network calls; a session the server dropped meanwhile is reopened on first use.
+It runs once a day at --run-at and records every run in daemon_state.json. Days
+missed while the daemon was stopped or the machine was asleep are caught up in
+order, up to --catch-up-days back, with LabNotificationSystem.backfill() so only
+their still relevant notifications go out.
+
+A control endpoint on 127.0.0.1 reports the status and triggers runs. A day
+that already ran successfully is only run again with --force, since every run
+advances the rotations.
+
+Usage:
+    python daemon.py start [--run-at HH:MM] [--catch-up-days N] [--port N]
+    python daemon.py status [--port N]
+    python daemon.py trigger [--date YYYY-MM-DD] [--force] [--port N]
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import instrumentation
+from main import alert_developer, system_from_env
+
+STATE_FILE = 'daemon_state.json'
+DEFAULT_PORT = 8765
+# Also how long a sleeping machine can go unnoticed after it wakes up
+POLL_SECONDS = 60
+MAX_HISTORY = 30
+
+
+def parse_time(value):
+    return datetime.strptime(value, '%H:%M').time()
+
+
+class LabDaemon:
+    """
+    Runs a LabNotificationSystem once a day and catches up on missed days.
+
+    Parameters:
+    - system: The LabNotificationSystem, built once and reused by every run.
+    - run_at: The time of day of the daily run.
+    - catch_up_days: How many missed days, counting back from the latest due one,
+      are replayed. Older missed days are skipped.
+    - on_error: Called with the exception of a failed run, e.g. alert_developer.
+    """
+    def __init__(self, system, state_path=STATE_FILE, run_at=parse_time('07:00'), catch_up_days=3, concurrent=False,
+                 on_error=None, now=datetime.now):
+        self.system = system
+        self.state_path = state_path
+        self.run_at = run_at
+        self.catch_up_days = max(catch_up_days, 1)
+        self.concurrent = concurrent
+        self.on_error = on_error
+        self.now = now
+        self.started_at = now()
+        self.state = self._load_state()
+        self.running = None
+        # One run at a time, whether scheduled or triggered
+        self._run_lock = threading.RLock()
+        self._stop = threading.Event()
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {'last_run_date': None, 'runs': []}
+        with open(self.state_path, 'r') as file:
+            return json.load(file)
+
+    def _save_state(self):
+        directory = os.path.dirname(os.path.abspath(self.state_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.daemon_state.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(self.state, file, indent=4)
+            os.replace(tmp_path, self.state_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @property
+    def last_run_date(self):
+        last = self.state.get('last_run_date')
+        return date.fromisoformat(last) if last else None
+
+    def due_days(self, now=None):
+        """Return the days whose run is due at now, oldest first."""
+        now = now or self.now()
+        latest = now.date() if now.time() >= self.run_at else now.date() - timedelta(days=1)
+        last = self.last_run_date
+        if last is None:
+            # First start: run today if it is past run_at, never replay older days
+            return [latest] if latest == now.date() else []
+        first = max(last + timedelta(days=1), latest - timedelta(days=self.catch_up_days - 1))
+        return [first + timedelta(days=offset) for offset in range((latest - first).days + 1)]
+
+    def next_run(self, now=None):
+        """Return the datetime of the next scheduled run."""
+        now = now or self.now()
+        if self.due_days(now):
+            return now
+        day = now.date() if now.time() < self.run_at else now.date() + timedelta(days=1)
+        return datetime.combine(day, self.run_at)
+
+    def run_day(self, day):
+        """
+        Run the system as if today were day and record the run.
+
+        The day counts as done even if the run fails, like the marker written by
+        trigger.sh, so a failing day alerts once instead of on every poll.
+        """
+        with self._run_lock:
+            self.running = day.isoformat()
+            started = time.time()
+            error = None
+            instrumentation.reset()
+            try:
+                self.system.refresh()
+                today = self.now().date()
+                if day < today:
+                    # Only the notifications of a missed day that are still relevant go out
+                    self.system.backfill(day, day, today=today)
+                else:
+                    self.system.clock = lambda: day
+                    self.system.run(concurrent=self.concurrent)
+            except Exception as e:
+                error = e
+                print(f"Caught exception during execution: {e}")
+                if self.on_error:
+                    try:
+                        self.on_error(e)
+                    except Exception as alert_error:
+                        print(f"Error alerting the developer: {alert_error}")
+            finally:
+                self.running = None
+
+            record = {
+                'date': day.isoformat(),
+                'started': datetime.fromtimestamp(started).isoformat(timespec='seconds'),
+                'seconds': round(time.time() - started, 3),
+                'ok': error is None,
+                'error': str(error) if error else None,
+            }
+            last = self.last_run_date
+            if last is None or day > last:
+                self.state['last_run_date'] = day.isoformat()
+            self.state['runs'] = (self.state.get('runs', []) + [record])[-MAX_HISTORY:]
+            self._save_state()
+            return record
+
+    def completed(self, day):
+        """Return whether day already ran successfully."""
+        runs = self.state.get('runs', [])
+        records = [run for run in runs if run['date'] == day.isoformat()]
+        if records:
+            return any(record['ok'] for record in records)
+        last = self.last_run_date
+        if last is None or day > last:
+            return False
+        # Days before the kept history ran, or were skipped as too old to catch up on,
+        # while a day within it without a record was skipped
+        oldest = min((date.fromisoformat(run['date']) for run in runs), default=None)
+        return oldest is None or day < oldest
+
+    def trigger(self, day, force=False):
+        """
+        Run day on request, unless it already ran successfully and force is False.
+
+        Returns the run record, or a record with 'skipped' set if the day was not run.
+        """
+        with self._run_lock:
+            if not force and self.completed(day):
+                # Running it again would advance the rotations a second time
+                return {'date': day.isoformat(), 'ok': True, 'skipped': f"{day} already ran, trigger it with force to run it again"}
+            return self.run_day(day)
+
+    def run_due(self):
+        days = self.due_days()
+        last = self.last_run_date
+        if days and last and days[0] > last + timedelta(days=1):
+            print(f"Skipping missed day(s) {last + timedelta(days=1)} to {days[0] - timedelta(days=1)}, older than --catch-up-days")
+        return [self.run_day(day) for day in days]
+
+    def status(self):
+        return {
+            'pid': os.getpid(),
+            'started': self.started_at.isoformat(timespec='seconds'),
+            'run_at': self.run_at.strftime('%H:%M'),
+            'last_run_date': self.state.get('last_run_date'),
+            'next_run': self.next_run().isoformat(timespec='seconds'),
+            'running': self.running,
+            'runs': self.state.get('runs', [])[-5:],
+        }
+
+    def serve_forever(self):
+        """Run the due days, then poll until stop() is called."""
+        while not self._stop.is_set():
+            self.run_due()
+            wait = (self.next_run() - self.now()).total_seconds()
+            # Poll instead of sleeping until run_at, the wall clock jumps after a sleep
+            self._stop.wait(min(max(wait, 0), POLL_SECONDS))
+
+    def stop(self):
+        self._stop.set()
+
+
+def make_control_server(daemon, port=DEFAULT_PORT):
+    """Return an HTTP server on 127.0.0.1 with GET /status and POST /run[?date=YYYY-MM-DD][&force=true]."""
+    class ControlHandler(BaseHTTPRequestHandler):
+        def _reply(self, code, body):
+            data = json.dumps(body, indent=4).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if urlparse(self.path).path == '/status':
+                self._reply(200, daemon.status())
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != '/run':
+                self._reply(404, {'error': 'not found'})
+                return
+            query = parse_qs(url.query)
+            try:
+                day = date.fromisoformat(query['date'][0]) if 'date' in query else daemon.now().date()
+            except ValueError as e:
+                self._reply(400, {'error': str(e)})
+                return
+            if day > daemon.now().date():
+                self._reply(400, {'error': f"{day} is in the future"})
+                return
+            force = query.get('force', ['false'])[0].lower() in ('1', 'true')
+            self._reply(200, daemon.trigger(day, force=force))
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer(('127.0.0.1', port), ControlHandler)
+
+
+def _request(method, port, path):
+    request = urllib.request.Request(f'http://127.0.0.1:{port}{path}', method=method)
+    try:
+        # A triggered run answers once it has finished
+        with urllib.request.urlopen(request, timeout=600) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        raise SystemExit(json.load(e).get('error', e.reason))
+    except urllib.error.URLError as e:
+        raise SystemExit(f"No daemon listening on port {port}: {e.reason}")
+
+
+def start(args):
+    try:
+        # The daemon closes the clients when it stops, not after every run
+        system = system_from_env(close_clients=False)
+    except Exception as e:
+        print(f"Caught exception during initialization: {e}")
+        alert_developer(e)
+        return 1
+
+    daemon = LabDaemon(system, state_path=args.state, run_at=args.run_at, catch_up_days=args.catch_up_days,
+                       concurrent=os.environ.get('CONCURRENT_RUN', 'false').lower() == 'true', on_error=alert_developer)
+    server = make_control_server(daemon, args.port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    print(f"Lab notification daemon running, next run at {daemon.next_run()}, control on 127.0.0.1:{args.port}")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        system.close()
+        system.email_notifier.close()
+        system.slack_notifier.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the lab notification system as a long-running daemon.")
+    parser.add_argument('command', choices=['start', 'status', 'trigger'])
+    parser.add_argument('--port', type=int, default=int(os.environ.get('DAEMON_PORT', DEFAULT_PORT)))
+    parser.add_argument('--run-at', type=parse_time, default=parse_time(os.environ.get('DAEMON_RUN_AT', '07:00')))
+    parser.add_argument('--catch-up-days', type=int, default=3)
+    parser.add_argument('--state', default=STATE_FILE)
+    parser.add_argument('--date', type=date.fromisoformat)
+    parser.add_argument('--force', action='store_true', help="run the day even if it already ran")
+    args = parser.parse_args(argv)
+
+    if args.command == 'start':
+        return start(args)
+    if args.command == 'status':
+        print(json.dumps(_request('GET', args.port, '/status'), indent=4))
+        return 0
+    query = '&'.join(option for option in (f'date={args.date}' if args.date else '', 'force=true' if args.force else '') if option)
+    record = _request('POST', args.port, '/run' + (f'?{query}' if query else ''))
+    print(json.dumps(record, indent=4))
+    return 0 if record['ok'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
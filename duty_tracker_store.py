@@ -0,0 +1,185 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+
+
+class DutyTrackerStore:
+    """
+    In-memory duty tracker that is loaded once per run and written back atomically.
+
+    Updates are staged with set() and written by commit() as a single write-and-rename
+    of the tracker file, so a crash can never leave it truncated. Every committed
+    assignment is first appended to a JSON lines journal to keep the rotation
+    history, so no change to the tracker is ever missing from it, and a record
+    marking the commit written follows the rename. A commit journaled without
+    that record is replayed on the next load.
+    """
+    def __init__(self, path='duty_tracker.json', journal_path=None):
+        self.path = path
+        self.journal_path = journal_path or os.path.splitext(path)[0] + '_journal.jsonl'
+        self._lock = threading.Lock()
+        self._state = None
+        self._pending = []
+        # The journaled commits replayed into the loaded state but not written to the tracker file yet
+        self._replayed = []
+
+    def _load(self):
+        if self._state is None:
+            with open(self.path, 'r') as file:
+                state = json.load(file)
+            self._replayed = self._replay(state)
+            self._state = state
+        return self._state
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path):
+            return []
+        entries = []
+        with open(self.journal_path, 'r') as journal:
+            for line in journal:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Torn by a crash during commit(), before the tracker was written
+                    continue
+        return entries
+
+    def _replay(self, state):
+        """
+        Apply to state the latest journaled commits that were never written, and return their ids.
+
+        A commit is only replayed if its assignments follow on from state, so a
+        tracker edited by hand since is kept as it is.
+        """
+        commits = {}
+        for entry in self._read_journal():
+            if 'commit' not in entry:
+                # Journaled before commits were replayed
+                continue
+            if entry.get('written'):
+                # Whoever wrote the tracker had loaded it with every earlier commit settled
+                commits.clear()
+            else:
+                commits.setdefault(entry['commit'], []).append(entry)
+        # Only complete commits, a torn one never got to the rename
+        unwritten = [entries for entries in commits.values() if len(entries) == entries[0]['commit_size']]
+
+        # The fewest latest commits that apply in turn
+        for start in range(len(unwritten) - 1, -1, -1):
+            replayed = dict(state)
+            entries = [entry for commit in unwritten[start:] for entry in commit]
+            if all(_apply(replayed, entry) for entry in entries):
+                print(f"Replaying {len(unwritten) - start} unwritten duty tracker commit(s) from {self.journal_path}")
+                state.clear()
+                state.update(replayed)
+                return [commit[0]['commit'] for commit in unwritten[start:]]
+        return []
+
+    def _append_journal(self, lines):
+        with open(self.journal_path, 'a+') as journal:
+            # Start after a line torn by an earlier crash rather than on it
+            journal.seek(0, os.SEEK_END)
+            if journal.tell():
+                journal.seek(journal.tell() - 1)
+                if journal.read(1) != '\n':
+                    lines = [''] + lines
+            journal.write('\n'.join(lines) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def snapshot(self):
+        """Return a copy of the current tracker state, including staged updates."""
+        with self._lock:
+            return dict(self._load())
+
+    def get(self, duty_type, default=None):
+        with self._lock:
+            return self._load().get(duty_type, default)
+
+    def set(self, duty_type, member_id):
+        """Stage an assignment; it is written on the next commit()."""
+        with self._lock:
+            state = self._load()
+            self._pending.append({
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'duty': duty_type,
+                'previous': state.get(duty_type),
+                'member_id': member_id,
+            })
+            state[duty_type] = member_id
+
+    def commit(self):
+        """Journal the staged updates, then write them atomically. Returns False if there was nothing to write."""
+        with self._lock:
+            if not self._pending and not self._replayed:
+                return False
+
+            # Write-ahead: a crash before the rename leaves a journaled commit that
+            # the next load replays, never a tracker change without its journal entry
+            commit_ids = list(self._replayed)
+            if self._pending:
+                commit_ids.append(uuid.uuid4().hex)
+                self._append_journal([
+                    json.dumps(dict(entry, commit=commit_ids[-1], commit_size=len(self._pending))) for entry in self._pending
+                ])
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.duty_tracker.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as file:
+                    json.dump(self._state, file, indent=4)
+                    file.flush()
+                    os.fsync(file.fileno())
+                if os.path.exists(self.path):
+                    shutil.copymode(self.path, tmp_path)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._append_journal([json.dumps({'commit': commit_id, 'written': True}) for commit_id in commit_ids])
+            self._pending = []
+            self._replayed = []
+            return True
+
+    def history(self, duty_type=None, since=None):
+        """
+        Return journaled assignments, oldest first.
+
+        Parameters:
+        - duty_type: Only return assignments of this duty.
+        - since: Only return assignments made at or after this datetime.
+        """
+        entries = []
+        for entry in self._read_journal():
+            if 'duty' not in entry:
+                continue
+            if duty_type and entry['duty'] != duty_type:
+                continue
+            if since and datetime.fromisoformat(entry['timestamp']) < since:
+                continue
+            entries.append(entry)
+        return entries
+
+
+def _apply(state, entry):
+    """Apply a journaled assignment to state if it follows on from it, returning whether it did."""
+    if state.get(entry['duty']) != entry['previous']:
+        return False
+    state[entry['duty']] = entry['member_id']
+    return True
+
+
+if __name__ == "__main__":
+    # Usage: python duty_tracker_store.py [duty_type]
+    store = DutyTrackerStore()
+    for entry in store.history(sys.argv[1] if len(sys.argv) > 1 else None):
+        print(f"{entry['timestamp']} | {entry['duty']:<12} | {entry['previous']} -> {entry['member_id']}")
@@ -1,28 +1,175 @@
 import smtplib
+import threading
+import time
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
+import instrumentation
 
-class EmailNotifier:
-    def __init__(self, username, password):
+
+def build_message(sender, recipients, subject, message, html=None):
+    """Return the MIME text of an email, with an HTML alternative part if html is given."""
+    # With an HTML body, clients show it and fall back to the plain text part
+    msg = MIMEMultipart('alternative') if html is not None else MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = ', '.join(recipients)
+    msg['Subject'] = subject
+
+    msg.attach(MIMEText(message, 'plain'))
+    if html is not None:
+        msg.attach(MIMEText(html, 'html'))
+    return msg.as_string()
+
+
+class SMTPSessions:
+    """
+    SMTP settings, idle sessions and reconnect policy, shared by EmailNotifier and AsyncEmailNotifier.
+
+    Authenticated sessions are kept open for the life of the notifier. Each send
+    takes an idle one, or opens one, so sends at the same time do not wait on
+    each other's SMTP round trips. The notifiers only open, use and close the
+    sessions.
+    """
+    def __init__(self, username, password, host='smtp.gmail.com', port=587, use_tls=True, timeout=30, max_reconnects=1):
         self.username = username
         self.password = password
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.max_reconnects = max_reconnects
+
+        self._idle = []
+        self._lock = threading.Lock()
+        self.handshakes = 0
+        self.latencies = []
+
+    def _build_message(self, recipients, subject, message, html=None):
+        return build_message(self.username, recipients, subject, message, html)
+
+    def _take_session(self):
+        """Return an idle session, or None if a new one must be opened."""
+        with self._lock:
+            return self._idle.pop() if self._idle else None
+
+    def _return_session(self, server):
+        with self._lock:
+            self._idle.append(server)
+
+    def _take_idle_sessions(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        return idle
+
+    def _connected(self):
+        with self._lock:
+            self.handshakes += 1
 
-    def send_email(self, recipients, subject, message):
-        """Send an email to the specified recipients."""
-        msg = MIMEMultipart()
-        msg['From'] = self.username
-        msg['To'] = ', '.join(recipients)
-        msg['Subject'] = subject
+    def _dropped(self, server, attempt):
+        """Close a session the server dropped. Returns whether to retry over a new one."""
+        server.close()
+        if attempt == self.max_reconnects:
+            return False
+        instrumentation.count('retries', service='email')
+        return True
 
-        msg.attach(MIMEText(message, 'plain'))
+    def _delivered(self, text, started):
+        instrumentation.count('bytes_sent', len(text), service='email')
+        with self._lock:
+            self.latencies.append(time.perf_counter() - started)
 
+    def stats(self):
+        """Return handshake and per-message latency statistics for this notifier."""
+        sent = len(self.latencies)
+        return {
+            'handshakes': self.handshakes,
+            'messages': sent,
+            'avg_latency_ms': 1000 * sum(self.latencies) / sent if sent else 0.0,
+            'max_latency_ms': 1000 * max(self.latencies) if sent else 0.0,
+        }
+
+
+class EmailNotifier(SMTPSessions):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def connect(self):
+        """Open and authenticate a new SMTP session."""
+        with instrumentation.span('email.connect'):
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+        self._connected()
+        return server
+
+    def close(self):
+        """Close every open SMTP session."""
+        for server in self._take_idle_sessions():
+            try:
+                server.quit()
+            except (smtplib.SMTPServerDisconnected, OSError):
+                server.close()
+
+    def deliver(self, recipients, subject, message, html=None):
+        """Send an email, raising on failure."""
+        text = self._build_message(recipients, subject, message, html)
+        started = time.perf_counter()
+        server = self._take_session()
+        with instrumentation.span('email.send'):
+            try:
+                for attempt in range(self.max_reconnects + 1):
+                    if server is None:
+                        server = self.connect()
+                    instrumentation.count('calls', service='email')
+                    try:
+                        server.sendmail(self.username, recipients, text)
+                        break
+                    except (smtplib.SMTPServerDisconnected, ConnectionError):
+                        dropped, server = server, None
+                        if not self._dropped(dropped, attempt):
+                            raise
+            except Exception:
+                instrumentation.count('failures', service='email')
+                raise
+            finally:
+                if server is not None:
+                    self._return_session(server)
+        self._delivered(text, started)
+
+    def send_email(self, recipients, subject, message, html=None):
+        """Send an email to the specified recipients, with an optional HTML alternative body."""
         try:
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(self.username, self.password)
-            text = msg.as_string()
-            server.sendmail(self.username, recipients, text)
-            server.quit()
+            self.deliver(recipients, subject, message, html)
         except Exception as e:
             print(f"Error sending email: {e}")
+
+    def send_many(self, messages):
+        """
+        Send several emails over the same SMTP session.
+
+        Parameters:
+        - messages: An iterable of (recipients, subject, message) or
+          (recipients, subject, message, html) tuples.
+
+        Returns:
+        - A list with one entry per message: None if it was sent, otherwise the exception raised.
+        """
+        errors = []
+        for recipients, subject, message, *html in messages:
+            try:
+                self.deliver(recipients, subject, message, *html)
+                errors.append(None)
+            except Exception as e:
+                print(f"Error sending email to {', '.join(recipients)}: {e}")
+                errors.append(e)
+        return errors
+
+    def report(self):
+        stats = self.stats()
+        print(f"Email: {stats['messages']} message(s) over {stats['handshakes']} SMTP handshake(s) | "
+              f"avg {stats['avg_latency_ms']:.1f} ms | max {stats['max_latency_ms']:.1f} ms")
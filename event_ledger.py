@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+# Private extended property holding an event's ledger key on the calendar side
+LEDGER_KEY_PROPERTY = 'ledgerKey'
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def event_key(calendar_id, event_body):
+    """Return the deterministic key of an event: its calendar, title, start and attendees."""
+    return _digest([
+        calendar_id,
+        event_body.get('summary'),
+        event_body.get('start'),
+        sorted(attendee['email'] for attendee in event_body.get('attendees', [])),
+    ])
+
+
+def event_fingerprint(event_body):
+    """Return a digest of the whole event body, ignoring the extended properties added on insert."""
+    return _digest({name: value for name, value in event_body.items() if name != 'extendedProperties'})
+
+
+class EventLedger:
+    """
+    Local index of the calendar events created by CalendarManager.
+
+    Each entry maps an event key to the id of the event it created and a fingerprint
+    of its body, so a rerun can skip an identical event or patch a changed one
+    without asking the Calendar API.
+    """
+    def __init__(self, path='event_ledger.json', max_age_days=180):
+        self.path = path
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                self._entries = json.load(file)
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def record(self, key, calendar_id, event_id, fingerprint):
+        with self._lock:
+            self._entries[key] = {
+                'calendar_id': calendar_id,
+                'event_id': event_id,
+                'fingerprint': fingerprint,
+                'recorded_at': datetime.now().isoformat(timespec='seconds'),
+            }
+
+    def forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def save(self):
+        """Drop entries older than max_age_days and atomically write the ledger."""
+        cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat(timespec='seconds')
+        with self._lock:
+            self._entries = {key: entry for key, entry in self._entries.items() if entry['recorded_at'] >= cutoff}
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as file:
+                json.dump(self._entries, file, indent=4, sort_keys=True)
+            os.replace(tmp_path, self.path)
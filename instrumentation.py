@@ -0,0 +1,160 @@
+"""
+Lightweight timing spans and counters for a run.
+
+Code under measurement wraps its work in span() and bumps counters with count().
+At the end of a run the summary is written as JSON and in the Prometheus
+textfile format (for node_exporter's textfile collector).
+
+Usage:
+    with instrumentation.span('email.send'):
+        ...
+    instrumentation.count('retries', service='slack')
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+METRIC_PREFIX = 'lfl'
+# Individual spans kept for the slowest-spans report; aggregates cover every span
+MAX_SPANS = 10000
+
+_lock = threading.Lock()
+_started = time.perf_counter()
+_spans = []
+_span_stats = {}
+_counters = {}
+
+
+def reset():
+    """Forget every span and counter, e.g. between benchmark runs."""
+    global _started
+    with _lock:
+        _started = time.perf_counter()
+        del _spans[:]
+        _span_stats.clear()
+        _counters.clear()
+
+
+def record_span(name, seconds, started=None, ok=True):
+    with _lock:
+        if len(_spans) < MAX_SPANS:
+            _spans.append({
+                'name': name,
+                'start_ms': 1000 * ((started if started is not None else time.perf_counter() - seconds) - _started),
+                'ms': 1000 * seconds,
+                'ok': ok,
+            })
+        stats = _span_stats.setdefault(name, {'count': 0, 'failures': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['failures'] += 0 if ok else 1
+        stats['total_ms'] += 1000 * seconds
+        stats['max_ms'] = max(stats['max_ms'], 1000 * seconds)
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as a span called name; a block that raises is recorded as failed."""
+    started = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        record_span(name, time.perf_counter() - started, started, ok)
+
+
+def count(name, amount=1, **labels):
+    """Add amount to the counter name with the given labels."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def counter(name, **labels):
+    with _lock:
+        return _counters.get((name, tuple(sorted(labels.items()))), 0)
+
+
+def slowest(limit=5):
+    """Return the limit slowest spans, slowest first."""
+    with _lock:
+        return sorted(_spans, key=lambda item: item['ms'], reverse=True)[:limit]
+
+
+def format_slowest(limit=5):
+    return "\n".join(f"{item['ms']:10.1f} ms  {item['name']}{'' if item['ok'] else ' (failed)'}" for item in slowest(limit))
+
+
+def summary():
+    with _lock:
+        return {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'elapsed_ms': 1000 * (time.perf_counter() - _started),
+            'spans': {name: dict(stats) for name, stats in sorted(_span_stats.items())},
+            'counters': [dict(labels, name=name, value=value) for (name, labels), value in sorted(_counters.items())],
+        }
+
+
+def _write_atomically(path, content):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+
+def write_json(path):
+    _write_atomically(path, json.dumps(dict(summary(), slowest=slowest(20)), indent=4))
+
+
+def _sample(value):
+    """Format a sample value exactly: {:g} would round counts past a million to 6 digits."""
+    return f'{value:d}' if isinstance(value, int) else repr(float(value))
+
+
+def _labels(labels):
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}' if labels else ''
+
+
+def write_prometheus(path):
+    """Write the summary in the Prometheus text exposition format."""
+    data = summary()
+    lines = [
+        f'# HELP {METRIC_PREFIX}_run_duration_seconds Wall time of the run.',
+        f'# TYPE {METRIC_PREFIX}_run_duration_seconds gauge',
+        f'{METRIC_PREFIX}_run_duration_seconds {data["elapsed_ms"] / 1000:.6f}',
+        f'# HELP {METRIC_PREFIX}_run_timestamp_seconds When the summary was written.',
+        f'# TYPE {METRIC_PREFIX}_run_timestamp_seconds gauge',
+        f'{METRIC_PREFIX}_run_timestamp_seconds {time.time():.0f}',
+    ]
+    for metric, field, scale, help_text in (
+        ('span_seconds_total', 'total_ms', 1000, 'Total time spent in the span.'),
+        ('span_seconds_max', 'max_ms', 1000, 'Slowest single occurrence of the span.'),
+        ('span_count', 'count', None, 'Number of times the span ran.'),
+        ('span_failures', 'failures', None, 'Number of times the span raised.'),
+    ):
+        lines.append(f'# HELP {METRIC_PREFIX}_{metric} {help_text}')
+        lines.append(f'# TYPE {METRIC_PREFIX}_{metric} gauge')
+        for name, stats in data['spans'].items():
+            lines.append(f'{METRIC_PREFIX}_{metric}{_labels([("span", name)])} {_sample(stats[field] / scale if scale else stats[field])}')
+
+    with _lock:
+        counters = sorted(_counters.items())
+    for name in sorted({name for (name, _), _ in counters}):
+        lines.append(f'# TYPE {METRIC_PREFIX}_{name}_total counter')
+        for (counter_name, labels), value in counters:
+            if counter_name == name:
+                lines.append(f'{METRIC_PREFIX}_{name}_total{_labels(labels)} {_sample(value)}')
+    _write_atomically(path, '\n'.join(lines) + '\n')
+
+
+def write_summary(directory):
+    """Write run_metrics.json and run_metrics.prom into directory."""
+    write_json(os.path.join(directory, 'run_metrics.json'))
+    write_prometheus(os.path.join(directory, 'run_metrics.prom'))
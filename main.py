@@ -2,77 +2,40 @@
 This script is used to send reminders to lab members about their duties.
 The script is run every day at 7:00 AM PST.
 """
+import asyncio
 import base64
 import calendar
+import hashlib
 import json
 import os
 import subprocess
 import sys
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, datetime, timedelta
 
-import holidays
+_imports_started = time.perf_counter()
 
-from calendar_manager import CalendarManager
-from config_loader import ConfigLoader
-from email_notifier import EmailNotifier
-from slack_notifier import SlackNotifier
+import instrumentation  # noqa: E402
+from calendar_manager import CalendarManager  # noqa: E402
+from config_loader import SERVICE_KEY_SCHEMA, ConfigLoader  # noqa: E402
+from duty_tracker_store import DutyTrackerStore  # noqa: E402
+from email_notifier import EmailNotifier  # noqa: E402
+from meeting_calendar import MeetingCalendar, chosen_day, next_monday  # noqa: E402
+from member_directory import MemberDirectory  # noqa: E402
+from message_templates import load_template, render as render_template  # noqa: E402
+from outbox import CALENDAR, EMAIL, SLACK, DeadLetterError, Dispatcher, Outbox  # noqa: E402
+from rotation_engine import RotationEngine  # noqa: E402
+from slack_notifier import SlackNotifier  # noqa: E402
+import token_cache  # noqa: E402
+
+# Mostly the Google client libraries
+instrumentation.record_span('imports', time.perf_counter() - _imports_started, _imports_started)
 
 __author__ = "Sadman Ahmed Shanto"
 __email__ = "shanto@usc.edu"
 
-MEETING_SIGNATURE = "\n\nLooking Forward to it 🤩,\nLFL Bot."
-SERVICE_SIGNATURE = "\n\nThank you for your service 🫡,\nLFL Bot."
-
-def create_reminder(instruction):
-    check_symbol = "-"
-    # check_symbol = "-"
-    return "{} {}\n".format(check_symbol, instruction)
-
-def create_step(reminder):
-    check_symbol = "☐"
-    # check_symbol = "-"
-    return "{} {}\n".format(check_symbol, reminder)
-
-def get_header(name, date_maintenance):
-    header = "Hi {},\n\nThis is a reminder that next week it is your turn to do the LFL Lab Maintenance. Please refer to the following checklist.\n\n".format(name)
-    return header
-
-def get_signature(bot_name="LFL Bot"):
-    salute = "🫡 "
-    # salute = ""
-    return "\n\nThank you for your service {},\n{}".format(salute, bot_name)
-
-def get_reminders(reminders_list):
-    reminders = []
-    for reminder_string in reminders_list:
-        reminders.append(create_reminder(reminder_string))
-    prompt = "\n\nSome safety considerations from EH&S:\n"
-    reminders = "".join(reminders)
-    return prompt + reminders + "\n"
-
-def create_email_content(name, date_maintenance, instructions, reminders, bot_name="LFL Bot"):
-    header = get_header(name, date_maintenance)
-    steps = []
-    for instruction in instructions:
-        steps.append(create_step(instruction))
-    body = "".join(steps)
-    reminders = get_reminders(reminders)
-    signature = get_signature(bot_name)
-    return header + body + reminders + signature
-
-def chosen_day(day_name):
-    days = {
-        "Monday": 0,
-        "Tuesday": 1,
-        "Wednesday": 2,
-        "Thursday": 3,
-        "Friday": 4,
-        "Saturday": 5,
-        "Sunday": 6
-    }
-    return days.get(day_name, -1)  # Returns -1 if the day name is not valid
-
 def get_decoded_service_key(base64_key):
     if base64_key:
         decoded_key = base64.b64decode(base64_key).decode('utf-8')
@@ -82,71 +45,404 @@ def get_decoded_service_key(base64_key):
 
 def load_google_service_key(file_path):
         try:
-            with open(file_path, 'r') as file:
-                return json.load(file)
+            # Read from file_path, or decrypted in memory from file_path + '.enc'
+            return ConfigLoader(file_path, schema=SERVICE_KEY_SCHEMA).load_config()
         except Exception as e:
             raise ValueError(f"Failed to load Google service key: {e}")
 
 
 
 
+class PipelineError(Exception):
+    """Raised after a concurrent run with the failures of every pipeline that failed."""
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("\n\n".join(
+            f"{name}:\n{''.join(traceback.format_exception(type(e), e, e.__traceback__))}" for name, e in errors
+        ))
+
+
+def coalesce_slack_actions(actions):
+    """Merge the SLACK actions into one message per channel, like SlackNotifier.flush()."""
+    held = {}
+    for channel, payload in actions:
+        if channel == SLACK:
+            held.setdefault(payload['channel'], []).append(payload['message'])
+    return [action for action in actions if action[0] != SLACK] + [
+        (SLACK, {'channel': channel, 'message': "\n\n".join(messages)}) for channel, messages in held.items()
+    ]
+
+
 class LabNotificationSystem:
-    def __init__(self, presentation_day, presentation_time, maintenance_day, location, send_presentation_reminders, force_maintenance_reminder):
-        self.lab_members = ConfigLoader('lab_members.json').load_config()
+    # How many days after the send date each pipeline's notifications stay relevant:
+    # the meeting a week later, the end of next week's maintenance, the next day's snacks
+    RELEVANCE_DAYS = {
+        'send_presentation_reminders': 7,
+        'send_lab_maintenance_reminders': 7,
+        'send_lab_snacks_reminders': 1,
+    }
+
+    def __init__(self, presentation_day, presentation_time, maintenance_day, location, send_presentation_reminders, force_maintenance_reminder, clock=None, horizon_days=730, coalesce_slack=False, outbox_path=None,
+                 email_notifier=None, slack_notifier=None, calendar_manager=None, metrics_dir=None,
+                 members_path='lab_members.json', tracker_path='duty_tracker.json', slack_channel='#lfl-general-exclusive', lab_citizen_day_link=None, close_clients=True,
+                 report_metrics=True):
+        self.members_path = members_path
+        self.members = MemberDirectory.load(members_path)
         self.gmail_username = os.environ.get('GMAIL_USERNAME')
         self.gmail_password = os.environ.get('GMAIL_PASSWORD')
         self.slack_token = os.environ.get('SLACK_TOKEN')
         self.google_calendar_service_key = load_google_service_key('service_key.json')
+        self.rotation = RotationEngine(self.members)
 
 
         self.maintenance_day = chosen_day(maintenance_day)
         self.presentation_day = chosen_day(presentation_day)
         self.presentation_time = presentation_time
         self.location = location
-        self.us_holidays = holidays.US()
+        # Every date decision goes through self.today() so runs can be replayed against another clock
+        self.clock = clock or date.today
+        self.meeting_calendar = MeetingCalendar(self.presentation_day, self.maintenance_day, start=self.today(), horizon_days=horizon_days)
+        self.us_holidays = self.meeting_calendar.us_holidays
         self.presentation_reminders_enabled = send_presentation_reminders
         self.force_maintenance_reminder = force_maintenance_reminder
+        self.duty_tracker = DutyTrackerStore(tracker_path)
+        self.slack_channel = slack_channel
+        self.lab_citizen_day_link = lab_citizen_day_link or os.environ.get("ONENOTE_LCD")
+
+
+        # The clients can be injected, e.g. to run against local stand-ins (see benchmarks/e2e.py)
+        self.email_notifier = email_notifier or EmailNotifier(self.gmail_username, self.gmail_password)
+        self.calendar_manager = calendar_manager or CalendarManager(self.email_notifier)
+        self.slack_notifier = slack_notifier or SlackNotifier(self.slack_token, coalesce=coalesce_slack)
+        # False when the clients are shared with other labs and closed by their owner (see multi_lab.py)
+        self.close_clients = close_clients
+        # Where run() writes run_metrics.json and run_metrics.prom, nowhere if None
+        self.metrics_dir = metrics_dir
+        # False when other labs share the process-wide spans and their owner prints them together (see multi_lab.py)
+        self.report_metrics = report_metrics
+        # With an outbox the pipelines only decide what to send; dispatch_outbox() sends it
+        self.outbox = Outbox(outbox_path) if outbox_path else None
+        # The Slack actions held back in coalescing mode until finish_run() spools them merged
+        self.held_slack = []
+        # Set by backfill() while replaying a day whose notifications are no longer relevant
+        self.muted = False
+        # The (channel, payload) actions decided by the pipelines during run_async()
+        self.collected = None
+
+    def today(self):
+        return self.clock()
+
+    def refresh(self):
+        """
+        Pick up changes made on disk since the last run, for long-running processes.
 
+        The roster is reloaded (free when lab_members.json is unchanged) and the
+        duty tracker is read again on its next use.
+        """
+        members = MemberDirectory.load(self.members_path)
+        if members.members != self.members.members:
+            self.members = members
+            self.rotation = RotationEngine(members)
+        self.duty_tracker = DutyTrackerStore(self.duty_tracker.path)
+
+    def close(self):
+        if self.close_clients:
+            self.email_notifier.close()
+            self.slack_notifier.close()
+        if self.outbox is not None:
+            self.outbox.close()
+
+    def _spool(self, channel, payload):
+        dedupe_key = hashlib.sha1(json.dumps([str(self.today()), channel, payload], sort_keys=True).encode('utf-8')).hexdigest()
+        self.outbox.enqueue(channel, payload, dedupe_key=dedupe_key)
+
+    def _skip(self, description):
+        if self.muted:
+            print(f"Not sent, no longer relevant: {description}")
+        return self.muted
+
+    def _defer(self, channel, payload):
+        """Spool the action to the outbox, or collect it for run_async(). Returns False if it must be sent now."""
+        if self.outbox is not None:
+            if channel == SLACK and self.slack_notifier.coalesce:
+                self.held_slack.append((channel, payload))
+            else:
+                self._spool(channel, payload)
+        elif self.collected is not None:
+            self.collected.append((channel, payload))
+        else:
+            return False
+        return True
+
+    def notify_email(self, recipients, subject, message, html=None):
+        if self._skip(subject):
+            return
+        if not self._defer(EMAIL, {'recipients': recipients, 'subject': subject, 'message': message, 'html': html}):
+            self.email_notifier.send_email(recipients, subject, message, html)
+
+    def notify_emails(self, messages):
+        """Send several (recipients, subject, message, html) emails; messages can be any iterable."""
+        messages = list(messages)
+        if self._skip(f"{len(messages)} x {messages[0][1]}" if messages else "no emails"):
+            return
+        if self.outbox is not None or self.collected is not None:
+            for message in messages:
+                self.notify_email(*message)
+        else:
+            self.email_notifier.send_many(messages)
+
+    def notify_slack(self, channel, message):
+        if self._skip(f"Slack message to {channel}"):
+            return
+        if not self._defer(SLACK, {'channel': channel, 'message': message}):
+            self.slack_notifier.send_message(channel, message)
+
+    def schedule_event(self, event_body, calendar_id='primary'):
+        if self._skip(f"Calendar event {event_body.get('summary')}"):
+            return
+        if not self._defer(CALENDAR, {'event_body': event_body, 'calendar_id': calendar_id}):
+            self.calendar_manager.insert_event(event_body, calendar_id=calendar_id)
+
+    def dispatch_outbox(self, retry_within=120):
+        """Send the spooled actions, including those left pending by earlier runs. Returns the new dead letters."""
+        started = time.time()
+        dispatcher = Dispatcher(self.outbox, {
+            EMAIL: lambda payload: self.email_notifier.deliver(payload['recipients'], payload['subject'], payload['message'], payload.get('html')),
+            SLACK: lambda payload: self.slack_notifier.post(payload['channel'], payload['message']),
+            # Alerted once, through the DeadLetterError, if the insert is dead-lettered
+            CALENDAR: lambda payload: self.calendar_manager.insert_event(payload['event_body'], calendar_id=payload['calendar_id'], alert=False),
+        })
+        sent, failed = dispatcher.drain(retry_within=retry_within)
+        print(f"Outbox: {sent} action(s) sent, {failed} failed attempt(s) | {self.outbox.counts()}")
+        return self.outbox.dead_letters(since=started)
+
+    def run(self, concurrent=False):
+        print("=====================================")
+        print("Running the lab notification system...")
+        print(f"Date: {self.today()} | Time: {datetime.now().strftime('%H:%M:%S')} | OS: {os.name}")
+        print("=====================================")
+        started = time.perf_counter()
+        try:
+            if concurrent:
+                self.run_pipelines_concurrently()
+            else:
+                print("Handling Presentation reminders...")
+                self.run_pipeline(self.send_presentation_reminders)
+                print("Handling Lab maintenance reminders...")
+                self.run_pipeline(self.send_lab_maintenance_reminders)
+                print("Handling Lab snacks reminders...")
+                self.run_pipeline(self.send_lab_snacks_reminders)
+        except BaseException as e:
+            self.finish_run(started, error=e)
+            raise
+        dead_letters = self.finish_run(started)
+        print("=====================================")
+        print("\n")
+        if dead_letters:
+            raise DeadLetterError(dead_letters)
 
-        self.email_notifier = EmailNotifier(self.gmail_username, self.gmail_password)
-        self.calendar_manager = CalendarManager(self.email_notifier)
-        self.slack_notifier = SlackNotifier(self.slack_token)
+    async def run_async(self, max_sessions=3, max_in_flight=4):
+        """
+        Run the pipelines, then send everything they decided at once with the asyncio clients.
 
-    def run(self):
+        The pipelines only collect their notifications, as with an outbox, so the
+        duty tracker is committed even if a send fails. Failed Slack messages and
+        calendar events are raised together as a PipelineError once every send has
+        finished; failed emails are printed, as in run(). With an outbox the
+        actions are spooled and dispatched as usual.
+        """
         print("=====================================")
-        print("Running the lab notification system...")
-        print(f"Date: {date.today()} | Time: {datetime.now().strftime('%H:%M:%S')} | OS: {os.name}")
+        print("Running the lab notification system (async I/O)...")
+        print(f"Date: {self.today()} | Time: {datetime.now().strftime('%H:%M:%S')} | OS: {os.name}")
         print("=====================================")
-        print("Handling Presentation reminders...")
-        self.send_presentation_reminders()
-        print("Handling Lab maintenance reminders...")
-        self.send_lab_maintenance_reminders()
-        print("Handling Lab snacks reminders...")
-        self.send_lab_snacks_reminders()
+        started = time.perf_counter()
+        self.collected = []
+        try:
+            try:
+                print("Handling Presentation reminders...")
+                self.run_pipeline(self.send_presentation_reminders)
+                print("Handling Lab maintenance reminders...")
+                self.run_pipeline(self.send_lab_maintenance_reminders)
+                print("Handling Lab snacks reminders...")
+                self.run_pipeline(self.send_lab_snacks_reminders)
+            finally:
+                actions, self.collected = self.collected, None
+                with instrumentation.span('send_async'):
+                    errors = await self.send_async(actions, max_sessions=max_sessions, max_in_flight=max_in_flight)
+        except BaseException as e:
+            self.finish_run(started, error=e)
+            raise
+        dead_letters = self.finish_run(started)
         print("=====================================")
         print("\n")
+        if errors:
+            raise PipelineError(errors)
+        if dead_letters:
+            raise DeadLetterError(dead_letters)
+
+    async def send_async(self, actions, max_sessions=3, max_in_flight=4):
+        """
+        Send (channel, payload) actions concurrently, each service bounded by its own semaphore.
 
-    def get_next_member(self, members, current_member_id):
-        current_index = members.index(next((m for m in members if m['id'] == current_member_id), None))
-        next_index = (current_index + 1) % len(members)
-        return members[next_index]['id']
+        Returns:
+        - A list of (description, exception) for the Slack messages and calendar events that failed.
+        """
+        if not actions:
+            return []
+        # Imported here so runs with the synchronous clients never load aiohttp
+        from async_clients import AsyncCalendarManager, AsyncEmailNotifier, AsyncSlackNotifier
+
+        if self.slack_notifier.coalesce:
+            actions = coalesce_slack_actions(actions)
+
+        email_notifier = AsyncEmailNotifier.from_notifier(self.email_notifier, max_sessions=max_sessions)
+        slack_notifier = AsyncSlackNotifier.from_notifier(self.slack_notifier, max_in_flight=max_in_flight)
+        calendar_manager = AsyncCalendarManager(self.calendar_manager, email_notifier=email_notifier, max_in_flight=max_in_flight)
+        handlers = {
+            EMAIL: lambda payload: email_notifier.send_email(payload['recipients'], payload['subject'], payload['message'], payload.get('html')),
+            SLACK: lambda payload: slack_notifier.post(payload['channel'], payload['message']),
+            CALENDAR: lambda payload: calendar_manager.insert_event(payload['event_body'], calendar_id=payload['calendar_id']),
+        }
+        try:
+            results = await asyncio.gather(*(handlers[channel](payload) for channel, payload in actions), return_exceptions=True)
+        finally:
+            await asyncio.gather(email_notifier.close(), slack_notifier.close(), calendar_manager.close())
+        email_notifier.report()
+
+        errors = []
+        for (channel, payload), result in zip(actions, results):
+            if isinstance(result, Exception):
+                target = payload['channel'] if channel == SLACK else payload['event_body'].get('summary')
+                print(f"{channel} {target} failed: {result}")
+                errors.append((f"{channel} {target}", result))
+        return errors
+
+    def backfill(self, start, end, today=None):
+        """
+        Replay the daily decisions for every day from start to end, e.g. after the bot was down.
+
+        The rotations advance as if each day had run, and duty_tracker.json is written
+        once at the end. A day's notifications are only sent if they are still
+        relevant on today (see RELEVANCE_DAYS), all through the same connections.
+        """
+        today = today or date.today()
+        print("=====================================")
+        print(f"Backfilling the lab notification system from {start} to {end}...")
+        print("=====================================")
+        clock, force_maintenance_reminder = self.clock, self.force_maintenance_reminder
+        # A forced maintenance reminder would go out for every replayed day
+        self.force_maintenance_reminder = False
+        started = time.perf_counter()
+        try:
+            try:
+                day = start
+                while day <= end:
+                    print(f"Replaying {day}...")
+                    self.clock = lambda day=day: day
+                    for pipeline in (self.send_presentation_reminders, self.send_lab_maintenance_reminders, self.send_lab_snacks_reminders):
+                        self.muted = day + timedelta(days=self.RELEVANCE_DAYS[pipeline.__name__]) < today
+                        self.run_pipeline(pipeline)
+                    day += timedelta(days=1)
+            finally:
+                self.clock, self.force_maintenance_reminder, self.muted = clock, force_maintenance_reminder, False
+        except BaseException as e:
+            self.finish_run(started, error=e)
+            raise
+        dead_letters = self.finish_run(started)
+        print("=====================================")
+        print("\n")
+        if dead_letters:
+            raise DeadLetterError(dead_letters)
+
+    def finish_run(self, started, error=None):
+        """
+        Write the duty tracker and send everything held back by the pipelines. Returns the new dead letters.
+
+        Every step is attempted and the metrics are always written. The first
+        error is raised at the end, unless the run already failed with error:
+        that one is the caller's to raise, and the errors here are only printed.
+        """
+        dead_letters = []
+        first_error = None
+        try:
+            if self.outbox is not None:
+                # The Slack notices held back in coalescing mode, one message per channel
+                held, self.held_slack = self.held_slack, []
+                for channel, payload in coalesce_slack_actions(held):
+                    self._spool(channel, payload)
+            self.duty_tracker.commit()
+            if self.outbox is not None:
+                dead_letters = self.dispatch_outbox()
+            if self.close_clients:
+                self.email_notifier.close()
+                self.email_notifier.report()
+        except Exception as e:
+            print(f"Error finishing the run: {e}")
+            first_error = e
+        try:
+            # Post the Slack notices held back in coalescing mode
+            self.slack_notifier.flush()
+        except Exception as e:
+            print(f"Error posting the held Slack notices: {e}")
+            first_error = first_error or e
+        instrumentation.record_span('run', time.perf_counter() - started, started)
+        self.write_metrics()
+        if first_error is not None and error is None:
+            raise first_error
+        return dead_letters
+
+    def run_pipeline(self, pipeline):
+        with instrumentation.span(f'pipeline.{pipeline.__name__}'):
+            return pipeline()
+
+    def write_metrics(self):
+        """Print the slowest spans of the run and write its metrics summary to metrics_dir."""
+        if self.report_metrics:
+            print(f"Slowest spans:\n{instrumentation.format_slowest()}")
+        if self.metrics_dir:
+            try:
+                instrumentation.write_summary(self.metrics_dir)
+            except OSError as e:
+                print(f"Error writing run metrics: {e}")
+
+    def run_pipelines_concurrently(self):
+        """
+        Run the presentation, maintenance and snacks pipelines in parallel threads.
+
+        A failing pipeline does not stop the others; all failures are raised
+        together as one PipelineError once every pipeline has finished.
+        """
+        pipelines = {
+            "Presentation reminders": self.send_presentation_reminders,
+            "Lab maintenance reminders": self.send_lab_maintenance_reminders,
+            "Lab snacks reminders": self.send_lab_snacks_reminders,
+        }
+        errors = []
+        with ThreadPoolExecutor(max_workers=len(pipelines)) as executor:
+            futures = {executor.submit(self.run_pipeline, pipeline): name for name, pipeline in pipelines.items()}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                    print(f"{name} done")
+                except Exception as e:
+                    print(f"{name} failed: {e}")
+                    errors.append((name, e))
+        if errors:
+            raise PipelineError(errors)
 
     def update_duty_tracker(self, duty_type, next_member_id):
-        with open('duty_tracker.json', 'r') as file:
-            tracker = json.load(file)
-        tracker[duty_type] = next_member_id
-        with open('duty_tracker.json', 'w') as file:
-            json.dump(tracker, file, indent=4)
+        # Staged in memory and written atomically at the end of run()
+        self.duty_tracker.set(duty_type, next_member_id)
 
     def is_there_meeting_next_week(self, today):
         # Check if next week today is a national holiday
-        today = today + timedelta(days=7)
-        if today in self.us_holidays:
-            self.slack_notifier.send_message('#lfl-general-exclusive', f"Reminder: No lab meeting next week due to a national holiday - {self.us_holidays.get(today)}")
+        if self.meeting_calendar.holiday_next_week(today):
+            self.notify_slack(self.slack_channel, f"Reminder: No lab meeting next week due to a national holiday - {self.meeting_calendar.holiday_name(today + timedelta(days=7))}")
             return True
-        # Check if today is the first presentation day of the month
-        elif today.day == self.presentation_day:
-            self.slack_notifier.send_message('#lfl-general-exclusive', "Reminder: Today is 'Lab Citizen Day'")
+        # Check if next week today is the first Monday of the month
+        elif self.meeting_calendar.is_lab_citizen_day(today + timedelta(days=7)):
+            self.notify_slack(self.slack_channel, "Reminder: Today is 'Lab Citizen Day'")
             return True
         # All else case
         else:
@@ -154,37 +450,36 @@ class LabNotificationSystem:
 
     def holiday_next_week(self):
         # Check if next week today is a national holiday
-        next_week = datetime.today() + timedelta(days=7)
-        if next_week in self.us_holidays:
-            self.slack_notifier.send_message('#lfl-general-exclusive', f"Reminder: No lab meeting next week due to a national holiday - {self.us_holidays.get(next_week)}")
+        today = self.today()
+        if self.meeting_calendar.holiday_next_week(today):
+            self.notify_slack(self.slack_channel, f"Reminder: No lab meeting next week due to a national holiday - {self.meeting_calendar.holiday_name(today + timedelta(days=7))}")
             return True
         else:
             return False
 
     def send_presentation_reminders(self):
-        today = date.today()
-        next_monday = today + timedelta(days=(7 - today.weekday() or 7))
-        lab_citizen_day_td_link = os.environ.get("ONENOTE_LCD")
+        today = self.today()
+        lab_citizen_day_td_link = self.lab_citizen_day_link
 
         # Check if today is the presentation day
-        if today.weekday() == self.presentation_day:
+        if self.meeting_calendar.is_presentation_day(today):
             # Check if next Monday is the first Monday of the next month
-            if (next_monday.month != today.month) and (next_monday.day <= 7):
-                self.slack_notifier.send_message(
-                    '#lfl-general-exclusive',
-                    f"Reminder: No lab meeting next week, we will have a Lab Citizen Day on {next_monday}. Don't know what to do?\nRefer to\n{lab_citizen_day_td_link}"
+            if self.meeting_calendar.lab_citizen_day_next_week(today):
+                self.notify_slack(
+                    self.slack_channel,
+                    f"Reminder: No lab meeting next week, we will have a Lab Citizen Day on {next_monday(today)}. Don't know what to do?\nRefer to\n{lab_citizen_day_td_link}"
                 )
 
                 pres_date = today + timedelta(days=7)
 
                 try:
-                    self.calendar_manager.create_timed_event(
+                    self.schedule_event(self.calendar_manager.build_timed_event_body(
                         title="Lab Citizen Day",
                         date=pres_date,
                         start_time_str=self.presentation_time,
                         attendees=self.get_all_member_emails(),
                         location=self.location,
-                    )
+                    ))
                 except Exception as e:
                     print(f"Error creating Lab Citizen Day event: {e}")
             else:
@@ -193,7 +488,7 @@ class LabNotificationSystem:
             print("No presentation reminders today")
     
     def send_presentation_reminder_email(self):
-        today = datetime.today()
+        today = self.today()
         tracker = self.load_duty_tracker()
 
         if self.holiday_next_week():
@@ -210,39 +505,42 @@ class LabNotificationSystem:
                 print("Group Presentation by undergrads")
                 if self.presentation_reminders_enabled:
                     print("Sending presentation reminders...")
-                    for presenter_info in presenters:
-                        subject = "LFL Lab Meeting Presentation"
-                        message = f"Hello {presenter_info['name']},\n\nYou are scheduled to present at next week's lab meeting - {pres_date}." + MEETING_SIGNATURE
-                        self.email_notifier.send_email([presenter_info['email']], subject, message)
+                    subject = "LFL Lab Meeting Presentation"
+                    # The date is filled in once, only the names differ between the emails
+                    bodies = load_template('presentation').merge(({'name': presenter_info.name} for presenter_info in presenters), date=pres_date)
+                    self.notify_emails(
+                        ([presenter_info.email], subject, text, html)
+                        for presenter_info, (text, html) in zip(presenters, bodies)
+                    )
 
                     # Create Google Calendar event for group presentation
-                    self.calendar_manager.create_timed_event(
+                    self.schedule_event(self.calendar_manager.build_timed_event_body(
                         title="Undergraduate Group Presentation",
                         date=pres_date,
                         start_time_str=self.presentation_time,
-                        attendees=[member['email'] for member in presenters]
-                    )
+                        attendees=[member.email for member in presenters]
+                    ))
                 else:
                     print("Presentation reminders disabled, skipping emails and calendar events")
 
             # Handle individual presentation
             else:
                 presenter_info = presenters[0]  # Only one presenter
-                print(f"Presentation by {presenter_info['name']}")
+                print(f"Presentation by {presenter_info.name}")
                 if self.presentation_reminders_enabled:
                     print("Sending presentation reminders...")
                     subject = "LFL Lab Meeting Presentation"
-                    message = f"Hello {presenter_info['name']},\n\nYou are scheduled to present at next week's lab meeting - {pres_date}." + MEETING_SIGNATURE
-                    self.email_notifier.send_email([presenter_info['email']], subject, message)
+                    message, html = render_template('presentation', name=presenter_info.name, date=pres_date)
+                    self.notify_email([presenter_info.email], subject, message, html)
 
                     # Create Google Calendar event for individual presentation
-                    self.calendar_manager.create_timed_event(
-                        title="Group Meeting Presentation by " + presenter_info['name'],
+                    self.schedule_event(self.calendar_manager.build_timed_event_body(
+                        title="Group Meeting Presentation by " + presenter_info.name,
                         date=pres_date,
                         start_time_str=self.presentation_time,
-                        attendees=[member['email'] for member in presenters],
+                        attendees=[member.email for member in presenters],
                         location=self.location
-                    )
+                    ))
                 else:
                     print("Presentation reminders disabled, skipping emails and calendar events")
 
@@ -250,123 +548,102 @@ class LabNotificationSystem:
             self.update_duty_tracker('presentation', next_presenter_id)
 
     def load_duty_tracker(self):
-        with open('duty_tracker.json', 'r') as file:
-            return json.load(file)
+        return self.duty_tracker.snapshot()
 
     def get_all_members(self):
         """
         Returns a list of all lab members
         """
-        return list(self.lab_members.values())
+        return list(self.members)
 
     def get_all_member_emails(self):
         """
         Returns a list of all lab member emails
         """
-        return [member['email'] for member in self.lab_members.values()]
+        return list(self.members.emails)
 
     def get_next_presenter(self, current_presenter_id):
-        members_list = list(self.lab_members.values())
-        current_index = members_list.index(next((member for member in members_list if member['id'] == current_presenter_id), members_list[0]))
-
-        next_index = (current_index + 1) % len(members_list)
-        next_presenter = members_list[next_index]
-
-        if next_presenter['role'] == 'Undergraduate Student':
-            # Find all undergraduates
-            undergrads = [member for member in members_list if member['role'] == 'Undergraduate Student']
-
-            # Return the list of undergraduates and set the next presenter to the first non-undergraduate
-            next_non_undergrad_index = (members_list.index(undergrads[-1]) + 1) % len(members_list)
-            next_non_undergrad_id = members_list[next_non_undergrad_index]['id']
-
-            return undergrads, next_non_undergrad_id, True
-        else:
-            # Next presenter is not an undergraduate
-            return [next_presenter], next_presenter['id'], False
-
-    def lab_maintance_email(self, recipient_name, date_maintenance):
-
-        ln2_instruction = "Please schedule a Liquid Nitrogen Fill Up with Jivin (jseward@usc.edu) and refill our tank"
-
-        instructions = [ln2_instruction, "Purchase any outstanding item left on the Purchasing Wish list", "After you purchase something put it on the #purchasing channel" ,"Check Lab Inventory: napkins, water filters, gloves, masks, printing supply, compressed air", "Check Chemical Inventory", "Assess Water Filter Status", "Check cooling water temperature and pressure", "Fill up traps and dewars with LN2", "General Cleanup of the Lab (call people out if needed)","Monitor waste labels and complete them if they are missing any information", "Issue a Waste Pick Up Request with EH&S if Accumulation Date on a label is almost 9 months or if you need to dispose of the waste ASAP", "Version Control and Back Up Code Base on GitHub"]
+        return self.rotation.next_presenter(current_presenter_id)
 
-        reminders = ["🌳 Wear O2 monitor while doing LN2 fill up","🚪 Keep Back Room Door open while doing LN2 fill up","🪤 Don't position yourself such that you are trapped by the dewar","👖 Wear full pants on Lab Maintenance Day", "🚫 Don't reuse gloves", "🦠 Don't touch non-contaminated items with gloves", "🧤 Wear thermal gloves when working with LN2", "🥼🥽 Wear safety coat and goggles", "👥 Use the buddy system if not comfortable doing a task alone"]
-
-
-        return create_email_content(recipient_name, date_maintenance, instructions, reminders)
-
-
-    
     def send_lab_maintenance_reminders(self):
-        should_send = datetime.today().weekday() == self.maintenance_day or self.force_maintenance_reminder
+        today = self.today()
+        should_send = self.meeting_calendar.is_maintenance_day(today) or self.force_maintenance_reminder
         if should_send:
             if self.force_maintenance_reminder:
                 print("Force maintenance reminder enabled, sending regardless of day...")
             tracker = self.load_duty_tracker()
             current_maintenance_id = tracker.get('maintenance', None)
-            eligible_members = [member for member in self.lab_members.values() if member['role'] in ['PhD Student', 'Post-Doc']]
-            next_maintenance_id = self.get_next_member(eligible_members, current_maintenance_id)
+            next_maintenance_id = self.rotation.next_member('maintenance', current_maintenance_id)
 
             # Send email reminder
-            maintainer_info = next((member for member in eligible_members if member['id'] == next_maintenance_id), {})
-            
-            # Create email content
-            date_maintenance = (date.today() + timedelta(days=1)).isoformat()
-            maintenance_message = self.lab_maintance_email(maintainer_info['name'], date_maintenance)
+            maintainer_info = self.rotation.member('maintenance', next_maintenance_id)
 
             if maintainer_info:
+                # Create email content, the checklists come from templates/maintenance.json
+                maintenance_message, maintenance_html = render_template('maintenance', name=maintainer_info.name)
                 subject = "Lab Maintenance Reminder"
                 message = maintenance_message
-                print(f"Maintenance week by - {maintainer_info['name']}")
-                self.email_notifier.send_email([maintainer_info['email']], subject, message)
+                print(f"Maintenance week by - {maintainer_info.name}")
+                self.notify_email([maintainer_info.email], subject, message, maintenance_html)
 
                 # Create a calendar event for the maintenance week
-                start_date = (date.today() + timedelta(days=3)).isoformat()  # Start from next Monday
-                end_date = (date.today() + timedelta(days=7)).isoformat()    # End on next Friday
-                self.calendar_manager.create_event(
-                    title=f"Lab Maintenance by {maintainer_info['name']}",
+                start_date = (today + timedelta(days=3)).isoformat()  # Start from next Monday
+                end_date = (today + timedelta(days=7)).isoformat()    # End on next Friday
+                self.schedule_event(self.calendar_manager.build_event_body(
+                    title=f"Lab Maintenance by {maintainer_info.name}",
                     description=maintenance_message,
                     start_date=start_date,
                     end_date=end_date,
-                    attendees=[maintainer_info['email']],
+                    attendees=[maintainer_info.email],
                     location=self.location,
                     all_day=True
-                )
+                ))
 
             # Update the duty tracker
             self.update_duty_tracker('maintenance', next_maintenance_id)
 
     def send_lab_snacks_reminders(self):
         # Send reminders on the day before the presentation including edgecase of sunday
-        if datetime.today().weekday() == self.presentation_day - 1 or (datetime.today().weekday() == 6 and self.presentation_day == 0):
+        today = self.today()
+        if self.meeting_calendar.is_snack_day(today):
             print("Sending lab snacks reminders...")
             tracker = self.load_duty_tracker()
             current_snacks_id = tracker.get('snacks', None)
-            eligible_members = [member for member in self.lab_members.values() if member['role'] != 'Undergraduate Student']
-            next_snacks_id = self.get_next_member(eligible_members, current_snacks_id)
+            next_snacks_id = self.rotation.next_member('snacks', current_snacks_id)
 
             # Send email reminder
-            snack_person_info = next((member for member in eligible_members if member['id'] == next_snacks_id), {})
+            snack_person_info = self.rotation.member('snacks', next_snacks_id)
             if snack_person_info:
-                meeting_date = (date.today() + timedelta(days=1)).strftime("%A, %B %d")
+                meeting_date = (today + timedelta(days=1)).strftime("%A, %B %d")
                 subject = "Lab Snacks Reminder"
-                message = f"Hello {snack_person_info['name']},\n\nThis is a reminder for you to bring snacks for the lab meeting tomorrow ({meeting_date})." + SERVICE_SIGNATURE
-                self.email_notifier.send_email([snack_person_info['email']], subject, message)
+                message, html = render_template('snacks', name=snack_person_info.name, date=meeting_date)
+                self.notify_email([snack_person_info.email], subject, message, html)
+                print("Snacks bought by - ", snack_person_info.name)
 
-            print("Snacks bought by - ", snack_person_info['name'])
             # Update the duty tracker
             self.update_duty_tracker('snacks', next_snacks_id)
 
+def token_resolution(token_source):
+    """Return the steps that replace a revoked token, which depend on the file it was read from."""
+    if token_source and token_source.endswith('.enc'):
+        # CI only has the encrypted token, a new one has to be authorized locally and committed
+        return (f"1) Locally, delete `{token_source}` and run the script to authorize in the browser\n"
+                f"2) Run `SECRET_KEY=... python token_cache.py encrypt` with the repository secret\n"
+                f"3) Commit the new `{token_cache.TOKEN_FILE}.enc` (and delete `{token_cache.LEGACY_TOKEN_FILE}.enc`)")
+    return f"1) Delete the `{token_source or token_cache.TOKEN_FILE}` file\n2) Run the script again"
+
 def alert_developer(e):
     gmail_username = os.environ.get('GMAIL_USERNAME')
     gmail_password = os.environ.get('GMAIL_PASSWORD')
-    email_notifier = EmailNotifier(gmail_username, gmail_password)
     token_error_msg = "('invalid_grant: Token has been expired or revoked.', {'error': 'invalid_grant', 'error_description': 'Token has been expired or revoked.'})"
-    resolution_msg = f"If error message is\n`{token_error_msg}`\nresoultion is:\n\n1) Delete the `token.pickle` file\n2) Run the script again"
+    resolution_msg = f"If error message is\n`{token_error_msg}`\nresoultion is:\n\n{token_resolution(token_cache.last_source)}"
     bar = "=" * 30
     content = f"System Generated Error Message:\n{bar}\n\n{str(e)}\n\nResolutions:\n{bar}\n\n{resolution_msg}"
-    email_notifier.send_email([__email__], "Lab Notification System Error", content)
+    slowest_spans = instrumentation.format_slowest(10)
+    if slowest_spans:
+        content += f"\n\nSlowest spans of this run:\n{bar}\n\n{slowest_spans}"
+    with EmailNotifier(gmail_username, gmail_password) as email_notifier:
+        email_notifier.send_email([__email__], "Lab Notification System Error", content)
 
 def test_update_duty_tracker(system):
     """Test function to update the duty tracker and push changes."""
@@ -376,6 +653,7 @@ def test_update_duty_tracker(system):
     duty_type = "presentation"
     next_member_id = "test_member_id"
     system.update_duty_tracker(duty_type, next_member_id)
+    system.duty_tracker.commit()
 
     # Verify the update
     with open('duty_tracker.json', 'r') as file:
@@ -383,24 +661,39 @@ def test_update_duty_tracker(system):
     assert tracker[duty_type] == next_member_id
     print("Duty tracker update test passed.")
 
+def system_from_env(**overrides):
+    """Build the LabNotificationSystem configured by the environment variables."""
+    settings = dict(
+        presentation_day=os.environ.get('PRESENTATION_DAY'),
+        presentation_time=os.environ.get('PRESENTATION_TIME'),
+        maintenance_day=os.environ.get('MAINTENANCE_DAY'),
+        location=os.environ.get('LOCATION'),
+        send_presentation_reminders=os.environ.get('SEND_PRESENTATION_REMINDERS', 'false').lower() == 'true',
+        force_maintenance_reminder=os.environ.get('FORCE_MAINTENANCE_REMINDER', 'false').lower() == 'true',
+        coalesce_slack=os.environ.get('SLACK_COALESCE', 'false').lower() == 'true',
+        outbox_path='outbox.sqlite3' if os.environ.get('USE_OUTBOX', 'false').lower() == 'true' else None,
+        metrics_dir=os.environ.get('METRICS_DIR', 'metrics'),
+    )
+    settings.update(overrides)
+    return LabNotificationSystem(**settings)
+
 if __name__ == "__main__":
 
-    presentation_day = os.environ.get('PRESENTATION_DAY')
-    presentation_time = os.environ.get('PRESENTATION_TIME')
-    maintenance_day = os.environ.get('MAINTENANCE_DAY')
-    location = os.environ.get('LOCATION')
-    send_presentation_reminders = os.environ.get('SEND_PRESENTATION_REMINDERS', 'false').lower() == 'true'
-    force_maintenance_reminder = os.environ.get('FORCE_MAINTENANCE_REMINDER', 'false').lower() == 'true'
+    concurrent_run = os.environ.get('CONCURRENT_RUN', 'false').lower() == 'true'
+    async_io = os.environ.get('ASYNC_IO', 'false').lower() == 'true'
 
     system = None
     try:
-        system = LabNotificationSystem(presentation_day, presentation_time, maintenance_day, location, send_presentation_reminders, force_maintenance_reminder)
+        system = system_from_env()
     except Exception as e:
         print(f"Caught exception during initialization: {e}")
         alert_developer(e)
         sys.exit(1)
     try:
-        system.run()
+        if async_io:
+            asyncio.run(system.run_async())
+        else:
+            system.run(concurrent=concurrent_run)
         # Run the test case
         #test_update_duty_tracker(system)
     except Exception as e:
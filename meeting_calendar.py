@@ -0,0 +1,112 @@
+from datetime import date, timedelta
+
+import holidays
+
+# Per-day flags stored in the index
+HOLIDAY = 1
+HOLIDAY_NEXT_WEEK = 2
+PRESENTATION_DAY = 4     # presentation reminders go out today
+LAB_CITIZEN_NOTICE = 8   # presentation day whose next Monday is the first Monday of the next month
+LAB_CITIZEN_DAY = 16     # first Monday of the month
+MAINTENANCE_DAY = 32
+SNACK_DAY = 64
+
+
+def chosen_day(day_name):
+    days = {
+        "Monday": 0,
+        "Tuesday": 1,
+        "Wednesday": 2,
+        "Thursday": 3,
+        "Friday": 4,
+        "Saturday": 5,
+        "Sunday": 6
+    }
+    return days.get(day_name, -1)  # Returns -1 if the day name is not valid
+
+
+def next_monday(day):
+    """Return the Monday after day (a week later if day is a Monday)."""
+    return day + timedelta(days=(7 - day.weekday() or 7))
+
+
+class MeetingCalendar:
+    """
+    Precomputed per-day index of the lab's meeting calendar.
+
+    Every day in the horizon is reduced to one byte of flags, so the daily
+    decisions in LabNotificationSystem are constant-time lookups. Days outside
+    the horizon are computed on demand.
+    """
+    def __init__(self, presentation_day, maintenance_day, start=None, horizon_days=730):
+        self.presentation_day = presentation_day
+        self.maintenance_day = maintenance_day
+        self.start = start or date.today()
+        self.end = self.start + timedelta(days=horizon_days)
+        # Cover the extra week looked ahead by HOLIDAY_NEXT_WEEK
+        self.us_holidays = holidays.US(years=range(self.start.year, self.end.year + 2))
+
+        self.index = bytearray(horizon_days)
+        for offset in range(horizon_days):
+            self.index[offset] = self._compute_flags(self.start + timedelta(days=offset))
+
+    def _compute_flags(self, day):
+        flags = 0
+        if day in self.us_holidays:
+            flags |= HOLIDAY
+        if day + timedelta(days=7) in self.us_holidays:
+            flags |= HOLIDAY_NEXT_WEEK
+
+        weekday = day.weekday()
+        if weekday == self.presentation_day:
+            flags |= PRESENTATION_DAY
+            monday = next_monday(day)
+            if (monday.month != day.month) and (monday.day <= 7):
+                flags |= LAB_CITIZEN_NOTICE
+        if weekday == 0 and day.day <= 7:
+            flags |= LAB_CITIZEN_DAY
+        if weekday == self.maintenance_day:
+            flags |= MAINTENANCE_DAY
+        # The day before the presentation, including Sunday for Monday meetings
+        if weekday == self.presentation_day - 1 or (weekday == 6 and self.presentation_day == 0):
+            flags |= SNACK_DAY
+        return flags
+
+    def flags(self, day):
+        offset = (day - self.start).days
+        if 0 <= offset < len(self.index):
+            return self.index[offset]
+        return self._compute_flags(day)
+
+    def is_holiday(self, day):
+        return bool(self.flags(day) & HOLIDAY)
+
+    def holiday_next_week(self, day):
+        return bool(self.flags(day) & HOLIDAY_NEXT_WEEK)
+
+    def holiday_name(self, day):
+        return self.us_holidays.get(day)
+
+    def is_presentation_day(self, day):
+        return bool(self.flags(day) & PRESENTATION_DAY)
+
+    def lab_citizen_day_next_week(self, day):
+        return bool(self.flags(day) & LAB_CITIZEN_NOTICE)
+
+    def is_lab_citizen_day(self, day):
+        return bool(self.flags(day) & LAB_CITIZEN_DAY)
+
+    def is_maintenance_day(self, day):
+        return bool(self.flags(day) & MAINTENANCE_DAY)
+
+    def is_snack_day(self, day):
+        return bool(self.flags(day) & SNACK_DAY)
+
+    def days(self, flag, start=None, end=None):
+        """Yield the days in [start, end) that have any of the given flags set."""
+        day = start or self.start
+        end = end or self.end
+        while day < end:
+            if self.flags(day) & flag:
+                yield day
+            day += timedelta(days=1)
@@ -0,0 +1,105 @@
+from config_loader import LAB_MEMBERS_SCHEMA, ConfigLoader
+
+
+class Member:
+    """One lab member. Records are immutable and shared by every view of the directory."""
+    __slots__ = ('id', 'name', 'email', 'role')
+
+    def __init__(self, id, name, email, role=None):
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'email', email)
+        object.__setattr__(self, 'role', role)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Member records are read-only")
+
+    def __repr__(self):
+        return f"Member(id={self.id!r}, name={self.name!r}, role={self.role!r})"
+
+    # Equal by value, so a reloaded roster compares equal to an unchanged one
+    def __eq__(self, other):
+        if not isinstance(other, Member):
+            return NotImplemented
+        return (self.id, self.name, self.email, self.role) == (other.id, other.name, other.email, other.role)
+
+    def __hash__(self):
+        return hash((self.id, self.name, self.email, self.role))
+
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name, 'email': self.email, 'role': self.role}
+
+
+class MemberDirectory:
+    """
+    The lab roster, loaded once and indexed by id, email and role.
+
+    Members keep their roster order, which the duty rotations depend on. Role
+    views are tuples built on first use and reused afterwards.
+    """
+    def __init__(self, records):
+        members = []
+        self.by_id = {}
+        self.by_email = {}
+        # Members without a role are kept, but flagged, and never match a role view
+        self.warnings = []
+        for record in records:
+            member = Member(record['id'], record['name'], record['email'], record.get('role') or None)
+            if member.id in self.by_id:
+                raise ValueError(f"Duplicate lab member id {member.id!r}: {self.by_id[member.id].name} and {member.name}")
+            email = member.email.lower()
+            if email in self.by_email:
+                self.warnings.append(f"{member.name} ({member.id}) shares the email {member.email} with {self.by_email[email].name}")
+            else:
+                self.by_email[email] = member
+            if member.role is None:
+                self.warnings.append(f"{member.name} ({member.id}) has no role")
+            self.by_id[member.id] = member
+            members.append(member)
+
+        self.members = tuple(members)
+        self.emails = tuple(member.email for member in members)
+        self.by_role = {}
+        for member in members:
+            self.by_role.setdefault(member.role, []).append(member)
+        self.by_role = {role: tuple(role_members) for role, role_members in self.by_role.items()}
+        self._views = {}
+
+    @classmethod
+    def load(cls, path='lab_members.json', password_env='SECRET_KEY_LAB'):
+        """Load the roster from a lab_members.json file, or its encrypted copy."""
+        roster = ConfigLoader(path, password_env=password_env, schema=LAB_MEMBERS_SCHEMA).load_config()
+        directory = cls(roster.values())
+        for warning in directory.warnings:
+            print(f"Warning: {warning}")
+        return directory
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, member_id):
+        return member_id in self.by_id
+
+    def get(self, member_id):
+        """Return the member with this id, or None."""
+        return self.by_id.get(member_id)
+
+    def find_by_email(self, email):
+        return self.by_email.get(email.lower())
+
+    def with_roles(self, *roles):
+        """Return the members with any of these roles, in roster order."""
+        key = ('with', frozenset(roles))
+        if key not in self._views:
+            self._views[key] = tuple(member for member in self.members if member.role in key[1])
+        return self._views[key]
+
+    def without_roles(self, *roles):
+        """Return the members with none of these roles, in roster order."""
+        key = ('without', frozenset(roles))
+        if key not in self._views:
+            self._views[key] = tuple(member for member in self.members if member.role not in key[1])
+        return self._views[key]
@@ -0,0 +1,124 @@
+"""
+Message templates for the reminder emails.
+
+Each message is a pair of templates in templates/: <name>.txt for the plain text
+part and <name>.html for the HTML part, using string.Template $placeholders.
+Static data such as checklists lives in an optional <name>.json and is compiled
+into the templates once, when they are first loaded: a template line holding a
+list placeholder is repeated for every item of the list.
+"""
+import html
+import json
+import os
+import threading
+from string import Template
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+_lock = threading.Lock()
+_templates = {}
+
+
+def _identifiers(source):
+    return {match.group('named') or match.group('braced') for match in Template.pattern.finditer(source)} - {None}
+
+
+def _fill(source, values):
+    """Substitute only the given fields, leaving other placeholders and $$ escapes in place."""
+    def replace(match):
+        name = match.group('named') or match.group('braced')
+        if name in values:
+            return str(values[name]).replace('$', '$$')
+        return match.group(0)
+    return Template.pattern.sub(replace, source)
+
+
+def _expand_lists(source, data, escape):
+    """Repeat each line that holds a list placeholder once per item and fill in the other static fields."""
+    static = {name: escape(value) for name, value in data.items() if not isinstance(value, list)}
+    lines = []
+    for line in source.split('\n'):
+        list_fields = [name for name in _identifiers(line) if isinstance(data.get(name), list)]
+        if len(list_fields) == 1:
+            name = list_fields[0]
+            lines.extend(_fill(line, dict(static, **{name: escape(item)})) for item in data[name])
+        else:
+            lines.append(_fill(line, static))
+    return '\n'.join(lines)
+
+
+class MessageTemplate:
+    """A compiled plain text and HTML template pair."""
+    def __init__(self, name, text, html_source=None):
+        self.name = name
+        self.text = Template(text)
+        self.html = Template(html_source) if html_source is not None else None
+        self.fields = _identifiers(text) | (_identifiers(html_source) if html_source is not None else set())
+
+    @classmethod
+    def compile(cls, name, text, html_source=None, data=None):
+        data = data or {}
+        text = _expand_lists(text, data, lambda value: value)
+        if html_source is not None:
+            html_source = _expand_lists(html_source, data, html.escape)
+        return cls(name, text, html_source)
+
+    def bind(self, **fields):
+        """Return a template with these fields filled in, for fields shared by a batch of recipients."""
+        text = _fill(self.text.template, fields)
+        html_source = None
+        if self.html:
+            html_source = _fill(self.html.template, {name: html.escape(str(value)) for name, value in fields.items()})
+        return MessageTemplate(self.name, text, html_source)
+
+    def render(self, **fields):
+        """Return the (text, html) bodies; html is None if the template has no HTML part."""
+        text = self.text.substitute(fields)
+        html_body = self.html.substitute({name: html.escape(str(value)) for name, value in fields.items()}) if self.html else None
+        return text, html_body
+
+    def merge(self, recipients, **shared):
+        """
+        Render one message per recipient.
+
+        Parameters:
+        - recipients: An iterable of dicts with each recipient's fields.
+        - shared: Fields common to every recipient. They are substituted once, and
+          if no per-recipient field is left the body is rendered only once.
+
+        Returns:
+        - A list of (text, html) tuples, one per recipient.
+        """
+        bound = self.bind(**shared)
+        recipients = list(recipients)
+        if not bound.fields:
+            return [bound.render()] * len(recipients)
+        return [bound.render(**fields) for fields in recipients]
+
+
+def _read(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as file:
+        content = file.read()
+    # Editors add a final newline that is not part of the message
+    return content[:-1] if content.endswith('\n') else content
+
+
+def load_template(name, directory=TEMPLATE_DIR):
+    """Return the compiled template called name, loading it at most once per process."""
+    key = (directory, name)
+    with _lock:
+        if key not in _templates:
+            text = _read(os.path.join(directory, f'{name}.txt'))
+            if text is None:
+                raise FileNotFoundError(f"No template {name}.txt in {directory}")
+            data_source = _read(os.path.join(directory, f'{name}.json'))
+            data = json.loads(data_source) if data_source else None
+            _templates[key] = MessageTemplate.compile(name, text, _read(os.path.join(directory, f'{name}.html')), data)
+        return _templates[key]
+
+
+def render(template_name, **fields):
+    """Render the template called template_name, returning its (text, html) bodies."""
+    return load_template(template_name).render(**fields)
@@ -1,40 +1,36 @@
+import html
 import os
-import pickle
 import re
-from datetime import datetime
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from itertools import groupby
 from operator import itemgetter
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from dotenv import load_dotenv
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import token_cache
+from aps_cache import APSPageCache
+from calendar_manager import CREATED_BY_PROPERTY, CREATED_BY_VALUE, CalendarBatch, tag_event
+from calendar_service import get_calendar_service, thread_http
+
+APS_TIMEOUT = 15  # seconds, per request
+APS_MAX_WORKERS = 8
+APS_PARSER_VERSION = 2  # bump when parse_aps_page output changes to invalidate cached records
 
 
 def authenticate_google_calendar():
     """Authenticate and return a Google Calendar API service."""
-    creds = None
-    # The file token.pickle stores the user's access and refresh tokens, and is
-    # created automatically when the authorization flow completes for the first
-    # time.
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        # Save the credentials for the next run
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
-
-    service = build('calendar', 'v3', credentials=creds)
+    # token.json (shared with CalendarManager) holds the user's access and refresh
+    # tokens; the consent flow only runs if they cannot be refreshed
+    creds = token_cache.get_credentials('credentials.json', SCOPES)
+    service = get_calendar_service(creds)
     return service
 
 def create_event(service, event):
@@ -44,6 +40,7 @@ def create_event(service, event):
 
 def create_calendar_events(pres_list):
     service = authenticate_google_calendar()
+    batch = CalendarBatch(service)
 
     for pres in pres_list:
         # Check if minutes part is missing and add it if necessary
@@ -65,23 +62,103 @@ def create_calendar_events(pres_list):
                 'timeZone': MM_TIMEZONE,
             },
         }
-        create_event(service, event_body)
+        batch.insert(tag_event(event_body), calendar_id=MM_calendar_ID, key=pres['url'])
+
+    results = batch.flush()
+    for result in results:
+        if result.error is not None:
+            print(f"Failed to create event for {result.key}: {result.error}")
+        else:
+            print(f"Event created: {result.response.get('htmlLink')}")
+    created = sum(1 for result in results if result.error is None)
+    print(f"Created {created}/{len(results)} event(s) in {batch.round_trips} batch request(s)")
 
 
-def create_pres_list_from_aps(url):
-    pres_list = []
+def create_aps_session(pool_size=APS_MAX_WORKERS, retries=3, backoff_factor=0.5):
+    """Return a keep-alive HTTP session that retries failed GETs with exponential backoff."""
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
 
-    # Send a GET request to the URL
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
+def fetch_aps_page(url, session=None, timeout=APS_TIMEOUT):
+    """Download an APS abstract page and return its raw content."""
+    response = (session or requests).get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content
 
+def create_pres_list_from_aps(url, session=None, timeout=APS_TIMEOUT, cache=None):
+    if cache is not None:
+        return cache.records(url, parse_aps_page, session=session, timeout=timeout, parser_version=APS_PARSER_VERSION)
+    return parse_aps_page(fetch_aps_page(url, session=session, timeout=timeout), url)
+
+def _is_aps_field_tag(name, attrs):
+    """Keep only the tags parse_aps_page reads from: meta, h3, p and the abstract div."""
+    if name in ('meta', 'h3', 'p'):
+        return True
+    if name == 'div':
+        classes = attrs.get('class') or ''
+        return 'largernormal' in (classes.split() if isinstance(classes, str) else classes)
+    return False
+
+APS_STRAINER = SoupStrainer(_is_aps_field_tag)
+# The first text node mentioning the room, which the strained parse may not keep
+APS_ROOM_PATTERN = re.compile(r'>([^<]*Room:[^<]*)<')
+# Text and inline markup, which no parser lets close or nest a paragraph
+_APS_INLINE = r'(?:[^<]|</?(?:a|b|br|em|i|small|span|strong|sub|sup|u)\b[^>]*>)*'
+# The date paragraph, and the time paragraph right after it
+APS_DATE_TAG = re.compile(r'<p\b[^>]*\sstyle=["\']margin-top: 0px;["\'][^>]*>', re.IGNORECASE)
+APS_TIME_FOLLOWS = re.compile(_APS_INLINE + r'</p>\s*<p\b[^>]*>' + _APS_INLINE + r'</p>', re.IGNORECASE)
+
+try:
+    import lxml  # noqa: F401
+    APS_FAST_PARSER = 'lxml'
+except ImportError:
+    APS_FAST_PARSER = 'html.parser'
+
+def parse_aps_page(content, url):
+    """
+    Extract the presentation details from the content of an APS abstract page.
+
+    Only the tags holding the fields are parsed (with lxml when it is installed)
+    and the room is read straight from the markup. If a field can't be found that
+    way the full page is parsed instead.
+
+    The strained tree drops the containers around the kept tags, so the time
+    paragraph found next to the date one is only the same as in the full parse
+    when the two are adjacent in the markup. Other layouts get the full parse.
+    """
+    text = content.decode('utf-8', errors='replace') if isinstance(content, bytes) else content
+    room_match = APS_ROOM_PATTERN.search(text)
+    date_tag = APS_DATE_TAG.search(text)
+    if room_match and date_tag and APS_TIME_FOLLOWS.match(text, date_tag.end()):
+        try:
+            soup = BeautifulSoup(content, APS_FAST_PARSER, parse_only=APS_STRAINER)
+            return [_extract_presentation(soup, url, html.unescape(room_match.group(1)))]
+        except (TypeError, AttributeError, KeyError):
+            pass
+    return parse_aps_page_full(content, url)
+
+def parse_aps_page_full(content, url):
+    """Extract the presentation details from a full parse of an APS abstract page."""
+    soup = BeautifulSoup(content, 'html.parser')
+    location_text = soup.find(string=lambda x: x and "Room:" in x)
+    return [_extract_presentation(soup, url, location_text)]
+
+def _extract_presentation(soup, url, location_text):
     title = soup.find('meta', attrs={'name': 'citation_title'})['content']
     authors_meta = soup.find('meta', attrs={'name': 'citation_authors'})['content']
     authors = authors_meta.split(';')
     presenter = authors[0] if authors else ""
     abstract_div = soup.find('div', class_='largernormal')
     abstract_text = abstract_div.text if abstract_div else ""
-    location_text = soup.find(string=lambda x: x and "Room:" in x)
     location = location_text.split("Room:")[1].strip() if location_text else "Not specified"
     pres_date_meta = soup.find('meta', attrs={'name': 'citation_date'})['content']
     pres_date = pres_date_meta
@@ -103,7 +180,7 @@ def create_pres_list_from_aps(url):
         else:
             time_begin, time_end = "Not specified", "Not specified"
 
-    pres_list.append({
+    return {
         "name": presenter.strip(),
         "title": title.strip(),
         "pres_date": pres_date,
@@ -112,29 +189,41 @@ def create_pres_list_from_aps(url):
         "abstract": abstract_text.strip(),
         "url": url,
         "location": location
-    })
+    }
 
-    return pres_list
-
-def process_aps_urls(url_list):
+def process_aps_urls(url_list, max_workers=APS_MAX_WORKERS, session=None, timeout=APS_TIMEOUT, cache=None):
     """
     Process a list of APS URLs to extract presentation details.
 
+    Pages are fetched concurrently over a shared keep-alive session; a URL that
+    still fails after the retries is reported and skipped.
+
     Parameters:
     - url_list: A list of strings, where each string is a URL to an APS abstract page.
+    - max_workers: The maximum number of pages fetched at the same time.
+    - session: The HTTP session to use, a pooled retrying session by default.
+    - timeout: The timeout of each request in seconds.
+    - cache: An optional APSPageCache serving unchanged pages without refetching or reparsing them.
 
     Returns:
-    - A list of dictionaries, where each dictionary contains details of a presentation.
+    - A list of dictionaries, in the order of url_list, where each dictionary contains details of a presentation.
     """
     all_pres_details = []
+    session = session or create_aps_session(pool_size=max_workers)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(create_pres_list_from_aps, url, session, timeout, cache) for url in url_list]
+        for url, future in zip(url_list, futures):
+            try:
+                # Assuming each URL corresponds to a single presentation,
+                # and create_pres_list_from_aps returns a list with a single dict,
+                # we extend the master list.
+                all_pres_details.extend(future.result())
+            except Exception as e:
+                print(f"Failed to process {url}: {e}")
+    if cache is not None:
+        cache.save()
 
-    for url in url_list:
-        pres_details = create_pres_list_from_aps(url)
-        # Assuming each URL corresponds to a single presentation,
-        # and create_pres_list_from_aps returns a list with a single dict,
-        # we extend the master list.
-        all_pres_details.extend(pres_details)
-    
     return all_pres_details
 
 def print_all_session_details_v0(url):
@@ -145,10 +234,8 @@ def print_all_session_details_v0(url):
         session_id = url.split('/')[-1]
         print(f"{session_id:<10} | Room: {pres['location']:<10} | Time: {pres['pres_date']} ({pres['time_begin']} - {pres['time_end']})")
 
-def print_all_session_details(url_list):
-    all_pres = []
-    for url in url_list:
-        all_pres.extend(create_pres_list_from_aps(url))
+def print_all_session_details(url_list, cache=None):
+    all_pres = process_aps_urls(url_list, cache=cache)
 
     all_pres.sort(key=lambda x: (datetime.strptime(x['pres_date'], '%m/%d/%Y'), x['location'], x['time_begin'], x['time_end']))
 
@@ -156,15 +243,93 @@ def print_all_session_details(url_list):
         session_ids = [session['url'].split('/')[-1] for session in group]
         print(f"{', '.join(session_ids):<10} | Room: {key[1]:<10} | Time: {key[0]} ({key[2]} - {key[3]})")
 
-def delete_all_created_calendar_entries():
-    service = authenticate_google_calendar()
-    events_result = service.events().list(calendarId=MM_calendar_ID, timeMin=datetime.now().isoformat()).execute()
-    events = events_result.get('items', [])
-    if not events:
+def iter_calendar_events(service, calendar_id, time_min=None, created_only=True, page_size=250):
+    """
+    Yield the events of a calendar page by page, following nextPageToken.
+
+    Parameters:
+    - service: The Calendar API service.
+    - calendar_id: The calendar to list.
+    - time_min: Only list events ending after this RFC3339 timestamp.
+    - created_only: Only list the events tagged as created by this tool.
+    - page_size: The number of events requested per page.
+    """
+    params = {'calendarId': calendar_id, 'maxResults': page_size}
+    if time_min:
+        params['timeMin'] = time_min
+    if created_only:
+        params['privateExtendedProperty'] = f"{CREATED_BY_PROPERTY}={CREATED_BY_VALUE}"
+
+    page_token = None
+    while True:
+        events_result = service.events().list(pageToken=page_token, **params).execute()
+        for event in events_result.get('items', []):
+            yield event
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            break
+
+def _flush_delete_batch(batch, service):
+    return batch.flush(http=thread_http(service))
+
+def delete_all_created_calendar_entries(dry_run=False, created_only=True, batch_size=CalendarBatch.MAX_BATCH_SIZE, concurrency=4, service=None, calendar_id=None):
+    """
+    Delete the upcoming events of the conference calendar.
+
+    Every page of events is listed first, then the events are deleted in batch
+    requests, with at most `concurrency` batches in flight at a time. Deleting
+    while paging would shift the later pages and skip events.
+
+    Parameters:
+    - dry_run: Only list the events that would be deleted.
+    - created_only: Only delete the events created by this tool.
+    - batch_size: The number of deletes per batch request.
+    - concurrency: The maximum number of batch requests sent at the same time.
+    - service: The Calendar API service, authenticated from token.json by default.
+    - calendar_id: The calendar to clean up, MM_calendar_ID by default.
+    """
+    service = service or authenticate_google_calendar()
+    calendar_id = calendar_id or MM_calendar_ID
+    start = time.perf_counter()
+    matched = deleted = 0
+    in_flight = deque()
+
+    def collect(future):
+        nonlocal deleted
+        for result in future.result():
+            if result.error is not None:
+                print(f"Failed to delete event {result.key}: {result.error}")
+            else:
+                deleted += 1
+
+    events = list(iter_calendar_events(service, calendar_id, time_min=datetime.now(timezone.utc).isoformat(), created_only=created_only))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        batch = CalendarBatch(service, batch_size)
+        for event in events:
+            matched += 1
+            if dry_run:
+                print(f"Would delete event: {event.get('summary')} ({event['start'].get('dateTime', event['start'].get('date'))})")
+                continue
+            print(f"Deleting event: {event.get('summary')}")
+            batch.delete(event['id'], calendar_id=calendar_id, key=event.get('summary'))
+            if len(batch) >= batch_size:
+                if len(in_flight) >= concurrency:
+                    collect(in_flight.popleft())
+                in_flight.append(executor.submit(_flush_delete_batch, batch, service))
+                batch = CalendarBatch(service, batch_size)
+        if len(batch):
+            in_flight.append(executor.submit(_flush_delete_batch, batch, service))
+        while in_flight:
+            collect(in_flight.popleft())
+
+    elapsed = time.perf_counter() - start
+    if not matched:
         print('No upcoming events found.')
-    for event in events:
-        print(f"Deleting event: {event['summary']}")
-        service.events().delete(calendarId=MM_calendar_ID, eventId=event['id']).execute()
+    elif dry_run:
+        print(f"Dry run: {matched} event(s) would be deleted")
+    else:
+        print(f"Deleted {deleted}/{matched} event(s) in {elapsed:.2f} s ({deleted / elapsed:.1f} events/s)")
+    return deleted
 
 if __name__ == "__main__":
     # read calendar ID from .env
@@ -172,6 +337,10 @@ if __name__ == "__main__":
     MM_calendar_ID = os.getenv("MM_calendar_ID")
     MM_TIMEZONE = 'America/Chicago'  # Minneapolis time
     SCOPES = ['https://www.googleapis.com/auth/calendar']
+    if sys.argv[1:2] == ['cleanup']:
+        # python mm_calendar.py cleanup [--dry-run] [--all]
+        delete_all_created_calendar_entries(dry_run='--dry-run' in sys.argv, created_only='--all' not in sys.argv)
+        sys.exit(0)
     url_list = [
         "https://meetings.aps.org/Meeting/MAR24/Session/J00.249",
         "https://meetings.aps.org/Meeting/MAR24/Session/B54.6",
@@ -184,6 +353,8 @@ if __name__ == "__main__":
         "https://meetings.aps.org/Meeting/MAR24/Session/M48.12",
         "https://meetings.aps.org/Meeting/MAR24/Session/S50.1",
     ]
-    all_pres_details = process_aps_urls(url_list)
+    aps_cache = APSPageCache()
+    all_pres_details = process_aps_urls(url_list, cache=aps_cache)
     #create_calendar_events(all_pres_details)
-    print_all_session_details(url_list)
\ No newline at end of file
+    print_all_session_details(url_list, cache=aps_cache)
+    aps_cache.report()
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+Run the lab notification system for many labs in one process, or a pool of them.
+
+labs.json maps each lab's name to its settings: the directory holding its
+lab_members.json and duty_tracker.json, its meeting days and optionally its
+Slack channel (see LABS_SCHEMA in config_loader.py):
+
+    {
+        "lfl": {
+            "directory": "labs/lfl",
+            "presentation_day": "Monday",
+            "presentation_time": "10:00 AM",
+            "maintenance_day": "Friday",
+            "location": "SSC 319",
+            "send_presentation_reminders": true,
+            "slack_channel": "#lfl-general-exclusive"
+        }
+    }
+
+Every lab run in a process shares one pool of SMTP sessions, one Slack HTTP session per
+token and one Calendar service, so the imports and handshakes are paid once per
+process instead of once per lab. Each lab keeps its own roster, duty tracker,
+event ledger and outbox, and a failing lab does not stop the others. The labs
+of a process also share its instrumentation, so their slowest spans are printed
+in one report per process, each lab's run recorded as lab.<name>. The other
+settings (credentials, SECRET_KEY_LAB, ...) come from the same environment
+variables as main.py.
+
+Usage:
+    python multi_lab.py [--config labs.json] [--workers N] [--processes N] [--labs NAME ...]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import instrumentation
+import token_cache
+from calendar_manager import CalendarManager
+from config_loader import LABS_SCHEMA, ConfigLoader
+from email_notifier import EmailNotifier
+from main import LabNotificationSystem, alert_developer
+from slack_notifier import SlackNotifier
+
+
+class SharedClients:
+    """
+    The SMTP, Slack and Calendar clients shared by the labs run in one process.
+
+    Parameters:
+    - email_options: Keyword arguments for EmailNotifier, e.g. host and port, on top of
+      the GMAIL_USERNAME and GMAIL_PASSWORD login.
+    - slack_base_url: The Slack Web API root, e.g. a local stand-in server.
+    - calendar_credentials: Use these credentials instead of the token cache.
+    - calendar_root_url: Send Calendar requests to this root URL instead of Google's.
+    """
+    def __init__(self, email_options=None, slack_base_url='https://slack.com/api', calendar_credentials=None, calendar_root_url=None):
+        email_options = dict({'username': os.environ.get('GMAIL_USERNAME'), 'password': os.environ.get('GMAIL_PASSWORD')}, **(email_options or {}))
+        self.email_notifier = EmailNotifier(**email_options)
+        self.slack_base_url = slack_base_url
+        self.calendar_credentials = calendar_credentials
+        self.calendar_root_url = calendar_root_url
+        self._slack_notifiers = {}
+        self._lock = threading.Lock()
+
+    def slack_notifier(self, token_env='SLACK_TOKEN'):
+        with self._lock:
+            if token_env not in self._slack_notifiers:
+                self._slack_notifiers[token_env] = SlackNotifier(os.environ.get(token_env), base_url=self.slack_base_url)
+            return self._slack_notifiers[token_env]
+
+    def calendar_manager(self, ledger_file):
+        """Return a CalendarManager with its own event ledger, on the shared Calendar service."""
+        with self._lock:
+            if self.calendar_credentials is None:
+                credentials = token_cache.load_credentials()
+                # No browser consent flow here, it would block every lab
+                if not token_cache.can_authorize(credentials):
+                    raise RuntimeError(f"No usable {token_cache.TOKEN_FILE}, run main.py once to authorize the Calendar API")
+                self.calendar_credentials = credentials
+        # CalendarManager gets the cached service for the same credentials
+        return CalendarManager(self.email_notifier, credentials=self.calendar_credentials, ledger_file=ledger_file,
+                               root_url=self.calendar_root_url)
+
+    def close(self):
+        self.email_notifier.close()
+        self.email_notifier.report()
+        for slack_notifier in self._slack_notifiers.values():
+            slack_notifier.close()
+
+
+def load_labs(path='labs.json'):
+    """Load the lab settings, from path or decrypted in memory from path + '.enc'."""
+    return ConfigLoader(path, schema=LABS_SCHEMA).load_config()
+
+
+def run_lab(name, settings, clients):
+    """
+    Run one lab on the shared clients.
+
+    Returns:
+    - A dict with the lab name, whether it succeeded, how long it took and the error, if any.
+    """
+    directory = settings['directory']
+    started = time.perf_counter()
+    error = None
+    try:
+        system = LabNotificationSystem(
+            settings['presentation_day'], settings.get('presentation_time'), settings['maintenance_day'], settings.get('location'),
+            send_presentation_reminders=settings.get('send_presentation_reminders', False),
+            force_maintenance_reminder=False,
+            outbox_path=os.path.join(directory, 'outbox.sqlite3') if settings.get('use_outbox') else None,
+            email_notifier=clients.email_notifier,
+            slack_notifier=clients.slack_notifier(settings.get('slack_token_env', 'SLACK_TOKEN')),
+            calendar_manager=clients.calendar_manager(os.path.join(directory, 'event_ledger.json')),
+            members_path=os.path.join(directory, 'lab_members.json'),
+            tracker_path=os.path.join(directory, 'duty_tracker.json'),
+            slack_channel=settings.get('slack_channel', '#lfl-general-exclusive'),
+            lab_citizen_day_link=settings.get('lab_citizen_day_link'),
+            close_clients=False,
+            report_metrics=False,
+        )
+        try:
+            system.run()
+        finally:
+            system.close()
+    except Exception as e:
+        error = f"{''.join(traceback.format_exception(type(e), e, e.__traceback__))}"
+        print(f"Lab {name} failed: {e}")
+    instrumentation.record_span(f'lab.{name}', time.perf_counter() - started, started, ok=error is None)
+    return {'lab': name, 'ok': error is None, 'seconds': round(time.perf_counter() - started, 3), 'error': error}
+
+
+def _run_group(labs, workers, client_options):
+    """Run labs, workers at a time, on one set of shared clients closed at the end, then print their slowest spans."""
+    clients = SharedClients(**client_options)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda lab: run_lab(lab[0], lab[1], clients), labs.items()))
+    finally:
+        clients.close()
+        print(f"Slowest spans of {', '.join(labs)}:\n{instrumentation.format_slowest(len(labs) + 5)}")
+
+
+def run_labs(labs, workers=4, processes=1, client_options=None):
+    """
+    Run every lab and return their results, in the order of labs.
+
+    Parameters:
+    - labs: {name: settings}, as in labs.json.
+    - workers: How many labs run at once in each process.
+    - processes: Spread the labs over this many processes, each with its own
+      shared clients. 1 runs them all in this process.
+    - client_options: Keyword arguments for SharedClients, picklable if processes > 1.
+    """
+    client_options = client_options or {}
+    if processes <= 1:
+        return _run_group(labs, workers, client_options)
+
+    names = list(labs)
+    groups = [{name: labs[name] for name in names[index::processes]} for index in range(processes)]
+    results = {}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(_run_group, group, workers, client_options) for group in groups if group]
+        for future in futures:
+            for result in future.result():
+                results[result['lab']] = result
+    return [results[name] for name in names]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the lab notification system for every lab in labs.json.")
+    parser.add_argument('--config', default='labs.json')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('MULTI_LAB_WORKERS', 4)))
+    parser.add_argument('--processes', type=int, default=int(os.environ.get('MULTI_LAB_PROCESSES', 1)))
+    parser.add_argument('--labs', nargs='+', help="only run these labs")
+    args = parser.parse_args(argv)
+
+    labs = load_labs(args.config)
+    if args.labs:
+        unknown = set(args.labs) - set(labs)
+        if unknown:
+            parser.error(f"Unknown lab(s): {', '.join(sorted(unknown))}")
+        labs = {name: labs[name] for name in args.labs}
+
+    started = time.perf_counter()
+    results = run_labs(labs, workers=args.workers, processes=args.processes)
+    elapsed = time.perf_counter() - started
+
+    print(f"\n{len(results)} lab(s) in {elapsed:.2f} s")
+    for result in results:
+        print(f"{result['lab']:<20} | {'ok' if result['ok'] else 'FAILED':<6} | {1000 * result['seconds']:.0f} ms")
+    failures = [result for result in results if not result['ok']]
+    if failures:
+        alert_developer("\n\n".join(f"Lab {result['lab']}:\n{result['error']}" for result in failures))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Durable outbox of the emails, Slack posts and calendar events decided by a run.
+
+The actions of a run with USE_OUTBOX=true are spooled to outbox.sqlite3 and sent
+by a Dispatcher (see LabNotificationSystem.dispatch_outbox). Actions that used
+up their attempts are dead-lettered and raised as a DeadLetterError, which
+alerts the developer once. Requeued dead letters are sent by the next run.
+
+Usage:
+    python outbox.py status [--path outbox.sqlite3]
+    python outbox.py requeue [--path outbox.sqlite3]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+EMAIL = 'email'
+SLACK = 'slack'
+CALENDAR = 'calendar'
+
+PENDING = 'pending'
+SENT = 'sent'
+DEAD = 'dead'
+
+
+class DeadLetterError(Exception):
+    """Raised when actions used up all their attempts and were moved to the dead letters."""
+    def __init__(self, dead_letters):
+        self.dead_letters = dead_letters
+        super().__init__("\n".join(
+            f"Outbox {channel} action {action_id} dead-lettered: {error}\n{json.dumps(payload)[:500]}" for action_id, channel, payload, error in dead_letters
+        ))
+
+
+class Outbox:
+    """
+    Durable SQLite spool of outbound actions: emails, Slack posts and calendar inserts.
+
+    Pipelines enqueue actions instead of performing them. A Dispatcher sends them
+    later; failed actions are retried with exponential backoff and moved to the
+    dead letters after max_attempts. Actions still pending at the end of a run are
+    retried by the next one.
+    """
+    def __init__(self, path='outbox.sqlite3', max_attempts=5, backoff=30):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS actions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                dedupe_key TEXT UNIQUE,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS actions_due ON actions (status, next_attempt_at)")
+
+    def close(self):
+        self._conn.close()
+
+    def enqueue(self, channel, payload, dedupe_key=None):
+        """Spool an action. An action with the same dedupe_key as an earlier one is ignored."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO actions (channel, payload, dedupe_key, next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (channel, json.dumps(payload), dedupe_key, now, now, now),
+            )
+
+    def due(self, now=None):
+        """Return the pending actions whose next attempt is due, as (id, channel, payload) tuples."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, channel, payload FROM actions WHERE status = ? AND next_attempt_at <= ? ORDER BY id",
+                (PENDING, now or time.time()),
+            ).fetchall()
+        return [(action_id, channel, json.loads(payload)) for action_id, channel, payload in rows]
+
+    def next_attempt_at(self):
+        """Return when the earliest pending action is due, or None if nothing is pending."""
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(next_attempt_at) FROM actions WHERE status = ?", (PENDING,)).fetchone()
+        return row[0]
+
+    def mark_sent(self, action_id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE actions SET status = ?, attempts = attempts + 1, last_error = NULL, updated_at = ? WHERE id = ?",
+                (SENT, time.time(), action_id),
+            )
+
+    def mark_failed(self, action_id, error):
+        """Schedule a retry of the action, or dead-letter it once it has used all its attempts."""
+        now = time.time()
+        with self._lock:
+            attempts = self._conn.execute("SELECT attempts FROM actions WHERE id = ?", (action_id,)).fetchone()[0] + 1
+            status = DEAD if attempts >= self.max_attempts else PENDING
+            delay = random.uniform(0.5, 1.0) * self.backoff * 2 ** (attempts - 1)
+            self._conn.execute(
+                "UPDATE actions SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (status, attempts, now + delay, str(error), now, action_id),
+            )
+        return status
+
+    def counts(self):
+        """Return the number of actions in each status."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM actions GROUP BY status").fetchall())
+
+    def dead_letters(self, since=None):
+        """Return the dead-lettered actions, as (id, channel, payload, last_error) tuples."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, channel, payload, last_error FROM actions WHERE status = ? AND updated_at >= ? ORDER BY id",
+                (DEAD, since or 0),
+            ).fetchall()
+        return [(action_id, channel, json.loads(payload), error) for action_id, channel, payload, error in rows]
+
+    def requeue_dead(self):
+        """Give every dead-lettered action a fresh set of attempts. Returns how many were requeued."""
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE actions SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? WHERE status = ?",
+                (PENDING, now, now, DEAD),
+            ).rowcount
+
+
+class Dispatcher:
+    """
+    Drains an Outbox by handing each action to the handler of its channel.
+
+    Channels are sent in parallel, each with its own bounded number of workers.
+    """
+    DEFAULT_CONCURRENCY = {EMAIL: 1, SLACK: 2, CALENDAR: 1}
+
+    def __init__(self, outbox, handlers, concurrency=None):
+        self.outbox = outbox
+        self.handlers = handlers
+        self.concurrency = dict(self.DEFAULT_CONCURRENCY, **(concurrency or {}))
+
+    def _send(self, action_id, channel, payload):
+        try:
+            self.handlers[channel](payload)
+        except Exception as e:
+            status = self.outbox.mark_failed(action_id, e)
+            print(f"Outbox {channel} action {action_id} failed ({'dead-lettered' if status == DEAD else 'will retry'}): {e}")
+            return False
+        self.outbox.mark_sent(action_id)
+        return True
+
+    def _drain_channel(self, channel, actions):
+        with ThreadPoolExecutor(max_workers=self.concurrency.get(channel, 1)) as executor:
+            return list(executor.map(lambda action: self._send(*action), actions))
+
+    def drain(self, retry_within=0):
+        """
+        Send every due action.
+
+        Parameters:
+        - retry_within: Keep retrying failed actions that become due within this many seconds.
+
+        Returns:
+        - A (sent, failed) tuple of attempt counts.
+        """
+        sent = failed = 0
+        deadline = time.time() + retry_within
+        while True:
+            by_channel = {}
+            for action_id, channel, payload in self.outbox.due():
+                by_channel.setdefault(channel, []).append((action_id, channel, payload))
+            if by_channel:
+                with ThreadPoolExecutor(max_workers=len(by_channel)) as executor:
+                    for results in executor.map(lambda item: self._drain_channel(*item), by_channel.items()):
+                        sent += sum(results)
+                        failed += len(results) - sum(results)
+
+            next_attempt_at = self.outbox.next_attempt_at()
+            if next_attempt_at is None or next_attempt_at > deadline:
+                return sent, failed
+            time.sleep(max(0, next_attempt_at - time.time()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the outbox or requeue its dead letters.")
+    parser.add_argument('command', choices=['status', 'requeue'])
+    parser.add_argument('--path', default='outbox.sqlite3')
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.path):
+        print(f"No outbox at {args.path}")
+        return 0
+
+    outbox = Outbox(args.path)
+    try:
+        if args.command == 'requeue':
+            print(f"Requeued {outbox.requeue_dead()} dead letter(s), the next run sends them")
+            return 0
+        print(json.dumps(outbox.counts(), indent=4))
+        for action_id, channel, payload, error in outbox.dead_letters():
+            print(f"Dead letter {action_id} ({channel}): {error}\n{json.dumps(payload)[:500]}")
+        return 0
+    finally:
+        outbox.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+UNDERGRAD_ROLE = 'Undergraduate Student'
+MAINTENANCE_ROLES = ('PhD Student', 'Post-Doc')
+
+
+class RotationEngine:
+    """
+    Precomputed duty rotations over the lab roster.
+
+    Each duty has a ring of eligible members, in roster order, and an id -> position
+    index into that ring, so finding the next member is a constant-time lookup.
+    The rings are the role views of a MemberDirectory, which has unique ids.
+    """
+    def __init__(self, directory):
+        members = directory.members
+        self.rings = {
+            'presentation': members,
+            'maintenance': directory.with_roles(*MAINTENANCE_ROLES),
+            'snacks': directory.without_roles(UNDERGRAD_ROLE),
+        }
+        self.positions = {
+            duty: {member.id: index for index, member in enumerate(ring)} for duty, ring in self.rings.items()
+        }
+
+        # Undergrads present together, after which the rotation resumes with
+        # whoever follows the last undergrad in the roster
+        self.undergrads = list(directory.with_roles(UNDERGRAD_ROLE))
+        self.after_undergrads_id = None
+        if self.undergrads:
+            last_undergrad_index = self.positions['presentation'][self.undergrads[-1].id]
+            self.after_undergrads_id = members[(last_undergrad_index + 1) % len(members)].id
+
+    def _ring(self, duty):
+        ring = self.rings[duty]
+        if not ring:
+            raise ValueError(f"No lab members are eligible for {duty}")
+        return ring
+
+    def member(self, duty, member_id):
+        """Return the member with member_id in the duty's rotation, or None."""
+        position = self.positions[duty].get(member_id)
+        return self.rings[duty][position] if position is not None else None
+
+    def next_member(self, duty, current_member_id):
+        """Return the id of the member after current_member_id in the duty's rotation."""
+        ring = self._ring(duty)
+        position = self.positions[duty].get(current_member_id)
+        if position is None:
+            raise ValueError(f"Member {current_member_id} is not in the {duty} rotation")
+        return ring[(position + 1) % len(ring)].id
+
+    def next_presenter(self, current_presenter_id):
+        """
+        Return the next presentation slot after current_presenter_id.
+
+        Returns:
+        - A (presenters, next_presenter_id, is_group_presentation) tuple. When the next
+          member is an undergrad, presenters are all undergrads and next_presenter_id is
+          the member after the last undergrad.
+        """
+        ring = self._ring('presentation')
+        # An unknown presenter restarts the rotation from the top of the roster
+        position = self.positions['presentation'].get(current_presenter_id, 0)
+        next_presenter = ring[(position + 1) % len(ring)]
+
+        if next_presenter.role == UNDERGRAD_ROLE:
+            return self.undergrads, self.after_undergrads_id, True
+        return [next_presenter], next_presenter.id, False
+
+    def upcoming(self, duty, current_member_id, count):
+        """
+        Return the next count assignments of a duty after current_member_id.
+
+        Presentation assignments are (presenters, next_presenter_id, is_group_presentation)
+        tuples; the other duties are member ids.
+        """
+        if duty == 'presentation':
+            assignments = []
+            for _ in range(count):
+                assignment = self.next_presenter(current_member_id)
+                current_member_id = assignment[1]
+                assignments.append(assignment)
+            return assignments
+
+        ring = self._ring(duty)
+        position = self.positions[duty].get(current_member_id)
+        if position is None:
+            raise ValueError(f"Member {current_member_id} is not in the {duty} rotation")
+        return [ring[(position + step) % len(ring)].id for step in range(1, count + 1)]
@@ -0,0 +1,161 @@
+"""
+Dry-run simulator of the lab duty schedule.
+
+Projects the presentation, maintenance and snack assignments that main.py would
+make between two dates, using the same calendar rules and rotations, without
+touching the network or duty_tracker.json.
+
+Usage:
+    python simulator.py [--start YYYY-MM-DD] [--end YYYY-MM-DD | --years N]
+                        [--csv PATH] [--json PATH]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from duty_tracker_store import DutyTrackerStore
+from meeting_calendar import (HOLIDAY_NEXT_WEEK, LAB_CITIZEN_NOTICE, MAINTENANCE_DAY, PRESENTATION_DAY, SNACK_DAY,
+                              MeetingCalendar, chosen_day, next_monday)
+from member_directory import MemberDirectory
+from rotation_engine import RotationEngine
+
+FIELDS = ['date', 'duty', 'event_date', 'member_ids', 'names', 'note']
+
+
+def _row(day, duty, event_date, members=(), note=''):
+    return {
+        'date': day.isoformat(),
+        'duty': duty,
+        'event_date': event_date.isoformat(),
+        'member_ids': [member.id for member in members],
+        'names': [member.name for member in members],
+        'note': note,
+    }
+
+
+def simulate(members, tracker, presentation_day, maintenance_day, start, end):
+    """
+    Return the assignments main.py would make on each day in [start, end).
+
+    The days are classified in one pass over the MeetingCalendar index, then each
+    rotation is advanced once for all of its slots with RotationEngine.upcoming().
+
+    Parameters:
+    - members: The lab roster, a MemberDirectory.
+    - tracker: The duty tracker state to start from, as in duty_tracker.json.
+    - presentation_day, maintenance_day: Weekday numbers, as returned by chosen_day().
+
+    Returns:
+    - A list of rows ordered by date, each with the send date, the duty, the date it
+      is for, the member ids and names assigned and a note. Presentation days that do
+      not advance the rotation (Lab Citizen Day, holidays) have a row with no members.
+    """
+    rotation = RotationEngine(members)
+    calendar = MeetingCalendar(presentation_day, maintenance_day, start=start, horizon_days=max((end - start).days, 0))
+
+    slots = {'presentation': [], 'maintenance': [], 'snacks': []}
+    rows = []
+    for offset, flags in enumerate(calendar.index):
+        if not flags & (PRESENTATION_DAY | MAINTENANCE_DAY | SNACK_DAY):
+            continue
+        day = start + timedelta(days=offset)
+        if flags & PRESENTATION_DAY:
+            if flags & LAB_CITIZEN_NOTICE:
+                rows.append(_row(day, 'presentation', next_monday(day), note='Lab Citizen Day'))
+            elif flags & HOLIDAY_NEXT_WEEK:
+                holiday = calendar.holiday_name(day + timedelta(days=7))
+                rows.append(_row(day, 'presentation', day + timedelta(days=7), note=f'No meeting: {holiday}'))
+            else:
+                slots['presentation'].append((len(rows), day))
+                rows.append(None)
+        if flags & MAINTENANCE_DAY:
+            slots['maintenance'].append((len(rows), day))
+            rows.append(None)
+        if flags & SNACK_DAY:
+            slots['snacks'].append((len(rows), day))
+            rows.append(None)
+
+    presentations = rotation.upcoming('presentation', tracker.get('presentation'), len(slots['presentation']))
+    for (index, day), (presenters, _, is_group_presentation) in zip(slots['presentation'], presentations):
+        rows[index] = _row(day, 'presentation', day + timedelta(days=7), presenters,
+                           note='Undergraduate group presentation' if is_group_presentation else '')
+
+    for duty, event_offset in (('maintenance', 3), ('snacks', 1)):
+        if not slots[duty]:
+            continue
+        member_ids = rotation.upcoming(duty, tracker.get(duty), len(slots[duty]))
+        for (index, day), member_id in zip(slots[duty], member_ids):
+            rows[index] = _row(day, duty, day + timedelta(days=event_offset), [rotation.member(duty, member_id)])
+    return rows
+
+
+def fairness(rows):
+    """Return how many times each member is assigned each duty, as {duty: {name: count}}."""
+    counts = {}
+    for row in rows:
+        counts.setdefault(row['duty'], Counter()).update(row['names'])
+    return {duty: dict(counter.most_common()) for duty, counter in counts.items()}
+
+
+def export_csv(rows, path):
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(row, member_ids='; '.join(row['member_ids']), names='; '.join(row['names'])))
+
+
+def export_json(rows, path):
+    with open(path, 'w') as file:
+        json.dump(rows, file, indent=4)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate the lab duty schedule without sending anything.")
+    parser.add_argument('--start', type=date.fromisoformat, default=date.today())
+    parser.add_argument('--end', type=date.fromisoformat)
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--members', default='lab_members.json')
+    parser.add_argument('--tracker', default='duty_tracker.json')
+    parser.add_argument('--presentation-day', default=os.environ.get('PRESENTATION_DAY'))
+    parser.add_argument('--maintenance-day', default=os.environ.get('MAINTENANCE_DAY'))
+    parser.add_argument('--csv')
+    parser.add_argument('--json')
+    args = parser.parse_args(argv)
+
+    presentation_day = chosen_day(args.presentation_day)
+    maintenance_day = chosen_day(args.maintenance_day)
+    if presentation_day < 0 or maintenance_day < 0:
+        parser.error("Set --presentation-day and --maintenance-day (or PRESENTATION_DAY and MAINTENANCE_DAY) to a day name")
+    end = args.end or args.start + timedelta(days=365 * args.years)
+
+    members = MemberDirectory.load(args.members)
+    # snapshot() only reads the tracker, nothing is staged or committed
+    tracker = DutyTrackerStore(args.tracker).snapshot()
+
+    started = time.perf_counter()
+    rows = simulate(members, tracker, presentation_day, maintenance_day, args.start, end)
+    elapsed = time.perf_counter() - started
+
+    if args.csv:
+        export_csv(rows, args.csv)
+    if args.json:
+        export_json(rows, args.json)
+    if not (args.csv or args.json):
+        for row in rows:
+            print(f"{row['date']} | {row['duty']:<12} | {row['event_date']} | {', '.join(row['names']) or '-'} {row['note']}".rstrip())
+
+    print(f"\nSimulated {args.start} to {end}: {len(rows)} assignment(s) in {1000 * elapsed:.1f} ms")
+    for duty, counts in fairness(rows).items():
+        if counts:
+            print(f"{duty}: " + ", ".join(f"{name} x{count}" for name, count in counts.items())
+                  + f" (spread {max(counts.values()) - min(counts.values())})")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,130 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
 import requests
 
-class SlackNotifier:
-    def __init__(self, token):
+import instrumentation
+
+
+def retry_after_seconds(value):
+    """
+    Return the delay asked for by a Retry-After header, or None if it can't be read.
+
+    The header holds either a number of seconds or an HTTP-date (RFC 9110).
+    """
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class SlackRetries:
+    """
+    The retry decisions of a Slack client, shared by SlackNotifier and AsyncSlackNotifier.
+
+    The clients only make the requests; which responses are retried, how long
+    to wait and when to give up are decided here. Subclasses set max_retries,
+    backoff and retries.
+    """
+    @staticmethod
+    def is_transient(status):
+        """Whether a response with this HTTP status is retried: rate limited or a server error."""
+        return status == 429 or status >= 500
+
+    def _retry_delay(self, attempt, retry_after=None):
+        delay = retry_after_seconds(retry_after) if retry_after else None
+        if delay is not None:
+            return delay
+        # Exponential backoff with full jitter
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def _retry_or_raise(self, attempt, error, retry_after=None):
+        """Return how long to wait before retrying a failed attempt, or raise once it was the last one."""
+        if attempt == self.max_retries:
+            instrumentation.count('failures', service='slack')
+            raise Exception(f"Error sending message to Slack: {error}")
+        self.retries += 1
+        instrumentation.count('retries', service='slack')
+        return self._retry_delay(attempt, retry_after)
+
+    @staticmethod
+    def _check_result(result):
+        """Return a chat.postMessage result, raising if Slack reports an error."""
+        if not result.get("ok"):
+            instrumentation.count('failures', service='slack')
+            raise Exception(f"Error sending message to Slack: {result}")
+        return result
+
+
+class SlackNotifier(SlackRetries):
+    def __init__(self, token, base_url='https://slack.com/api', timeout=10, max_retries=3, backoff=1.0, coalesce=False):
         self.token = token
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # When coalescing, messages are held per channel and posted together by flush()
+        self.coalesce = coalesce
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {token}'
+        self.posts = 0
+        self.retries = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
 
     def send_message(self, channel, message):
-        """Send a message to a Slack channel."""
-        url = 'https://slack.com/api/chat.postMessage'
-        headers = {'Authorization': f'Bearer {self.token}'}
+        """Send a message to a Slack channel, or hold it for flush() when coalescing."""
+        if self.coalesce:
+            with self._lock:
+                self._pending.setdefault(channel, []).append(message)
+            return
+        self.post(channel, message)
+
+    def flush(self):
+        """Post the held messages, one chat.postMessage per channel."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for channel, messages in pending.items():
+            self.post(channel, "\n\n".join(messages))
+
+    def close(self):
+        self.flush()
+        self.session.close()
+
+    def post(self, channel, message):
+        """Post a message to a Slack channel right away, retrying transient failures."""
+        url = f'{self.base_url}/chat.postMessage'
         payload = {'channel': channel, 'text': message}
 
-        response = requests.post(url, headers=headers, data=payload)
-        if not response.json().get("ok"):
-            raise Exception(f"Error sending message to Slack: {response.json()}")
+        with instrumentation.span('slack.post'):
+            for attempt in range(self.max_retries + 1):
+                response = None
+                try:
+                    instrumentation.count('calls', service='slack')
+                    response = self.session.post(url, data=payload, timeout=self.timeout)
+                    self.posts += 1
+                    instrumentation.count('bytes_sent', len(response.request.body or ''), service='slack')
+                    if self.is_transient(response.status_code):
+                        raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+                    result = response.json()
+                except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                    retry_after = response.headers.get('Retry-After') if response is not None else None
+                    time.sleep(self._retry_or_raise(attempt, e, retry_after))
+                    continue
+                return self._check_result(result)
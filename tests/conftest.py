@@ -0,0 +1,99 @@
+"""
+Fixtures running LabNotificationSystem against the local stand-ins in benchmarks/fakes.py.
+
+Each test gets a working directory with a synthetic roster, a duty tracker and an
+empty service key, and a system whose SMTP, Slack and Calendar clients talk to
+the fakes.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from google.auth.credentials import AnonymousCredentials  # noqa: E402
+
+from benchmarks.e2e import LOCATION, MAINTENANCE_DAY, PRESENTATION_DAY, PRESENTATION_TIME, make_roster, write_workdir  # noqa: E402
+from benchmarks.fakes import FakeCalendarServer, FakeSlackServer, FakeSMTPServer  # noqa: E402
+from calendar_manager import CalendarManager  # noqa: E402
+from email_notifier import EmailNotifier  # noqa: E402
+from main import LabNotificationSystem  # noqa: E402
+from slack_notifier import SlackNotifier  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def servers():
+    with FakeSMTPServer() as smtp, FakeSlackServer() as slack, FakeCalendarServer() as calendar:
+        yield smtp, slack, calendar
+
+
+@pytest.fixture(scope='session')
+def credentials():
+    # One credentials object, so every test shares the Calendar service built for it
+    return AnonymousCredentials()
+
+
+@pytest.fixture
+def fakes(servers):
+    for fake in servers:
+        fake.reset()
+    return servers
+
+
+@pytest.fixture
+def smtp(fakes):
+    return fakes[0]
+
+
+@pytest.fixture
+def slack(fakes):
+    return fakes[1]
+
+
+@pytest.fixture
+def calendar(fakes):
+    return fakes[2]
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A working directory with a 20 member roster, members 8, 9, 18 and 19 being undergrads."""
+    write_workdir(str(tmp_path), make_roster(20))
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def calendar_manager(workdir, smtp, calendar, credentials):
+    email_notifier = EmailNotifier('test@example.com', 'password', host=smtp.host, port=smtp.port, use_tls=False)
+    return CalendarManager(email_notifier, credentials=credentials, root_url=calendar.root_url)
+
+
+@pytest.fixture
+def make_system(workdir, smtp, slack, calendar, credentials):
+    """Return a factory of LabNotificationSystem on the fakes; keyword arguments override the defaults."""
+    systems = []
+
+    def make(**overrides):
+        email_notifier = EmailNotifier('test@example.com', 'password', host=smtp.host, port=smtp.port, use_tls=False)
+        settings = dict(
+            presentation_day=PRESENTATION_DAY,
+            presentation_time=PRESENTATION_TIME,
+            maintenance_day=MAINTENANCE_DAY,
+            location=LOCATION,
+            send_presentation_reminders=True,
+            force_maintenance_reminder=False,
+            email_notifier=email_notifier,
+            slack_notifier=SlackNotifier('xoxb-test', base_url=slack.base_url, backoff=0),
+            calendar_manager=CalendarManager(email_notifier, credentials=credentials, root_url=calendar.root_url),
+        )
+        settings.update(overrides)
+        system = LabNotificationSystem(**settings)
+        systems.append(system)
+        return system
+
+    yield make
+    for system in systems:
+        system.close()
@@ -0,0 +1,80 @@
+"""
+Tests of process_aps_urls against saved APS abstract pages served by FakeAPSServer.
+"""
+import os
+
+import pytest
+
+from aps_cache import APSPageCache
+from benchmarks.fakes import FakeAPSServer
+from mm_calendar import create_aps_session, parse_aps_page, process_aps_urls
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'aps_pages')
+NAMES = ['B54.1', 'B54.6', 'K50.11', 'S50.2']
+
+
+@pytest.fixture(scope='module')
+def aps_server():
+    with FakeAPSServer(PAGES_DIR) as server:
+        yield server
+
+
+@pytest.fixture
+def aps(aps_server):
+    aps_server.reset()
+    return aps_server
+
+
+def expected(aps, names):
+    records = []
+    for name in names:
+        with open(os.path.join(PAGES_DIR, name + '.html'), 'rb') as file:
+            records.extend(parse_aps_page(file.read(), aps.url(name)))
+    return records
+
+
+def test_records_keep_the_order_of_the_urls(aps):
+    # The first page answers last
+    aps.delay(NAMES[0], 0.3)
+    urls = [aps.url(name) for name in NAMES]
+    assert process_aps_urls(urls, max_workers=4) == expected(aps, NAMES)
+    assert aps.served[-1] == NAMES[0]
+
+
+def test_server_errors_are_retried(aps):
+    aps.fail('B54.6', 503, 502)
+    urls = [aps.url(name) for name in NAMES]
+    assert process_aps_urls(urls, session=create_aps_session(backoff_factor=0)) == expected(aps, NAMES)
+    assert aps.served.count('B54.6') == 3
+    assert aps.counters['failures'] == 2
+
+
+def test_page_failing_every_retry_is_skipped(aps):
+    aps.fail('K50.11', *[500] * 4)
+    urls = [aps.url(name) for name in NAMES]
+    records = process_aps_urls(urls, session=create_aps_session(retries=3, backoff_factor=0))
+    assert records == expected(aps, ['B54.1', 'B54.6', 'S50.2'])
+    assert aps.served.count('K50.11') == 4
+
+
+def test_connections_are_reused_across_pages(aps):
+    urls = [aps.url(name) for name in NAMES * 4]
+    assert process_aps_urls(urls, max_workers=2) == expected(aps, NAMES * 4)
+    assert aps.counters['requests'] == 16
+    assert aps.counters['connections'] <= 2
+
+
+def test_cache_skips_fresh_pages_and_revalidates_stale_ones(aps, tmp_path):
+    urls = [aps.url(name) for name in NAMES]
+    cache_dir = str(tmp_path / 'aps_cache')
+    cache = APSPageCache(cache_dir=cache_dir)
+    assert process_aps_urls(urls, cache=cache) == expected(aps, NAMES)
+    assert process_aps_urls(urls, cache=cache) == expected(aps, NAMES)
+    assert (cache.misses, cache.hits) == (4, 4)
+    assert aps.counters['requests'] == 4
+
+    # The next run reads the saved index; past the ttl every page is revalidated with its ETag
+    stale = APSPageCache(cache_dir=cache_dir, ttl=0)
+    assert process_aps_urls(urls, cache=stale) == expected(aps, NAMES)
+    assert (stale.misses, stale.revalidations) == (0, 4)
+    assert aps.counters['not_modified'] == 4
@@ -0,0 +1,34 @@
+import pytest
+
+from mm_calendar import parse_aps_page, parse_aps_page_full
+
+URL = 'https://meetings.aps.org/Meeting/MAR24/Session/B54.1'
+HEAD = ('<html><head><meta name="citation_title" content="Fast qubits">'
+        '<meta name="citation_authors" content="Ada Lovelace; Alan Turing">'
+        '<meta name="citation_date" content="03/05/2024"></head><body>')
+PAGES = {
+    'flat': '<h3>Session B54: Qubits</h3><p style="margin-top: 0px;">Tuesday</p><p>8:00am &ndash; 8:12am</p>'
+            '<p>Room: 101A</p><div class="largernormal"><p>We <b>study</b> qubits.</p></div>',
+    'nested_divs': '<h3>Session B54: Qubits</h3><div><p style="margin-top: 0px;">Tuesday</p></div>'
+                   '<div><p>8:00am &ndash; 8:12am</p></div><div><span>Room: 101A</span></div>'
+                   '<div class="largernormal"><p>We study qubits.</p></div>',
+    'nested_p': '<h3>Session B54: Qubits</h3><div><p style="margin-top: 0px;">Tuesday<p>inner</p></p>'
+                '<p>8:00am &ndash; 8:12am</p></div><p>Room: 101A</p><div class="largernormal">Abstract</div>',
+    'p_between': '<h3>Session B54: Qubits</h3><div><p style="margin-top: 0px;">Tuesday</p>'
+                 '<span><p>9:00am &ndash; 9:12am</p></span><p>8:00am &ndash; 8:12am</p></div><p>Room: 101A</p>',
+    'poster': '<h3>Poster Session J00 (2pm-5pm CST)</h3><div><p style="margin-top: 0px;">Tuesday</p></div>'
+              '<p>Room: Hall</p>',
+}
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_parse_aps_page_matches_the_full_parse(name):
+    page = HEAD + PAGES[name] + '</body></html>'
+    assert parse_aps_page(page, URL) == parse_aps_page_full(page, URL)
+
+
+def test_parse_aps_page_reads_the_fields():
+    assert parse_aps_page(HEAD + PAGES['flat'] + '</body></html>', URL) == [{
+        'name': 'Ada Lovelace', 'title': 'Fast qubits', 'pres_date': '03/05/2024', 'time_begin': '8:00am',
+        'time_end': '8:12am', 'abstract': 'We study qubits.', 'url': URL, 'location': '101A',
+    }]
@@ -0,0 +1,52 @@
+import asyncio
+
+from async_clients import AsyncCalendarManager, AsyncEmailNotifier, AsyncSlackNotifier
+from email_notifier import EmailNotifier
+from slack_notifier import SlackNotifier
+
+
+def test_async_slack_retries_like_the_sync_client(slack):
+    slack.throttle('0', 'Wed, 21 Oct 2015 07:28:00 GMT')
+
+    async def post():
+        notifier = AsyncSlackNotifier.from_notifier(SlackNotifier('xoxb-test', base_url=slack.base_url, backoff=0))
+        try:
+            return await notifier.post('#lab', "hi"), notifier.retries
+        finally:
+            await notifier.close()
+
+    result, retries = asyncio.run(post())
+    assert result['ok']
+    assert retries == 2
+    assert slack.messages == [{'channel': '#lab', 'text': "hi"}]
+
+
+def test_async_email_shares_sessions(smtp):
+    async def send():
+        notifier = AsyncEmailNotifier.from_notifier(
+            EmailNotifier('test@example.com', 'password', host=smtp.host, port=smtp.port, use_tls=False), max_sessions=2)
+        try:
+            errors = await notifier.send_many([(['member1@example.com'], f"Subject {index}", "Body") for index in range(6)])
+        finally:
+            await notifier.close()
+        return errors, notifier.handshakes
+
+    errors, handshakes = asyncio.run(send())
+    assert errors == [None] * 6
+    assert handshakes <= 2
+    assert smtp.counters['messages'] == 6
+
+
+def test_async_calendar_skips_events_the_sync_client_created(calendar_manager, calendar):
+    event_body = calendar_manager.build_event_body("Event", "", "2026-11-02", "2026-11-03", ['member1@example.com'], all_day=True)
+    created = calendar_manager.insert_event(dict(event_body))
+
+    async def insert():
+        manager = AsyncCalendarManager(calendar_manager)
+        try:
+            return await manager.insert_event(dict(event_body))
+        finally:
+            await manager.close()
+
+    assert asyncio.run(insert()) == {'id': created['id']}
+    assert len(calendar.events) == 1
@@ -0,0 +1,53 @@
+import json
+from datetime import date, timedelta
+
+FRIDAY = date(2026, 10, 16)
+MONDAY = date(2026, 10, 19)
+
+
+def read_tracker(workdir):
+    with open(workdir / 'duty_tracker.json') as file:
+        return json.load(file)
+
+
+def test_backfill_sends_only_the_still_relevant_notifications(make_system, workdir, smtp, calendar):
+    system = make_system()
+    system.backfill(FRIDAY, MONDAY, today=MONDAY + timedelta(days=1))
+
+    # Friday's maintenance week and Monday's presentation are still ahead, Sunday's snacks are not
+    assert smtp.counters['messages'] == 2
+    assert sorted(event['summary'] for event in calendar.events.values()) == [
+        'Group Meeting Presentation by Member 2',
+        'Lab Maintenance by Member 2',
+    ]
+    # Every rotation advanced, snacks included
+    assert read_tracker(workdir) == {'presentation': '2', 'maintenance': '2', 'snacks': '2'}
+    assert system.today() == date.today()
+    assert not system.muted
+
+
+def test_backfill_advances_rotations_like_daily_runs(make_system, workdir):
+    initial = read_tracker(workdir)
+    days = [FRIDAY + timedelta(days=offset) for offset in range(21)]
+
+    daily = make_system()
+    for day in days:
+        daily.clock = lambda day=day: day
+        daily.run()
+        daily.refresh()
+    expected = read_tracker(workdir)
+
+    with open(workdir / 'duty_tracker.json', 'w') as file:
+        json.dump(initial, file)
+    make_system().backfill(days[0], days[-1], today=days[-1] + timedelta(days=30))
+
+    assert read_tracker(workdir) == expected
+    assert expected != initial
+
+
+def test_backfill_mutes_every_notification_of_old_days(make_system, smtp, slack, calendar):
+    make_system().backfill(FRIDAY, MONDAY, today=MONDAY + timedelta(days=30))
+
+    assert smtp.counters.get('messages', 0) == 0
+    assert slack.messages == []
+    assert calendar.events == {}
@@ -0,0 +1,130 @@
+import json
+
+from benchmarks.fakes import FakeCalendarServer
+from calendar_manager import CalendarBatch, CalendarManager, MissingBatchResponse
+
+
+def event_body(calendar_manager, index):
+    return calendar_manager.build_event_body(
+        title=f"Event {index}", description="", start_date=f"2026-11-{index + 1:02d}", end_date=f"2026-11-{index + 2:02d}",
+        attendees=['member1@example.com'], all_day=True,
+    )
+
+
+def ledger_entries(workdir):
+    with open(workdir / 'event_ledger.json') as file:
+        return json.load(file)
+
+
+class RecordingNotifier:
+    def __init__(self):
+        self.sent = []
+
+    def send_email(self, recipients, subject, message, html=None):
+        self.sent.append((recipients, subject, message))
+
+
+class DroppingCalendarServer(FakeCalendarServer):
+    """Leaves the last request of every batch out of the batch response, undoing it unless applied is set."""
+    applied = True
+
+    def _handle_batch(self, body, headers):
+        before = set(self.events)
+        status, response, content_type = super()._handle_batch(body, headers)
+        created = [event_id for event_id in self.events if event_id not in before]
+        if not self.applied and created:
+            del self.events[created[-1]]
+        boundary = b'--fake_batch_boundary'
+        parts = response.split(boundary)
+        # ['', part, ..., part, '--\r\n']
+        return status, boundary.join(parts[:-2] + parts[-1:]), content_type
+
+
+def test_flush_sends_queued_inserts_in_batches(calendar_manager, calendar):
+    batch = calendar_manager.batch(batch_size=2)
+    for index in range(5):
+        batch.insert(event_body(calendar_manager, index))
+    assert len(batch) == 5
+
+    results = batch.flush()
+
+    assert [result.key for result in results] == [f"Event {index}" for index in range(5)]
+    assert all(result.error is None for result in results)
+    assert batch.round_trips == 3
+    assert calendar.counters['batches'] == 3
+    assert len(calendar.events) == 5
+    assert len(batch) == 0
+
+
+def test_flush_batch_records_the_ledger_and_skips_known_events(workdir, calendar_manager, calendar):
+    for index in range(3):
+        calendar_manager.queue_insert(event_body(calendar_manager, index))
+    calendar_manager.flush_batch()
+    assert len(calendar.events) == 3
+    assert len(ledger_entries(workdir)) == 3
+
+    # The next run finds them in the ledger and sends nothing
+    for index in range(3):
+        calendar_manager.queue_insert(event_body(calendar_manager, index))
+    assert calendar_manager.flush_batch() == []
+    assert calendar.counters['batches'] == 1
+
+
+def queue_three(calendar_manager):
+    for index in range(3):
+        calendar_manager.queue_insert(event_body(calendar_manager, index))
+    return list(calendar_manager._pending_ledger)
+
+
+def test_missing_batch_response_does_not_duplicate_events(workdir, smtp, credentials):
+    with DroppingCalendarServer() as calendar:
+        notifier = RecordingNotifier()
+        calendar_manager = CalendarManager(notifier, credentials=credentials, root_url=calendar.root_url)
+        keys = queue_three(calendar_manager)
+
+        results = calendar_manager.flush_batch()
+
+        # The parts that arrived are kept, the missing one is found on the calendar by its ledger key
+        assert [result.key for result in results] == keys
+        assert all(result.error is None for result in results)
+        assert sorted(ledger_entries(workdir)) == sorted(keys)
+        assert notifier.sent == []
+
+        # The next run finds all three, and only patches the one recovered without its fingerprint
+        rerun = CalendarManager(notifier, credentials=credentials, root_url=calendar.root_url)
+        queue_three(rerun)
+        rerun.flush_batch()
+        assert len(calendar.events) == 3
+
+
+def test_missing_batch_response_of_an_unapplied_request_is_an_error(workdir, smtp, credentials):
+    with DroppingCalendarServer() as calendar:
+        calendar.applied = False
+        notifier = RecordingNotifier()
+        calendar_manager = CalendarManager(notifier, credentials=credentials, root_url=calendar.root_url)
+        keys = queue_three(calendar_manager)
+
+        results = calendar_manager.flush_batch()
+
+        assert [result.error is None for result in results] == [True, True, False]
+        assert isinstance(results[2].error, MissingBatchResponse)
+        # Only the missing event is left out of the ledger, so the next run creates just that one
+        assert sorted(ledger_entries(workdir)) == sorted(keys[:2])
+        assert len(notifier.sent) == 1
+
+        calendar.applied = True
+        rerun = CalendarManager(notifier, credentials=credentials, root_url=calendar.root_url)
+        queue_three(rerun)
+        rerun.flush_batch()
+        assert len(calendar.events) == 3
+
+
+def test_rejected_batch_fails_every_request(calendar_manager, calendar):
+    batch = CalendarBatch(calendar_manager.service)
+    batch.delete('unknown-event')
+    batch.delete('another-unknown-event')
+
+    results = batch.flush()
+
+    assert [result.key for result in results] == ['unknown-event', 'another-unknown-event']
+    assert all(result.error is not None for result in results)
@@ -0,0 +1,32 @@
+from calendar_manager import CREATED_BY_PROPERTY, CREATED_BY_VALUE
+from calendar_service import get_calendar_service
+from mm_calendar import delete_all_created_calendar_entries
+
+
+def seed(calendar, count, tagged=True):
+    for index in range(count):
+        event = {'id': f"{'tagged' if tagged else 'manual'}{index:05d}", 'summary': f"Talk {index}",
+                 'start': {'dateTime': '2030-03-04T09:00:00-06:00'}}
+        if tagged:
+            event['extendedProperties'] = {'private': {CREATED_BY_PROPERTY: CREATED_BY_VALUE}}
+        calendar.events[event['id']] = event
+
+
+def test_cleanup_deletes_every_page_of_created_events(calendar, credentials):
+    # Five pages of 250 created events, next to events added by hand that must stay
+    seed(calendar, 1200)
+    seed(calendar, 30, tagged=False)
+    service = get_calendar_service(credentials, root_url=calendar.root_url)
+
+    deleted = delete_all_created_calendar_entries(service=service, calendar_id='conference', batch_size=50)
+
+    assert deleted == 1200
+    assert sorted(calendar.events) == [f"manual{index:05d}" for index in range(30)]
+
+
+def test_cleanup_dry_run_deletes_nothing(calendar, credentials):
+    seed(calendar, 300)
+    service = get_calendar_service(credentials, root_url=calendar.root_url)
+
+    assert delete_all_created_calendar_entries(dry_run=True, service=service, calendar_id='conference') == 0
+    assert len(calendar.events) == 300
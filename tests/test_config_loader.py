@@ -0,0 +1,74 @@
+"""
+Tests of the in-memory decryption of the *.enc files against the openssl CLI the workflow used.
+"""
+import base64
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from config_loader import ConfigLoader, decrypt_openssl, encrypt_openssl
+
+PASSWORD = 'lab-secret'
+# A fixed salt keeps the wrong password from ever unpadding by chance
+SALT = bytes(range(1, 9))
+CONFIG = {'1': {'id': '1', 'name': 'Ada Lovelace', 'email': 'ada@example.com', 'role': 'Graduate Student'}}
+
+requires_openssl = pytest.mark.skipif(shutil.which('openssl') is None, reason='needs the openssl CLI')
+
+
+def openssl(*args, input):
+    return subprocess.run(['openssl', 'aes-256-cbc', '-salt', '-pbkdf2', '-pass', f'pass:{PASSWORD}', *args],
+                          input=input, capture_output=True, check=True).stdout
+
+
+@pytest.fixture
+def plaintext():
+    return json.dumps(CONFIG, indent=4).encode('utf-8')
+
+
+@requires_openssl
+@pytest.mark.parametrize('args', [('-a',), ()], ids=['base64', 'raw'])
+def test_decrypts_the_openssl_cli_output(plaintext, args):
+    assert decrypt_openssl(openssl('-e', *args, input=plaintext), PASSWORD) == plaintext
+
+
+@requires_openssl
+def test_openssl_cli_decrypts_encrypt_openssl(plaintext):
+    assert openssl('-d', '-a', input=encrypt_openssl(plaintext, PASSWORD)) == plaintext
+
+
+@requires_openssl
+def test_loader_reads_the_encrypted_copy(plaintext, tmp_path):
+    (tmp_path / 'lab_members.json.enc').write_bytes(openssl('-e', '-a', input=plaintext))
+    loader = ConfigLoader(str(tmp_path / 'lab_members.json'), password=PASSWORD)
+    assert loader.is_encrypted()
+    assert loader.load_config() == CONFIG
+
+
+def test_wrong_password_is_an_error(plaintext, tmp_path):
+    encrypted = encrypt_openssl(plaintext, PASSWORD, salt=SALT)
+    with pytest.raises(ValueError, match='wrong password'):
+        decrypt_openssl(encrypted, 'not-the-secret')
+
+    (tmp_path / 'lab_members.json.enc').write_bytes(encrypted)
+    with pytest.raises(ValueError, match='Cannot decrypt'):
+        ConfigLoader(str(tmp_path / 'lab_members.json'), password='not-the-secret').load_config()
+
+
+@pytest.mark.parametrize('data', [
+    base64.b64encode(b'Unsalted' + bytes(24)),
+    b'Salted_' + bytes(25),
+    json.dumps(CONFIG).encode('utf-8'),
+    b'',
+], ids=['other-magic', 'short-magic', 'plaintext', 'empty'])
+def test_bad_header_is_an_error(data):
+    with pytest.raises(ValueError):
+        decrypt_openssl(data, PASSWORD)
+
+
+def test_truncated_ciphertext_is_an_error(plaintext):
+    raw = base64.b64decode(b''.join(encrypt_openssl(plaintext, PASSWORD).split()))
+    with pytest.raises(ValueError):
+        decrypt_openssl(raw[:-5], PASSWORD)
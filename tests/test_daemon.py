@@ -0,0 +1,164 @@
+import json
+import threading
+import urllib.request
+from datetime import date, datetime, time
+
+import pytest
+
+from daemon import LabDaemon, make_control_server
+
+RUN_AT = time(7, 0)
+TODAY = date(2026, 10, 21)
+
+
+class StubSystem:
+    """Records what the daemon asks of the system instead of sending anything."""
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+        self.clock = date.today
+
+    def refresh(self):
+        pass
+
+    def run(self, concurrent=False):
+        day = self.clock()
+        self.calls.append(('run', day))
+        if day == self.fail_on:
+            raise RuntimeError("SMTP is down")
+
+    def backfill(self, start, end, today=None):
+        self.calls.append(('backfill', start, end, today))
+
+
+def make_daemon(tmp_path, now, last_run_date=None, catch_up_days=3, system=None):
+    state_path = tmp_path / 'daemon_state.json'
+    if last_run_date:
+        state_path.write_text(json.dumps({'last_run_date': last_run_date.isoformat(), 'runs': []}))
+    return LabDaemon(system or StubSystem(), state_path=str(state_path), run_at=RUN_AT, catch_up_days=catch_up_days,
+                     now=lambda: now)
+
+
+@pytest.mark.parametrize('hour, expected', [(6, []), (8, [TODAY])])
+def test_first_start_only_runs_today_once_it_is_due(tmp_path, hour, expected):
+    daemon = make_daemon(tmp_path, datetime.combine(TODAY, time(hour)))
+    assert daemon.due_days() == expected
+
+
+def test_nothing_is_due_after_todays_run(tmp_path):
+    daemon = make_daemon(tmp_path, datetime.combine(TODAY, time(12)), last_run_date=TODAY)
+    assert daemon.due_days() == []
+    assert daemon.next_run() == datetime(2026, 10, 22, 7, 0)
+
+
+def test_missed_days_are_caught_up_in_order(tmp_path):
+    daemon = make_daemon(tmp_path, datetime.combine(TODAY, time(8)), last_run_date=date(2026, 10, 19))
+    assert daemon.due_days() == [date(2026, 10, 20), TODAY]
+
+
+def test_today_is_not_due_before_run_at(tmp_path):
+    daemon = make_daemon(tmp_path, datetime.combine(TODAY, time(6)), last_run_date=date(2026, 10, 19))
+    assert daemon.due_days() == [date(2026, 10, 20)]
+    assert daemon.next_run() == datetime.combine(TODAY, time(6))
+
+
+def test_catch_up_stops_at_catch_up_days(tmp_path):
+    daemon = make_daemon(tmp_path, datetime.combine(TODAY, time(8)), last_run_date=date(2026, 10, 1), catch_up_days=3)
+    assert daemon.due_days() == [date(2026, 10, 19), date(2026, 10, 20), TODAY]
+
+
+def test_run_due_backfills_missed_days_and_runs_today(tmp_path):
+    system = StubSystem()
+    daemon = make_daemon(tmp_path, datetime.combine(TODAY, time(8)), last_run_date=date(2026, 10, 19), system=system)
+
+    records = daemon.run_due()
+
+    assert [record['date'] for record in records] == ['2026-10-20', '2026-10-21']
+    assert all(record['ok'] for record in records)
+    assert system.calls == [('backfill', date(2026, 10, 20), date(2026, 10, 20), TODAY), ('run', TODAY)]
+    assert daemon.due_days() == []
+    with open(daemon.state_path) as file:
+        assert json.load(file)['last_run_date'] == TODAY.isoformat()
+
+
+def test_a_failed_day_is_recorded_and_alerted_once(tmp_path):
+    alerts = []
+    daemon = make_daemon(tmp_path, datetime.combine(TODAY, time(8)), last_run_date=date(2026, 10, 20),
+                         system=StubSystem(fail_on=TODAY))
+    daemon.on_error = alerts.append
+
+    [record] = daemon.run_due()
+
+    assert not record['ok']
+    assert record['error'] == "SMTP is down"
+    assert len(alerts) == 1
+    assert daemon.run_due() == []
+
+
+def test_trigger_of_a_completed_day_is_a_no_op_unless_forced(tmp_path):
+    system = StubSystem()
+    daemon = make_daemon(tmp_path, datetime.combine(TODAY, time(8)), last_run_date=date(2026, 10, 20), system=system)
+    daemon.run_due()
+
+    record = daemon.trigger(TODAY)
+    assert record['skipped'] and record['ok']
+    assert system.calls == [('run', TODAY)]
+    assert len(daemon.state['runs']) == 1
+
+    assert daemon.trigger(TODAY, force=True)['ok']
+    assert system.calls == [('run', TODAY), ('run', TODAY)]
+
+
+def test_trigger_runs_failed_and_skipped_days(tmp_path):
+    state_path = tmp_path / 'daemon_state.json'
+    state_path.write_text(json.dumps({'last_run_date': '2026-10-17', 'runs': [{'date': '2026-10-17', 'ok': True}]}))
+    system = StubSystem(fail_on=TODAY)
+    daemon = LabDaemon(system, state_path=str(state_path), run_at=RUN_AT, catch_up_days=1,
+                       now=lambda: datetime.combine(TODAY, time(8)))
+    daemon.run_due()
+    system.fail_on = None
+    del system.calls[:]
+
+    # Today failed and the 18th was skipped as too old to catch up on
+    assert 'skipped' not in daemon.trigger(TODAY)
+    assert 'skipped' not in daemon.trigger(date(2026, 10, 18))
+    # The 17th ran, and so did the days before the kept history
+    assert daemon.trigger(date(2026, 10, 17))['skipped']
+    assert daemon.trigger(date(2026, 10, 1))['skipped']
+    assert system.calls == [('run', TODAY), ('backfill', date(2026, 10, 18), date(2026, 10, 18), TODAY)]
+
+
+def test_control_endpoint_only_reruns_a_day_when_forced(tmp_path):
+    system = StubSystem()
+    daemon = make_daemon(tmp_path, datetime.combine(TODAY, time(8)), last_run_date=date(2026, 10, 20), system=system)
+    daemon.run_due()
+    server = make_control_server(daemon, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        def post(query):
+            request = urllib.request.Request(f'http://127.0.0.1:{server.server_address[1]}/run?{query}', method='POST')
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return json.load(response)
+
+        assert post(f'date={TODAY}')['skipped']
+        assert 'skipped' not in post(f'date={TODAY}&force=true')
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert system.calls == [('run', TODAY), ('run', TODAY)]
+
+
+def test_smtp_session_stays_open_across_runs(make_system, smtp, tmp_path):
+    monday, friday = date(2026, 10, 19), date(2026, 10, 23)
+    now = [datetime.combine(monday, time(8))]
+    system = make_system(close_clients=False)
+    daemon = LabDaemon(system, state_path=str(tmp_path / 'daemon_state.json'), run_at=RUN_AT, now=lambda: now[0])
+
+    daemon.run_due()
+    now[0] = datetime.combine(friday, time(8))
+    daemon.run_due()
+
+    # The presentation reminder on Monday and the maintenance reminder on Friday
+    assert smtp.counters['messages'] == 2
+    assert smtp.counters['connections'] == 1
+    system.email_notifier.close()
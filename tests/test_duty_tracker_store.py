@@ -0,0 +1,131 @@
+"""
+Tests of the duty tracker's atomic commit and of the journal replay after a crash.
+
+The crashes are real: a child process commits and dies with os._exit() at the
+crash point, leaving the files as a killed run would.
+"""
+import glob
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from duty_tracker_store import DutyTrackerStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INITIAL = {'presentation': '1', 'maintenance': '4', 'snacks': '1'}
+CRASH = '''
+import json, os, sys
+sys.path.insert(0, {root!r})
+import duty_tracker_store
+store = duty_tracker_store.DutyTrackerStore(sys.argv[1])
+for assignment in sys.argv[3:]:
+    store.set(*assignment.split('='))
+if sys.argv[2] == 'rename':
+    # Dies once the journal is written, right before the tracker is renamed into place
+    duty_tracker_store.os.replace = lambda *args: os._exit(1)
+else:
+    # Dies halfway through writing the temporary tracker file
+    def torn_dump(obj, file, **kwargs):
+        file.write(json.dumps(obj)[:10])
+        file.flush()
+        os._exit(1)
+    duty_tracker_store.json.dump = torn_dump
+store.commit()
+'''
+
+
+def crash(path, point, *assignments):
+    result = subprocess.run([sys.executable, '-c', CRASH.format(root=ROOT), str(path), point, *assignments])
+    assert result.returncode == 1
+
+
+def read_tracker(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    path = tmp_path / 'duty_tracker.json'
+    path.write_text(json.dumps(INITIAL))
+    return path
+
+
+def test_commit_journals_and_writes_the_assignments(tracker):
+    store = DutyTrackerStore(str(tracker))
+    assert store.commit() is False
+    store.set('presentation', '2')
+    store.set('snacks', '2')
+    assert store.commit() is True
+    assert read_tracker(tracker) == dict(INITIAL, presentation='2', snacks='2')
+    assert [(entry['duty'], entry['previous'], entry['member_id']) for entry in store.history()] == [
+        ('presentation', '1', '2'), ('snacks', '1', '2'),
+    ]
+    assert DutyTrackerStore(str(tracker)).commit() is False
+
+
+@pytest.mark.parametrize('point', ['rename', 'torn_temp_file'])
+def test_crashed_commit_is_replayed_on_the_next_load(tracker, point):
+    crash(tracker, point, 'presentation=2', 'snacks=2')
+    # The tracker file itself is untouched
+    assert read_tracker(tracker) == INITIAL
+    if point == 'torn_temp_file':
+        assert len(glob.glob(str(tracker.parent / '.duty_tracker.*.tmp'))) == 1
+
+    store = DutyTrackerStore(str(tracker))
+    assert store.snapshot() == dict(INITIAL, presentation='2', snacks='2')
+    # The next commit writes the replayed assignments even with nothing staged
+    assert store.commit() is True
+    assert read_tracker(tracker) == dict(INITIAL, presentation='2', snacks='2')
+    assert DutyTrackerStore(str(tracker)).commit() is False
+    assert len(store.history()) == 2
+
+
+def test_replayed_state_takes_new_assignments(tracker):
+    crash(tracker, 'rename', 'presentation=2')
+    store = DutyTrackerStore(str(tracker))
+    store.set('presentation', '3')
+    store.commit()
+    assert read_tracker(tracker) == dict(INITIAL, presentation='3')
+    assert [entry['previous'] for entry in store.history('presentation')] == ['1', '2']
+
+
+def test_consecutive_crashes_are_all_replayed(tracker):
+    crash(tracker, 'rename', 'presentation=2')
+    crash(tracker, 'torn_temp_file', 'presentation=3', 'maintenance=5')
+    assert DutyTrackerStore(str(tracker)).snapshot() == dict(INITIAL, presentation='3', maintenance='5')
+
+
+def test_torn_journal_line_is_not_replayed(tracker):
+    store = DutyTrackerStore(str(tracker))
+    store.set('presentation', '2')
+    store.commit()
+    entry = {'duty': 'snacks', 'previous': '1', 'member_id': '2', 'commit': 'torn', 'commit_size': 2}
+    with open(store.journal_path, 'a') as journal:
+        journal.write(json.dumps(dict(entry, timestamp='2024-01-08T07:00:00')) + '\n' + json.dumps(entry)[:20])
+
+    store = DutyTrackerStore(str(tracker))
+    assert store.snapshot() == dict(INITIAL, presentation='2')
+    store.set('maintenance', '5')
+    store.commit()
+    # The next entries start on a line of their own
+    assert [entry['member_id'] for entry in DutyTrackerStore(str(tracker)).history()] == ['2', '2', '5']
+    assert read_tracker(tracker) == dict(INITIAL, presentation='2', maintenance='5')
+
+
+def test_tracker_edited_by_hand_is_kept(tracker):
+    crash(tracker, 'rename', 'presentation=2')
+    tracker.write_text(json.dumps(dict(INITIAL, presentation='7')))
+    assert DutyTrackerStore(str(tracker)).snapshot() == dict(INITIAL, presentation='7')
+
+
+def test_tracker_reset_by_hand_is_not_replayed(tracker):
+    store = DutyTrackerStore(str(tracker))
+    for member_id in ('2', '3'):
+        store.set('presentation', member_id)
+        store.commit()
+    tracker.write_text(json.dumps(INITIAL))
+    assert DutyTrackerStore(str(tracker)).snapshot() == INITIAL
@@ -0,0 +1,107 @@
+"""
+Tests of the SMTP session reuse of EmailNotifier, and of the concurrent run mode, against FakeSMTPServer.
+"""
+import json
+import shutil
+from datetime import date
+
+import pytest
+
+import instrumentation
+from email_notifier import EmailNotifier
+
+MONDAY = date(2026, 10, 19)
+SUNDAY = date(2026, 10, 18)
+# Its next Monday is the first Monday of November, a Lab Citizen Day
+LAB_CITIZEN_NOTICE_DAY = date(2026, 10, 26)
+STATE_FILES = ('duty_tracker.json', 'duty_tracker_journal.jsonl', 'event_ledger.json')
+
+
+@pytest.fixture
+def notifier(smtp):
+    with EmailNotifier('test@example.com', 'password', host=smtp.host, port=smtp.port, use_tls=False) as notifier:
+        yield notifier
+
+
+def sent(smtp):
+    return sorted((tuple(message['to']), message['subject']) for message in smtp.messages)
+
+
+def test_send_many_uses_one_connection(notifier, smtp):
+    messages = [([f'member{index}@example.com'], f'Reminder {index}', 'Body') for index in range(5)]
+    messages.append((['member5@example.com', 'member6@example.com'], 'Group reminder', 'Body', '<p>Body</p>'))
+    assert notifier.send_many(messages) == [None] * 6
+    assert smtp.counters['connections'] == 1
+    assert notifier.stats()['handshakes'] == 1
+    assert sent(smtp) == sorted((tuple(message[0]), message[1]) for message in messages)
+
+
+def test_dropped_idle_session_is_reopened(notifier, smtp):
+    instrumentation.reset()
+    notifier.send_email(['member1@example.com'], 'Before', 'Body')
+    assert smtp.drop_sessions() == 1
+
+    assert notifier.send_many([(['member2@example.com'], 'After', 'Body')]) == [None]
+    assert [message['subject'] for message in smtp.messages] == ['Before', 'After']
+    assert smtp.counters['connections'] == 2
+    assert instrumentation.counter('retries', service='email') == 1
+
+
+def test_session_dropped_on_every_reconnect_is_an_error(notifier, smtp, monkeypatch):
+    notifier.send_email(['member1@example.com'], 'Before', 'Body')
+    connect = notifier.connect
+
+    def connect_and_drop():
+        # The server hangs up on the new session too, before it is used
+        server = connect()
+        smtp.drop_sessions()
+        return server
+    monkeypatch.setattr(notifier, 'connect', connect_and_drop)
+    smtp.drop_sessions()
+    errors = notifier.send_many([(['member2@example.com'], 'After', 'Body')])
+    assert len(errors) == 1 and errors[0] is not None
+    assert [message['subject'] for message in smtp.messages] == ['Before']
+
+
+def test_run_sends_every_email_over_one_connection(make_system, workdir, smtp):
+    (workdir / 'duty_tracker.json').write_text(json.dumps({'presentation': '7', 'maintenance': '1', 'snacks': '1'}))
+    make_system(clock=lambda: MONDAY, force_maintenance_reminder=True).run()
+    # Four undergrad presenters and the maintenance reminder
+    assert smtp.counters['messages'] == 5
+    assert smtp.counters['connections'] == 1
+
+
+@pytest.mark.parametrize('day, force_maintenance_reminder', [
+    (MONDAY, True),
+    (SUNDAY, True),
+    (LAB_CITIZEN_NOTICE_DAY, True),
+], ids=['presentation-and-maintenance', 'snacks-and-maintenance', 'lab-citizen-notice-and-maintenance'])
+def test_concurrent_run_sends_what_a_sequential_run_sends(make_system, workdir, smtp, slack, calendar, day, force_maintenance_reminder):
+    (workdir / 'duty_tracker.json').write_text(json.dumps({'presentation': '7', 'maintenance': '1', 'snacks': '1'}))
+    initial = workdir / 'initial'
+    initial.mkdir()
+    for name in STATE_FILES:
+        if (workdir / name).exists():
+            shutil.copy(workdir / name, initial / name)
+
+    results = []
+    for concurrent in (False, True):
+        for fake in (smtp, slack, calendar):
+            fake.reset()
+        for name in STATE_FILES:
+            (workdir / name).unlink(missing_ok=True)
+            if (initial / name).exists():
+                shutil.copy(initial / name, workdir / name)
+        make_system(clock=lambda: day, force_maintenance_reminder=force_maintenance_reminder).run(concurrent=concurrent)
+        results.append({
+            'emails': sent(smtp),
+            'slack': sorted((message['channel'], message['text']) for message in slack.messages),
+            'events': sorted(event['summary'] for event in calendar.events.values()),
+            'tracker': json.loads((workdir / 'duty_tracker.json').read_text()),
+        })
+        # At most one session per pipeline sending at the same time
+        assert smtp.counters.get('connections', 0) <= (3 if concurrent else 1)
+
+    sequential, concurrent = results
+    assert concurrent == sequential
+    assert sequential['emails'] and sequential['events']
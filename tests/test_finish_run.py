@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from outbox import SENT
+from slack_notifier import SlackNotifier
+
+
+class FailingFlushNotifier(SlackNotifier):
+    """Fails the first flush, the one at the end of the run."""
+    failed = False
+
+    def flush(self):
+        if not self.failed:
+            self.failed = True
+            raise RuntimeError("Slack is down")
+
+
+def failing_pipeline():
+    raise ValueError("roster is broken")
+
+
+def test_the_pipeline_error_wins_over_teardown_errors(make_system, workdir, slack):
+    system = make_system(slack_notifier=FailingFlushNotifier('xoxb-test', base_url=slack.base_url),
+                         metrics_dir=str(workdir / 'metrics'))
+    system.send_presentation_reminders = failing_pipeline
+
+    with pytest.raises(ValueError, match="roster is broken"):
+        system.run()
+
+    assert (workdir / 'metrics' / 'run_metrics.json').exists()
+
+
+def test_a_teardown_error_is_raised_after_the_metrics_are_written(make_system, workdir, slack):
+    system = make_system(slack_notifier=FailingFlushNotifier('xoxb-test', base_url=slack.base_url),
+                         metrics_dir=str(workdir / 'metrics'))
+
+    with pytest.raises(RuntimeError, match="Slack is down"):
+        system.run()
+
+    assert (workdir / 'metrics' / 'run_metrics.json').exists()
+
+
+def test_coalesced_slack_notices_are_spooled_merged(make_system, workdir, slack):
+    system = make_system(slack_notifier=SlackNotifier('xoxb-test', base_url=slack.base_url, backoff=0, coalesce=True),
+                         outbox_path=str(workdir / 'outbox.sqlite3'))
+    system.notify_slack('#lab', "first")
+    system.notify_slack('#lab', "second")
+    system.notify_slack('#other', "third")
+
+    system.finish_run(time.perf_counter())
+
+    assert sorted((message['channel'], message['text']) for message in slack.messages) == [
+        ('#lab', "first\n\nsecond"),
+        ('#other', "third"),
+    ]
+    assert system.outbox.counts() == {SENT: 2}
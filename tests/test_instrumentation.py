@@ -0,0 +1,44 @@
+"""
+Tests of the Prometheus textfile written at the end of a run.
+"""
+import pytest
+
+import instrumentation
+
+
+@pytest.fixture
+def samples(tmp_path):
+    """Return a function writing the metrics and returning their samples by series."""
+    instrumentation.reset()
+
+    def write():
+        path = tmp_path / 'run_metrics.prom'
+        instrumentation.write_prometheus(str(path))
+        lines = [line for line in path.read_text().splitlines() if not line.startswith('#')]
+        return dict(line.rsplit(' ', 1) for line in lines)
+    yield write
+    instrumentation.reset()
+
+
+def test_counters_are_written_exactly(samples):
+    instrumentation.count('messages', 1234567, service='email')
+    instrumentation.count('bytes', 12345678901, service='calendar')
+    instrumentation.count('retries', service='slack')
+    written = samples()
+    assert written['lfl_messages_total{service="email"}'] == '1234567'
+    assert written['lfl_bytes_total{service="calendar"}'] == '12345678901'
+    assert written['lfl_retries_total{service="slack"}'] == '1'
+
+
+def test_float_samples_keep_their_precision(samples):
+    instrumentation.count('backoff_seconds', 0.1234567891, service='slack')
+    for _ in range(3):
+        instrumentation.record_span('email.send', 0.0012345678)
+    instrumentation.record_span('email.send', 0.0, ok=False)
+    written = samples()
+    assert float(written['lfl_backoff_seconds_total{service="slack"}']) == 0.1234567891
+    assert written['lfl_span_count{span="email.send"}'] == '4'
+    assert written['lfl_span_failures{span="email.send"}'] == '1'
+    assert written['lfl_span_seconds_max{span="email.send"}'] == repr(0.0012345678)
+    total = instrumentation.summary()['spans']['email.send']['total_ms'] / 1000
+    assert float(written['lfl_span_seconds_total{span="email.send"}']) == total
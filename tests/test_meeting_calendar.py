@@ -0,0 +1,101 @@
+"""
+Equivalence tests of MeetingCalendar against the date logic it replaced in main.py.
+"""
+import calendar
+import json
+from datetime import date, timedelta
+
+import holidays
+import pytest
+
+from meeting_calendar import MeetingCalendar
+from test_rotation_engine import baseline_eligible, baseline_next_member, baseline_next_presenter
+
+YEARS = (2024, 2025, 2026)
+US_HOLIDAYS = holidays.US()
+
+
+def year_days(*years):
+    day, end = date(years[0], 1, 1), date(years[-1] + 1, 1, 1)
+    while day < end:
+        yield day
+        day += timedelta(days=1)
+
+
+# The baseline conditions of LabNotificationSystem, on a given day instead of date.today()
+def baseline_decisions(today, presentation_day, maintenance_day):
+    next_monday = today + timedelta(days=(7 - today.weekday() or 7))
+    return {
+        'holiday': today in US_HOLIDAYS,
+        'holiday_next_week': today + timedelta(days=7) in US_HOLIDAYS,
+        'presentation_day': today.weekday() == presentation_day,
+        'lab_citizen_day_next_week': today.weekday() == presentation_day and (next_monday.month != today.month) and (next_monday.day <= 7),
+        'maintenance_day': today.weekday() == maintenance_day,
+        'snack_day': today.weekday() == presentation_day - 1 or (today.weekday() == 6 and presentation_day == 0),
+    }
+
+
+def decisions(meeting_calendar, today):
+    return {
+        'holiday': meeting_calendar.is_holiday(today),
+        'holiday_next_week': meeting_calendar.holiday_next_week(today),
+        'presentation_day': meeting_calendar.is_presentation_day(today),
+        'lab_citizen_day_next_week': meeting_calendar.lab_citizen_day_next_week(today),
+        'maintenance_day': meeting_calendar.is_maintenance_day(today),
+        'snack_day': meeting_calendar.is_snack_day(today),
+    }
+
+
+@pytest.mark.parametrize('presentation_day', range(7), ids=list(calendar.day_name))
+def test_every_day_matches_the_baseline(presentation_day):
+    maintenance_day = (presentation_day + 4) % 7
+    # The index covers part of the years, the rest is computed on demand
+    meeting_calendar = MeetingCalendar(presentation_day, maintenance_day, start=date(2024, 7, 1), horizon_days=365)
+    for day in year_days(*YEARS):
+        assert decisions(meeting_calendar, day) == baseline_decisions(day, presentation_day, maintenance_day), day
+
+
+def test_first_mondays_are_lab_citizen_days():
+    meeting_calendar = MeetingCalendar(0, 4, start=date(2024, 1, 1), horizon_days=366)
+    first_mondays = [date(2024, month, next(week[0] for week in calendar.monthcalendar(2024, month) if week[0]))
+                     for month in range(1, 13)]
+    assert [day for day in year_days(2024) if meeting_calendar.is_lab_citizen_day(day)] == first_mondays
+    # Each is announced on the Monday a week before, in the previous month
+    notices = [day for day in year_days(2024) if meeting_calendar.lab_citizen_day_next_week(day)]
+    assert [day + timedelta(days=7) for day in notices] == first_mondays[1:] + [date(2025, 1, 6)]
+
+
+def test_holidays_match_the_baseline():
+    meeting_calendar = MeetingCalendar(0, 4, start=date(2024, 1, 1), horizon_days=366)
+    found = [(day, meeting_calendar.holiday_name(day)) for day in year_days(2024) if meeting_calendar.is_holiday(day)]
+    assert found == sorted((day, name) for day, name in holidays.US(years=2024).items())
+    assert (date(2024, 11, 28), 'Thanksgiving') in found
+    # New Year's Day is a week after Christmas, in the next year
+    assert meeting_calendar.holiday_next_week(date(2024, 12, 25))
+
+
+def test_a_year_of_runs_advances_the_rotations_like_the_baseline(make_system, workdir):
+    with open(workdir / 'lab_members.json') as file:
+        lab_members = json.load(file)
+    with open(workdir / 'duty_tracker.json') as file:
+        tracker = json.load(file)
+    presentation_day, maintenance_day = 0, 4
+
+    expected = []
+    for day in year_days(2025):
+        today = baseline_decisions(day, presentation_day, maintenance_day)
+        if today['presentation_day'] and not today['lab_citizen_day_next_week'] and not today['holiday_next_week']:
+            tracker['presentation'] = baseline_next_presenter(lab_members, tracker['presentation'])[1]
+            expected.append(('presentation', tracker['presentation']))
+        if today['maintenance_day']:
+            tracker['maintenance'] = baseline_next_member(baseline_eligible(lab_members, 'maintenance'), tracker['maintenance'])
+            expected.append(('maintenance', tracker['maintenance']))
+        if today['snack_day']:
+            tracker['snacks'] = baseline_next_member(baseline_eligible(lab_members, 'snacks'), tracker['snacks'])
+            expected.append(('snacks', tracker['snacks']))
+
+    system = make_system()
+    system.backfill(date(2025, 1, 1), date(2025, 12, 31))
+    assert [(entry['duty'], entry['member_id']) for entry in system.duty_tracker.history()] == expected
+    with open(workdir / 'duty_tracker.json') as file:
+        assert json.load(file) == tracker
@@ -0,0 +1,28 @@
+import json
+
+from member_directory import Member
+
+
+def test_members_are_equal_by_value():
+    member = Member('1', 'Member 1', 'member1@example.com', 'PhD Student')
+    assert member == Member('1', 'Member 1', 'member1@example.com', 'PhD Student')
+    assert hash(member) == hash(Member('1', 'Member 1', 'member1@example.com', 'PhD Student'))
+    assert member != Member('1', 'Member 1', 'member1@example.com', 'Undergraduate')
+
+
+def test_refresh_keeps_the_rotation_of_an_unchanged_roster(make_system, workdir):
+    system = make_system()
+    rotation = system.rotation
+
+    system.refresh()
+    assert system.rotation is rotation
+
+    with open(workdir / 'lab_members.json') as file:
+        roster = json.load(file)
+    roster['1']['role'] = 'Postdoc'
+    with open(workdir / 'lab_members.json', 'w') as file:
+        json.dump(roster, file)
+
+    system.refresh()
+    assert system.rotation is not rotation
+    assert system.members.get('1').role == 'Postdoc'
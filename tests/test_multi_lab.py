@@ -0,0 +1,29 @@
+import os
+
+import instrumentation
+from benchmarks.e2e import MAINTENANCE_DAY, PRESENTATION_DAY, make_roster, write_workdir
+from multi_lab import run_labs
+
+
+def test_labs_report_their_spans_together(workdir, smtp, slack, calendar, credentials, capsys):
+    labs = {}
+    for name in ('alpha', 'beta'):
+        directory = str(workdir / name)
+        os.mkdir(directory)
+        write_workdir(directory, make_roster(10))
+        labs[name] = {'directory': directory, 'presentation_day': PRESENTATION_DAY, 'maintenance_day': MAINTENANCE_DAY}
+    instrumentation.reset()
+
+    results = run_labs(labs, workers=2, client_options={
+        'email_options': {'host': smtp.host, 'port': smtp.port, 'use_tls': False},
+        'slack_base_url': slack.base_url,
+        'calendar_credentials': credentials,
+        'calendar_root_url': calendar.root_url,
+    })
+
+    assert [(result['lab'], result['ok']) for result in results] == [('alpha', True), ('beta', True)]
+    output = capsys.readouterr().out
+    # No per-lab report mixing in the spans of the other lab, one report naming each lab
+    assert output.count("Slowest spans") == 1
+    assert "Slowest spans of alpha, beta:" in output
+    assert " lab.alpha" in output and " lab.beta" in output
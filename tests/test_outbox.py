@@ -0,0 +1,122 @@
+from datetime import date
+
+import pytest
+
+from benchmarks.fakes import FakeCalendarServer
+from calendar_manager import CalendarManager
+from email_notifier import EmailNotifier
+from outbox import CALENDAR, DEAD, EMAIL, PENDING, SENT, SLACK, DeadLetterError, Dispatcher, Outbox, main
+
+MAINTENANCE_DAY = date(2026, 10, 23)
+
+
+class RejectingCalendarServer(FakeCalendarServer):
+    """Rejects every call."""
+    def _handle_call(self, method, path, query, body):
+        self.count('calls')
+        return 400, {'error': {'code': 400, 'message': 'Bad Request'}}
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), max_attempts=2, backoff=0)
+    yield outbox
+    outbox.close()
+
+
+def test_enqueue_ignores_duplicate_dedupe_keys(outbox):
+    outbox.enqueue(SLACK, {'channel': '#lab', 'message': 'hi'}, dedupe_key='a')
+    outbox.enqueue(SLACK, {'channel': '#lab', 'message': 'hi'}, dedupe_key='a')
+    outbox.enqueue(SLACK, {'channel': '#lab', 'message': 'hi'}, dedupe_key='b')
+    assert outbox.counts() == {PENDING: 2}
+
+
+def test_failed_actions_are_retried_then_dead_lettered(outbox):
+    outbox.enqueue(SLACK, {'channel': '#lab', 'message': 'hi'})
+    outbox.enqueue(EMAIL, {'recipients': ['a@example.com']})
+    sent = []
+
+    def fail(payload):
+        raise RuntimeError("Slack is down")
+
+    dispatcher = Dispatcher(outbox, {SLACK: fail, EMAIL: sent.append})
+    assert dispatcher.drain(retry_within=5) == (1, 2)
+
+    assert sent == [{'recipients': ['a@example.com']}]
+    assert outbox.counts() == {SENT: 1, DEAD: 1}
+    [(_, channel, payload, error)] = outbox.dead_letters()
+    assert (channel, payload, error) == (SLACK, {'channel': '#lab', 'message': 'hi'}, "Slack is down")
+
+
+def test_pending_actions_are_sent_by_the_next_drain(outbox):
+    outbox.enqueue(SLACK, {'channel': '#lab', 'message': 'hi'})
+    Dispatcher(outbox, {SLACK: lambda payload: 1 / 0}).drain()
+    assert outbox.counts() == {PENDING: 1}
+
+    posted = []
+    Dispatcher(outbox, {SLACK: posted.append}).drain()
+    assert posted == [{'channel': '#lab', 'message': 'hi'}]
+    assert outbox.counts() == {SENT: 1}
+
+
+def test_requeue_dead_gives_fresh_attempts(outbox):
+    outbox.enqueue(SLACK, {'channel': '#lab', 'message': 'hi'})
+    Dispatcher(outbox, {SLACK: lambda payload: 1 / 0}).drain(retry_within=5)
+    assert outbox.counts() == {DEAD: 1}
+
+    outbox.requeue_dead()
+    posted = []
+    Dispatcher(outbox, {SLACK: posted.append}).drain()
+    assert len(posted) == 1
+    assert outbox.counts() == {SENT: 1}
+
+
+def test_run_spools_and_dispatches_every_action(make_system, workdir, smtp, calendar):
+    system = make_system(clock=lambda: MAINTENANCE_DAY, outbox_path=str(workdir / 'outbox.sqlite3'))
+    system.run()
+
+    assert smtp.counters['messages'] == 1
+    assert len(calendar.events) == 1
+    assert system.outbox.counts() == {SENT: 2}
+
+
+def test_run_raises_the_dead_letters(make_system, workdir, smtp, calendar):
+    system = make_system(clock=lambda: MAINTENANCE_DAY, outbox_path=str(workdir / 'outbox.sqlite3'))
+    system.outbox.max_attempts = 1
+    system.email_notifier.port = 1  # nothing listens there
+
+    with pytest.raises(DeadLetterError) as error:
+        system.run()
+
+    assert [channel for _, channel, _, _ in error.value.dead_letters] == [EMAIL]
+    assert len(calendar.events) == 1
+
+
+def test_a_dead_lettered_calendar_event_is_not_alerted_per_attempt(make_system, workdir, smtp, credentials):
+    with RejectingCalendarServer() as calendar:
+        email_notifier = EmailNotifier('test@example.com', 'password', host=smtp.host, port=smtp.port, use_tls=False)
+        system = make_system(clock=lambda: MAINTENANCE_DAY, outbox_path=str(workdir / 'outbox.sqlite3'),
+                             email_notifier=email_notifier,
+                             calendar_manager=CalendarManager(email_notifier, credentials=credentials, root_url=calendar.root_url))
+        system.outbox.max_attempts = 3
+        system.outbox.backoff = 0
+
+        with pytest.raises(DeadLetterError) as error:
+            system.run()
+
+    assert calendar.counters['calls'] == 3
+    assert [channel for _, channel, _, _ in error.value.dead_letters] == [CALENDAR]
+    # Only the maintenance reminder, the dead letter is alerted once by the caller
+    assert smtp.counters['messages'] == 1
+
+
+def test_cli_lists_and_requeues_dead_letters(outbox, capsys):
+    outbox.enqueue(SLACK, {'channel': '#lab', 'message': 'hi'})
+    Dispatcher(outbox, {SLACK: lambda payload: 1 / 0}).drain(retry_within=5)
+
+    assert main(['status', '--path', outbox.path]) == 0
+    assert "Dead letter 1 (slack): division by zero" in capsys.readouterr().out
+
+    assert main(['requeue', '--path', outbox.path]) == 0
+    assert "Requeued 1 dead letter(s)" in capsys.readouterr().out
+    assert outbox.counts() == {PENDING: 1}
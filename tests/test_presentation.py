@@ -0,0 +1,40 @@
+import asyncio
+import json
+from datetime import date
+
+import pytest
+
+MONDAY = date(2026, 10, 19)
+
+
+@pytest.fixture
+def undergrads_next(workdir):
+    """Make the undergrads, members 8, 9, 18 and 19, the next presenters."""
+    with open(workdir / 'duty_tracker.json') as file:
+        tracker = json.load(file)
+    tracker['presentation'] = '7'
+    with open(workdir / 'duty_tracker.json', 'w') as file:
+        json.dump(tracker, file)
+    return workdir
+
+
+def assert_group_presentation(workdir, smtp, calendar):
+    assert smtp.counters['messages'] == 4
+    assert [event['summary'] for event in calendar.events.values()] == ["Undergraduate Group Presentation"]
+    with open(workdir / 'duty_tracker.json') as file:
+        assert json.load(file)['presentation'] == '20'
+
+
+def test_group_presentation_emails_every_undergrad(make_system, undergrads_next, smtp, calendar):
+    make_system(clock=lambda: MONDAY).run()
+    assert_group_presentation(undergrads_next, smtp, calendar)
+
+
+def test_group_presentation_through_the_outbox(make_system, undergrads_next, smtp, calendar):
+    make_system(clock=lambda: MONDAY, outbox_path=str(undergrads_next / 'outbox.sqlite3')).run()
+    assert_group_presentation(undergrads_next, smtp, calendar)
+
+
+def test_group_presentation_with_async_io(make_system, undergrads_next, smtp, calendar):
+    asyncio.run(make_system(clock=lambda: MONDAY).run_async())
+    assert_group_presentation(undergrads_next, smtp, calendar)
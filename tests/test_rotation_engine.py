@@ -0,0 +1,111 @@
+"""
+Equivalence tests of RotationEngine against the rotation logic it replaced in main.py.
+"""
+import pytest
+
+from benchmarks.e2e import make_roster
+from member_directory import MemberDirectory
+from rotation_engine import UNDERGRAD_ROLE, RotationEngine
+
+
+# The baseline LabNotificationSystem methods, unchanged but for self
+def baseline_next_member(members, current_member_id):
+    current_index = members.index(next((m for m in members if m['id'] == current_member_id), None))
+    next_index = (current_index + 1) % len(members)
+    return members[next_index]['id']
+
+
+def baseline_next_presenter(lab_members, current_presenter_id):
+    members_list = list(lab_members.values())
+    current_index = members_list.index(next((member for member in members_list if member['id'] == current_presenter_id), members_list[0]))
+
+    next_index = (current_index + 1) % len(members_list)
+    next_presenter = members_list[next_index]
+
+    if next_presenter['role'] == 'Undergraduate Student':
+        # Find all undergraduates
+        undergrads = [member for member in members_list if member['role'] == 'Undergraduate Student']
+
+        # Return the list of undergraduates and set the next presenter to the first non-undergraduate
+        next_non_undergrad_index = (members_list.index(undergrads[-1]) + 1) % len(members_list)
+        next_non_undergrad_id = members_list[next_non_undergrad_index]['id']
+
+        return undergrads, next_non_undergrad_id, True
+    else:
+        # Next presenter is not an undergraduate
+        return [next_presenter], next_presenter['id'], False
+
+
+def baseline_eligible(lab_members, duty):
+    if duty == 'maintenance':
+        return [member for member in lab_members.values() if member['role'] in ['PhD Student', 'Post-Doc']]
+    return [member for member in lab_members.values() if member['role'] != 'Undergraduate Student']
+
+
+def roster(*roles):
+    return {str(index): {'id': str(index), 'name': f'Member {index}', 'email': f'member{index}@example.com', 'role': role}
+            for index, role in enumerate(roles, start=1)}
+
+
+ROSTERS = {
+    'synthetic': make_roster(20),
+    'undergrads_last': roster('PhD Student', 'Post-Doc', 'PhD Student', UNDERGRAD_ROLE, UNDERGRAD_ROLE),
+    'undergrads_first': roster(UNDERGRAD_ROLE, 'PhD Student', UNDERGRAD_ROLE, 'Post-Doc', 'Research Scientist'),
+    'no_undergrads': roster('PhD Student', 'Post-Doc', 'Research Scientist', 'PhD Student'),
+    'one_phd': roster('PhD Student', UNDERGRAD_ROLE, UNDERGRAD_ROLE, UNDERGRAD_ROLE),
+}
+
+
+@pytest.fixture(params=ROSTERS, ids=list(ROSTERS))
+def lab_members(request):
+    return ROSTERS[request.param]
+
+
+def as_records(presenters):
+    return [member.to_dict() for member in presenters]
+
+
+def test_next_presenter_matches_the_baseline(lab_members):
+    engine = RotationEngine(MemberDirectory(lab_members.values()))
+    # Including an id that is not on the roster, which restarts from the top
+    for current_id in [*lab_members, 'unknown', None]:
+        presenters, next_id, is_group = engine.next_presenter(current_id)
+        assert (as_records(presenters), next_id, is_group) == baseline_next_presenter(lab_members, current_id)
+
+
+@pytest.mark.parametrize('duty', ['maintenance', 'snacks'])
+def test_next_member_matches_the_baseline(lab_members, duty):
+    engine = RotationEngine(MemberDirectory(lab_members.values()))
+    eligible = baseline_eligible(lab_members, duty)
+    assert [member.to_dict() for member in engine.rings[duty]] == eligible
+    for current_id in [*lab_members, 'unknown']:
+        if any(member['id'] == current_id for member in eligible):
+            assert engine.next_member(duty, current_id) == baseline_next_member(eligible, current_id)
+            assert engine.member(duty, current_id).to_dict() == next(m for m in eligible if m['id'] == current_id)
+        else:
+            # Both reject a member outside the rotation
+            with pytest.raises(ValueError):
+                baseline_next_member(eligible, current_id)
+            with pytest.raises(ValueError):
+                engine.next_member(duty, current_id)
+            assert engine.member(duty, current_id) is None
+
+
+def test_a_year_of_assignments_matches_the_baseline(lab_members):
+    engine = RotationEngine(MemberDirectory(lab_members.values()))
+    expected = []
+    current_id = next(iter(lab_members))
+    for _ in range(52):
+        presenters, current_id, is_group = baseline_next_presenter(lab_members, current_id)
+        expected.append((presenters, current_id, is_group))
+    upcoming = engine.upcoming('presentation', next(iter(lab_members)), 52)
+    assert [(as_records(presenters), next_id, is_group) for presenters, next_id, is_group in upcoming] == expected
+
+    for duty in ('maintenance', 'snacks'):
+        eligible = baseline_eligible(lab_members, duty)
+        expected, current_id = [], eligible[0]['id']
+        for _ in range(52):
+            current_id = baseline_next_member(eligible, current_id)
+            expected.append(current_id)
+        assert engine.upcoming(duty, eligible[0]['id'], 52) == expected
+
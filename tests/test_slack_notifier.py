@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import slack_notifier
+from slack_notifier import SlackNotifier, retry_after_seconds
+
+
+@pytest.fixture
+def notifier(slack):
+    notifier = SlackNotifier('xoxb-test', base_url=slack.base_url, backoff=0.01)
+    yield notifier
+    notifier.close()
+
+
+def test_retry_after_reads_seconds_and_http_dates():
+    assert retry_after_seconds('3') == 3.0
+    assert retry_after_seconds('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    in_a_minute = format_datetime(datetime.now(timezone.utc) + timedelta(minutes=1), usegmt=True)
+    assert 55 < retry_after_seconds(in_a_minute) <= 60
+    assert retry_after_seconds('soon') is None
+
+
+@pytest.mark.parametrize('retry_after', ['0', 'Wed, 21 Oct 2015 07:28:00 GMT'])
+def test_rate_limited_post_waits_for_retry_after(notifier, slack, retry_after, monkeypatch):
+    delays = []
+    monkeypatch.setattr(slack_notifier.time, 'sleep', delays.append)
+    slack.throttle(retry_after)
+
+    notifier.post('#lab', "hi")
+
+    assert delays == [0.0]
+    assert notifier.retries == 1
+    assert slack.counters['throttled'] == 1
+    assert slack.messages == [{'channel': '#lab', 'text': "hi"}]
+
+
+def test_rate_limited_post_without_retry_after_backs_off_with_jitter(notifier, slack, monkeypatch):
+    bounds = []
+    monkeypatch.setattr(slack_notifier.random, 'uniform', lambda low, high: bounds.append((low, high)) or 0)
+    # An unreadable Retry-After falls back to the backoff too
+    slack.throttle(None, 'soon')
+
+    notifier.post('#lab', "hi")
+
+    assert bounds == [(0, 0.01), (0, 0.02)]
+    assert len(slack.messages) == 1
+
+
+def test_post_gives_up_after_max_retries(notifier, slack):
+    slack.throttle('0', '0', '0', '0')
+    with pytest.raises(Exception, match="429"):
+        notifier.post('#lab', "hi")
+    assert slack.messages == []
+
+
+def test_coalesced_messages_are_posted_once_per_channel(slack):
+    notifier = SlackNotifier('xoxb-test', base_url=slack.base_url, coalesce=True)
+    notifier.send_message('#lab', "first")
+    notifier.send_message('#other', "second")
+    notifier.send_message('#lab', "third")
+    assert slack.messages == []
+
+    notifier.close()
+
+    assert sorted((message['channel'], message['text']) for message in slack.messages) == [
+        ('#lab', "first\n\nthird"),
+        ('#other', "second"),
+    ]
+    assert notifier.posts == 2
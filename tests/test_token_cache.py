@@ -0,0 +1,111 @@
+"""
+Tests of the lazily read token cache and of its encrypted copy used in CI.
+"""
+import json
+import pickle
+from datetime import date
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+import token_cache
+from calendar_manager import CalendarManager
+from config_loader import decrypt_openssl, encrypt_openssl
+from email_notifier import EmailNotifier
+from main import token_resolution
+
+# No duty falls on it
+WEDNESDAY = date(2024, 1, 10)
+INFO = {'client_id': 'id', 'client_secret': 'secret', 'refresh_token': 'refresh', 'token': 'access'}
+
+
+def read_encrypted(path, password):
+    with open(path, 'rb') as file:
+        return json.loads(decrypt_openssl(file.read(), password))
+
+
+@pytest.fixture
+def loads(monkeypatch, credentials):
+    """Count the token cache reads, which return the fakes' credentials."""
+    calls = []
+
+    def load_credentials(*args, **kwargs):
+        calls.append(args)
+        return credentials
+    monkeypatch.setattr(token_cache, 'load_credentials', load_credentials)
+    return calls
+
+
+def test_token_cache_is_read_on_the_first_calendar_call(workdir, smtp, calendar, loads):
+    email_notifier = EmailNotifier('test@example.com', 'password', host=smtp.host, port=smtp.port, use_tls=False)
+    manager = CalendarManager(email_notifier, root_url=calendar.root_url)
+    body = manager.build_event_body('Lab Meeting', 'Agenda', '2024-01-08', '2024-01-08', [], all_day=True)
+    assert loads == []
+    assert manager.flush_batch() == []
+    assert loads == []
+
+    manager.insert_event(body)
+    manager.insert_event(manager.build_event_body('Lab Meeting', 'Agenda', '2024-01-15', '2024-01-15', [], all_day=True))
+    assert len(loads) == 1
+    assert len(calendar.events) == 2
+
+
+def test_run_without_calendar_calls_never_reads_the_token_cache(make_system, smtp, calendar, loads):
+    email_notifier = EmailNotifier('test@example.com', 'password', host=smtp.host, port=smtp.port, use_tls=False)
+    make_system(clock=lambda: WEDNESDAY, calendar_manager=CalendarManager(email_notifier, root_url=calendar.root_url)).run()
+    assert 'requests' not in calendar.counters
+    assert loads == []
+
+
+def test_encrypted_pickle_is_converted_to_encrypted_json(tmp_path, monkeypatch):
+    monkeypatch.setenv('SECRET_KEY', 'ci-secret')
+    legacy = Credentials.from_authorized_user_info(INFO)
+    (tmp_path / 'token.pickle.enc').write_bytes(encrypt_openssl(pickle.dumps(legacy), 'ci-secret'))
+    token_file = str(tmp_path / 'token.json')
+
+    credentials = token_cache.load_credentials(token_file, legacy_token_file=str(tmp_path / 'token.pickle'))
+    assert credentials.token == 'access'
+    assert token_cache.last_source == str(tmp_path / 'token.pickle.enc')
+    assert not (tmp_path / 'token.json').exists()
+    assert read_encrypted(token_file + '.enc', 'ci-secret')['refresh_token'] == 'refresh'
+
+    # The next run reads the converted token instead of unpickling
+    (tmp_path / 'token.pickle.enc').unlink()
+    assert token_cache.load_credentials(token_file, legacy_token_file=str(tmp_path / 'token.pickle')).token == 'access'
+    assert token_cache.last_source == token_file + '.enc'
+
+
+def test_refreshed_token_is_written_back_encrypted(tmp_path, monkeypatch):
+    monkeypatch.setenv('SECRET_KEY', 'ci-secret')
+    token_file = str(tmp_path / 'token.json')
+    (tmp_path / 'token.json.enc').write_bytes(encrypt_openssl(json.dumps(INFO).encode(), 'ci-secret'))
+
+    def refresh(self, request):
+        self.token = 'refreshed'
+    monkeypatch.setattr(Credentials, 'refresh', refresh)
+    token_cache.load_credentials(token_file).refresh(None)
+
+    assert not (tmp_path / 'token.json').exists()
+    assert read_encrypted(token_file + '.enc', 'ci-secret')['token'] == 'refreshed'
+    assert token_cache.load_credentials(token_file).token == 'refreshed'
+
+
+def test_plain_token_is_written_back_in_place(tmp_path, monkeypatch):
+    token_file = str(tmp_path / 'token.json')
+    (tmp_path / 'token.json').write_text(json.dumps(INFO))
+
+    def refresh(self, request):
+        self.token = 'refreshed'
+    monkeypatch.setattr(Credentials, 'refresh', refresh)
+    token_cache.load_credentials(token_file).refresh(None)
+
+    assert json.loads((tmp_path / 'token.json').read_text())['token'] == 'refreshed'
+    assert not (tmp_path / 'token.json.enc').exists()
+
+
+def test_resolution_depends_on_the_token_source():
+    assert 'Delete the `token.json` file' in token_resolution('token.json')
+    encrypted = token_resolution('token.json.enc')
+    assert 'python token_cache.py encrypt' in encrypted
+    assert 'Commit the new `token.json.enc`' in encrypted
+    assert 'Delete the `token.json` file' not in encrypted
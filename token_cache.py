@@ -0,0 +1,143 @@
+"""
+JSON cache of the Google OAuth credentials shared by CalendarManager and mm_calendar.
+
+The access token, refresh token and expiry are kept in token.json (readable only
+by the owner) instead of token.pickle. Either file may also be read encrypted
+(token.json.enc, token.pickle.enc) through ConfigLoader, as in CI; credentials
+read that way are only ever written back encrypted, to token.json.enc, with the
+same SECRET_KEY. A token.pickle or token.pickle.enc is converted the first time
+it is read, so later runs never unpickle. Loading does not touch the network:
+an expired access token is refreshed by the transport right before the first
+Calendar request, and the refreshed token is written back to the cache. Runs
+that make no Calendar call never refresh.
+
+Usage:
+    python token_cache.py migrate    # convert token.pickle(.enc) to token.json(.enc)
+    python token_cache.py encrypt    # write token.json.enc from token.json with SECRET_KEY, for CI
+"""
+import json
+import os
+import pickle
+import sys
+import tempfile
+
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+
+import instrumentation
+from config_loader import CLIENT_SECRET_SCHEMA, TOKEN_SCHEMA, ConfigLoader, encrypt_openssl
+
+TOKEN_FILE = 'token.json'
+LEGACY_TOKEN_FILE = 'token.pickle'
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+
+# The file the last load_credentials() call read, e.g. to tell how to fix a revoked token
+last_source = None
+
+
+class CachedCredentials(Credentials):
+    """User credentials that save themselves to the token cache whenever they are refreshed."""
+    token_file = None
+    # Set when the cache is encrypted: the password to write token_file + '.enc' with
+    token_password = None
+
+    def refresh(self, request):
+        with instrumentation.span('calendar.token_refresh'):
+            super().refresh(request)
+        if self.token_file:
+            save_credentials(self, self.token_file, password=self.token_password)
+
+
+def save_credentials(credentials, token_file=TOKEN_FILE, password=None):
+    """
+    Atomically write credentials to token_file, readable only by the owner.
+
+    With a password they are written encrypted to token_file + '.enc' instead, as
+    `openssl aes-256-cbc -salt -a -pbkdf2` would.
+    """
+    content = credentials.to_json().encode('utf-8')
+    if password is not None:
+        token_file, content = token_file + '.enc', encrypt_openssl(content, password)
+    directory = os.path.dirname(os.path.abspath(token_file))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.token.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.replace(tmp_path, token_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _from_info(info, token_file, scopes, password=None):
+    credentials = CachedCredentials.from_authorized_user_info(info, scopes)
+    credentials.token_file = token_file
+    credentials.token_password = password
+    return credentials
+
+
+def load_credentials(token_file=TOKEN_FILE, scopes=SCOPES, legacy_token_file=LEGACY_TOKEN_FILE):
+    """
+    Return the cached credentials without refreshing them, or None if there are none.
+
+    A legacy token.pickle is converted to token_file the first time it is read,
+    and an encrypted token.pickle.enc to token_file + '.enc'.
+    """
+    global last_source
+    loader = ConfigLoader(token_file, schema=TOKEN_SCHEMA)
+    if loader.exists():
+        last_source = loader.source()
+        password = loader.secret() if loader.is_encrypted() else None
+        return _from_info(loader.load_config(), token_file, scopes, password)
+
+    legacy_loader = ConfigLoader(legacy_token_file) if legacy_token_file else None
+    if legacy_loader and legacy_loader.exists():
+        last_source = legacy_loader.source()
+        legacy = pickle.loads(legacy_loader.load_bytes())
+        password = legacy_loader.secret() if legacy_loader.is_encrypted() else None
+        # to_json() keeps the access token and its expiry, so a still valid token is not refreshed
+        credentials = _from_info(json.loads(legacy.to_json()), token_file, scopes, password)
+        save_credentials(credentials, token_file, password=password)
+        return credentials
+    return None
+
+
+def can_authorize(credentials):
+    """Return True if credentials are valid now or can be refreshed without the user."""
+    return credentials is not None and (credentials.valid or bool(credentials.refresh_token))
+
+
+def authorize(client_secret_file, scopes=SCOPES, token_file=TOKEN_FILE):
+    """Run the browser consent flow and cache the new credentials."""
+    client_config = ConfigLoader(client_secret_file, schema=CLIENT_SECRET_SCHEMA).load_config()
+    flow = InstalledAppFlow.from_client_config(client_config, scopes=scopes)
+    credentials = _from_info(json.loads(flow.run_local_server(port=0).to_json()), token_file, scopes)
+    save_credentials(credentials, token_file)
+    return credentials
+
+
+def get_credentials(client_secret_file, scopes=SCOPES, token_file=TOKEN_FILE):
+    """Return the cached credentials, running the consent flow only if they cannot be refreshed."""
+    credentials = load_credentials(token_file, scopes)
+    if not can_authorize(credentials):
+        credentials = authorize(client_secret_file, scopes, token_file)
+    return credentials
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] not in (['migrate'], ['encrypt']):
+        print(__doc__)
+        sys.exit(1)
+    credentials = load_credentials()
+    if credentials is None:
+        print(f"No {TOKEN_FILE} or {LEGACY_TOKEN_FILE} to {sys.argv[1]}")
+        sys.exit(1)
+    if sys.argv[1] == 'encrypt':
+        if not os.environ.get('SECRET_KEY'):
+            print("Set SECRET_KEY to the key CI decrypts with")
+            sys.exit(1)
+        save_credentials(credentials, TOKEN_FILE, password=os.environ['SECRET_KEY'])
+        print(f"Credentials encrypted to {TOKEN_FILE}.enc, commit it and delete {LEGACY_TOKEN_FILE}.enc")
+    else:
+        print(f"Credentials saved to {credentials.token_file}{'.enc' if credentials.token_password is not None else ''}")